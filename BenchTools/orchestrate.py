@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+"""
+orchestrate.py --
+
+Runs curve tracer and Bode plot jobs on several test benches at once.
+
+Copyright 2024 by Kevin B. Kenny
+Please refer to the 'LICENSE.txt' file in the software distribution for
+the terms and conditions of reuse, and a DISCLAIMER OF ALL WARRANTIES.
+
+Usage:  orchestrate.py <config.json> <outputDirectory>
+
+Arguments:
+    config.json - Description of the benches and the jobs to run on them
+    outputDirectory - Directory that receives the results of every job
+
+Results:
+    Each job writes its CSV file and plots into the output directory,
+    exactly as if the corresponding script had been run there by hand.
+    In addition, 'jobs.csv' logs every job that was run, and
+    'bench-stats.csv' summarizes the throughput of each bench.
+
+The configuration file looks like:
+
+    {
+        "benches": [
+            {"name": "left", "scope": "192.168.2.101", "fygen": "COM3"},
+            {"name": "right", "scope": "192.168.2.102", "fygen": "COM4"},
+            {"name": "tracer", "scope": "192.168.2.103"}
+        ],
+        "jobs": [
+            {"kind": "bode", "name": "lpf-1k", "args": ["--steps", "40"]},
+            {"kind": "bode", "name": "integrator"},
+            {"kind": "tracer", "name": "2N3904V"}
+        ]
+    }
+
+Each bench is a scope, plus the serial port of an FY6900 generator if
+the bench can run Bode plots. Every bench takes jobs from the front of
+the queue, skipping any that it lacks the instruments to run, and runs
+them one after another. The benches all run at once, as child processes
+of this one.
+
+The tracer asks the operator to change the transresistance setting
+between scales. Its prompts are relayed to this console, tagged with
+the name of the bench, and the operator's answers are sent back to it.
+Only one bench prompts at a time.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+from pathlib import Path
+import sys
+from time import monotonic
+
+# Locations of the scripts that run the jobs
+
+repo = Path(__file__).resolve().parent.parent
+scripts = {
+    'bode': repo / 'Synth' / 'Ep007a-Integrator-vs-LPF' / 'bode.py',
+    'tracer': repo / 'Transistor101' / 'SideProject_IVTracer' / 'run_tracer.py',
+}
+
+# Text at the end of the tracer's prompt for the operator
+
+prompt_tail = "say 'ok': "
+
+# Serializes the prompts from all benches, so that the operator
+# answers one at a time
+
+console = asyncio.Lock()
+
+def job_command(bench, job):
+    """
+    Builds the command line that runs one job on one bench
+
+    Arguments:
+        bench - Configuration of the bench
+        job - Configuration of the job
+
+    Returns the list of arguments to the Python interpreter.
+    """
+    if job['kind'] == 'bode':
+        return [str(scripts['bode']), f'{job["name"]}.csv',
+                '--scope', bench['scope'], '--fygen', bench['fygen'],
+                '--no-show'] + job.get('args', [])
+    else:
+        return [str(scripts['tracer']), '--scope', bench['scope'],
+                '--no-show'] + job.get('args', []) + [job['name']]
+
+def can_run(bench, job):
+    """
+    Tells whether a bench has the instruments to run a job
+    """
+    return job['kind'] == 'tracer' or 'fygen' in bench
+
+async def relay(bench, proc):
+    """
+    Copies the output of a job to the console, a line at a time, with
+    the bench name in front. Prompts for the operator are answered
+    from the console.
+
+    Arguments:
+        bench - Configuration of the bench running the job
+        proc - Process running the job
+    """
+    pending = ''
+    while True:
+        chunk = await proc.stdout.read(4096)
+        if not chunk:
+            break
+        pending += chunk.decode(errors='replace')
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            print(f'[{bench["name"]}] {line}')
+        if pending.endswith(prompt_tail):
+            async with console:
+                loop = asyncio.get_running_loop()
+                try:
+                    answer = await loop.run_in_executor(
+                        None, input, f'[{bench["name"]}] {pending}')
+                except EOFError:
+                    # The console is closed; nobody can answer the prompt
+                    proc.kill()
+                    break
+            proc.stdin.write((answer + '\n').encode())
+            await proc.stdin.drain()
+            pending = ''
+    if pending:
+        print(f'[{bench["name"]}] {pending}')
+
+async def run_job(bench, job, outdir):
+    """
+    Runs one job on one bench
+
+    Arguments:
+        bench - Configuration of the bench
+        job - Configuration of the job
+        outdir - Directory that receives the results
+
+    Returns the exit status of the job.
+    """
+    env = dict(os.environ, MPLBACKEND='Agg')
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, '-u', *job_command(bench, job),
+        cwd=outdir, env=env,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT)
+    await relay(bench, proc)
+    return await proc.wait()
+
+async def run_bench(bench, queue, outdir, log):
+    """
+    Runs jobs from the queue on one bench until none is left that the
+    bench can run
+
+    Arguments:
+        bench - Configuration of the bench
+        queue - List of jobs not yet started, shared among the benches
+        outdir - Directory that receives the results
+        log - List that receives one record per completed job
+
+    Returns a dictionary of throughput statistics for the bench.
+    """
+    stats = {'Bench': bench['name'], 'Jobs': 0, 'Failed': 0, 'Busy': 0.0}
+    started = monotonic()
+    while True:
+        job = next((j for j in queue if can_run(bench, j)), None)
+        if job is None:
+            break
+        queue.remove(job)
+        print(f'[{bench["name"]}] starting {job["kind"]} job {job["name"]}')
+        t0 = monotonic()
+        status = await run_job(bench, job, outdir)
+        duration = monotonic() - t0
+        stats['Jobs'] += 1
+        stats['Busy'] += duration
+        if status != 0:
+            stats['Failed'] += 1
+        log.append({'Bench': bench['name'], 'Kind': job['kind'],
+                    'Name': job['name'], 'Status': status,
+                    'Duration': duration})
+        print(f'[{bench["name"]}] {job["kind"]} job {job["name"]} '
+              f'finished with status {status} in {duration:.1f} s')
+    stats['Elapsed'] = monotonic() - started
+    if stats['Jobs'] > 0:
+        stats['MeanJob'] = stats['Busy'] / stats['Jobs']
+        stats['JobsPerHour'] = 3600 * stats['Jobs'] / stats['Elapsed']
+    else:
+        stats['MeanJob'] = 0.0
+        stats['JobsPerHour'] = 0.0
+    return stats
+
+async def orchestrate(config, outdir):
+    """
+    Runs all the jobs in a configuration on all its benches
+
+    Arguments:
+        config - Configuration of the benches and jobs
+        outdir - Directory that receives the results
+
+    Returns a pair (stats, log), giving the throughput statistics of
+    each bench and a record of each job that was run.
+    """
+    queue = list(config['jobs'])
+    log = []
+    stats = await asyncio.gather(*[run_bench(bench, queue, outdir, log)
+                                   for bench in config['benches']])
+    for job in queue:
+        print(f'No bench can run {job["kind"]} job {job["name"]}')
+    return stats, log
+
+def save_table(path, rows, fieldnames):
+    """
+    Writes a list of dictionaries to a CSV file
+    """
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+# MAIN PROGRAM
+
+parser = argparse.ArgumentParser\
+    (description='Run tracer and Bode plot jobs on several benches at once.')
+parser.add_argument('config', metavar='config.json',
+                    help='Description of the benches and jobs')
+parser.add_argument('outdir', metavar='outputDirectory',
+                    help='Directory that receives the results')
+cmd_args = parser.parse_args()
+
+with open(cmd_args.config) as f:
+    config = json.load(f)
+os.makedirs(cmd_args.outdir, exist_ok=True)
+
+stats, log = asyncio.run(orchestrate(config, cmd_args.outdir))
+
+save_table(os.path.join(cmd_args.outdir, 'jobs.csv'), log,
+           ['Bench', 'Kind', 'Name', 'Status', 'Duration'])
+save_table(os.path.join(cmd_args.outdir, 'bench-stats.csv'), stats,
+           ['Bench', 'Jobs', 'Failed', 'Busy', 'Elapsed', 'MeanJob',
+            'JobsPerHour'])
+
+print(f'{"Bench":<12} {"Jobs":>5} {"Failed":>6} {"Busy (s)":>9} '
+      f'{"Mean (s)":>9} {"Jobs/h":>7}')
+for s in stats:
+    print(f'{s["Bench"]:<12} {s["Jobs"]:>5} {s["Failed"]:>6} '
+          f'{s["Busy"]:>9.1f} {s["MeanJob"]:>9.1f} {s["JobsPerHour"]:>7.1f}')
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+'''
+check_mna.py --
+
+Checks the operating points found by 'mna.py' against the hand-derived
+circuit equations of the design scripts elsewhere in this repository.
+
+Usage: check_mna.py [--points N]
+
+Each check builds the script's circuit from components, solves it over
+a batch of parameter sets, and compares the result with what the
+script itself prints or computes:
+
+    noise       Synth/Ep001_noise_generator/calculations.py: the solved
+                bias network, evaluated over a grid of supplies, zener
+                voltages, gains and resistors
+    schmitt     Transistor101/SideProject_IVTracer/schmitt-values.py:
+                the trip points of the resistor sets that it finds
+    ladder      Synth/Ep012_Sine_Shaper_2/circuit_analysis.py: the
+                transfer function of the diode ladder, as traced by
+                the Ladder class, for the textbook and E96 ladders
+
+Each check makes several comparisons, and prints one line for each.
+The exit status is the number of comparisons that failed.
+'''
+
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+import numpy as np
+
+from mna import Circuit
+
+repo = Path(__file__).resolve().parent.parent
+scripts = {
+    'noise': repo / 'Synth' / 'Ep001_noise_generator' / 'calculations.py',
+    'schmitt': repo / 'Transistor101' / 'SideProject_IVTracer'
+               / 'schmitt-values.py',
+    'ladder': repo / 'Synth' / 'Ep012_Sine_Shaper_2',
+}
+
+def run_script(path, *args):
+    '''
+    Runs a script in its own directory and returns what it printed
+    '''
+    return subprocess.run([sys.executable, str(path), *args],
+                          cwd=path.parent, capture_output=True, text=True,
+                          check=True).stdout
+
+def report(name, err, tol):
+    '''
+    Prints the outcome of one comparison and returns True if it passed
+    '''
+    ok = bool(err <= tol)
+    print(f'{name:<40} max error {err:10.3g}  {"ok" if ok else "FAILED"}')
+    return ok
+
+def check_noise(points):
+    '''
+    Compares the noise generator's bias network with the solution
+    printed by calculations.py, to a relative error of 1e-5.
+
+    The hand derivation lets the base current of Q2 bypass R3. The
+    exact circuit is the same as the hand-derived one with R3 scaled
+    by (beta+1)/beta, so that is what the printed solution is
+    evaluated with.
+    '''
+    solution = {}
+    for line in run_script(scripts['noise']).splitlines():
+        m = re.match(r'(I_R1|I_R2|V_A|V_B|V_C|V_D) = (.*)', line)
+        if m:
+            solution[m.group(1)] = m.group(2)
+
+    rng = np.random.default_rng(1)
+    params = {
+        'Vcc': rng.uniform(9, 15, points),
+        'Vdrop': rng.uniform(0.6, 0.75, points),
+        'Vzener': rng.uniform(5.5, 8, points),
+        'beta': rng.uniform(100, 400, points),
+        'R1': 10**rng.uniform(5, 6.3, points),
+        'R2': 10**rng.uniform(3, 4, points),
+        'R3': 10**rng.uniform(2, 3.5, points),
+    }
+
+    # The currents are small enough that the default gmin would leak
+    # a noticeable fraction of them
+    ckt = Circuit(gmin=1e-15)
+    ckt.vsource('Vcc', 'vcc', '0', params['Vcc'])
+    ckt.resistor('R1', 'vcc', 'A', params['R1'])
+    ckt.diode('Q1', 'B', 'A', Von=0.7, Vz=params['Vzener'])
+    ckt.npn('Q2', 'D', 'B', 'C', beta=params['beta'], Vbe=params['Vdrop'])
+    ckt.resistor('R2', 'vcc', 'D', params['R2'])
+    ckt.resistor('R3', 'C', '0', params['R3'])
+    op = ckt.solve()
+
+    exact = dict(params, R3=params['R3'] * (params['beta'] + 1)
+                 / params['beta'])
+    # Keep only the parameter sets where Q2 stays out of saturation,
+    # which the hand derivation assumes
+    active = op.state('Q2') == 'active'
+    computed = {'I_R1': op.i('R1'), 'I_R2': op.i('R2'), 'V_A': op.v('A'),
+                'V_B': op.v('B'), 'V_C': op.v('C'), 'V_D': op.v('D')}
+    results = []
+    for name, expr in solution.items():
+        expected = eval(expr, {}, exact)
+        err = np.max(np.abs(computed[name] - expected)[active]
+                     / np.abs(expected[active]))
+        results.append(report(f'noise: {name} ({active.sum()} points,'
+                              ' relative)', err, 1e-5))
+    return results
+
+def schmitt_circuit(R1, R2, R3, R4, drive):
+    '''
+    Builds the curve tracer's Schmitt trigger around its divider node.
+    The open-collector output is an NPN transistor that saturates
+    hard onto -12 V when the comparator drives its base.
+    '''
+    ckt = Circuit()
+    ckt.vsource('Vee', 'vee', '0', -12.0)
+    ckt.resistor('R1', 'in', '0', R1)
+    ckt.resistor('R2', 'in', 'vee', R2)
+    ckt.resistor('R3', 'in', 'out', R3)
+    ckt.resistor('R4', 'out', '0', R4)
+    ckt.npn('Q1', 'out', 'base', 'vee', beta=100, Vce_sat=0.0)
+    ckt.resistor('Rbe', 'base', 'vee', 10e3)
+    ckt.isource('Idrive', '0', 'base', drive)
+    return ckt
+
+def check_schmitt():
+    '''
+    Compares the trip points of the resistor sets printed by
+    schmitt-values.py with those of the circuit: to 1e-6 V for the
+    design that it solves for, and to 5.1e-5 V, half the last digit
+    printed plus a little for rounding, for the tabulated sets.
+    '''
+    out = run_script(scripts['schmitt'], '--top', '1000')
+    m = re.search(r'Solution with R4=6k2, R3=33k\nR1 = (\S+)\nR2 = (\S+)', out)
+    rows = np.array([[float(v) for v in line.split()]
+                     for line in out.splitlines()
+                     if re.fullmatch(r'(\s+[-\d.e+]+){7}', line)])
+
+    # Output high (transistor off) and low (transistor saturated)
+    drive = np.array([0.0, 1e-3])
+    results = []
+    op = schmitt_circuit(float(m.group(1)), float(m.group(2)), 33e3, 6200,
+                         drive).solve()
+    results.append(report('schmitt: R3=33k design trip points',
+                          np.max(np.abs(op.v('in') - [-0.05, -1.0])), 1e-6))
+
+    R1, R2, R3, R4, Vh, Vl, _ = (c[:, np.newaxis] for c in rows.T)
+    op = schmitt_circuit(R1, R2, R3, R4, drive).solve()
+    err = np.abs(op.v('in') - np.hstack([Vh, Vl]))
+    results.append(report(f'schmitt: {rows.shape[0]} tabulated sets'
+                          ' (printed to 1e-4)', np.max(err), 5.1e-5))
+    results.append(report('schmitt: output states',
+                          np.sum(op.state('Q1') != ['cutoff', 'saturated']),
+                          0))
+    return results
+
+def ladder_circuit(ladder, Rs, Vin):
+    '''
+    Builds the diode ladder sine shaper.
+
+    ladder - Ladder object giving the input resistor, tail resistance,
+             reference voltage and diode model
+    Rs - List of pairs (Ra, Rb): the resistor in the divider stack
+         below each tap, and the resistor in series with its diode
+    Vin - Input voltage
+    '''
+    ckt = Circuit()
+    ckt.vsource('Vin', 'in', '0', Vin)
+    ckt.resistor('Rin', 'in', 'out', ladder.Rin)
+    ckt.vsource('Vref', 'ref', '0', ladder.Vref)
+    Rtop = ladder.Rtail - sum(Ra for Ra, _ in Rs)
+    below = '0'
+    for k, (Ra, Rb) in enumerate(Rs):
+        tap = 'ref' if k == len(Rs) - 1 and Rtop == 0 else f'tap{k}'
+        ckt.resistor(f'Ra{k}', below, tap, Ra)
+        if Rb > 0:
+            ckt.resistor(f'Rb{k}', 'out', f'd{k}', Rb)
+            ckt.diode(f'D{k}', f'd{k}', tap,
+                      Von=ladder.Vdiode, Ron=ladder.Rdiode)
+        else:
+            ckt.diode(f'D{k}', 'out', tap,
+                      Von=ladder.Vdiode, Ron=ladder.Rdiode)
+        below = tap
+    if Rtop != 0:
+        ckt.resistor('Rtop', below, 'ref', Rtop)
+    return ckt
+
+def check_ladder(points):
+    '''
+    Compares the transfer functions of the ladders analysed in
+    circuit_analysis.py with those of the circuit, to 1e-6 V.
+    '''
+    sys.path.insert(0, str(scripts['ladder']))
+    from circuit_analysis import Ladder
+
+    cases = [
+        ('textbook', dict(Rin=200, Rtail=331),
+         [(100, 2000), (33, 1000), (82, 470), (47, 330), (30, 120), (39, 0)]),
+        ('E96', dict(Rin=340, Rtail=None),
+         [(28.0, 4230.), (130., 1870.), (93.1, 931.), (66.5, 432.),
+          (47.5, 154.), (34.0, 18.2)]),
+    ]
+    results = []
+    for title, kw, Rs in cases:
+        if kw['Rtail'] is None:
+            kw['Rtail'] = sum(Ra for Ra, _ in Rs)
+        ladder = Ladder(Vmax=3, Vref=2.4, Vdiode=0.55, Rdiode=33, **kw)
+        Vins, Vouts = [0], [0]
+        for Ra, Rb in Rs:
+            ladder.analysis_add_stage(Ra, Rb)
+            Vins.append(ladder.Vin_last)
+            Vouts.append(ladder.Vout_last)
+
+        Vin = np.linspace(0, ladder.Vmax_in, points)
+        expected = np.where(Vin <= Vins[-1], np.interp(Vin, Vins, Vouts),
+                            Vouts[-1] + ladder.m * (Vin - Vins[-1]))
+        # A fresh Ladder, because the analysis changed Rtail
+        ladder = Ladder(Vmax=3, Vref=2.4, Vdiode=0.55, Rdiode=33, **kw)
+        op = ladder_circuit(ladder, Rs, Vin).solve()
+        results.append(report(f'ladder: {title} transfer function',
+                              np.max(np.abs(op.v('out') - expected)), 1e-6))
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser\
+        (description='Check mna.py against the hand-derived circuit'
+         ' equations of the design scripts.')
+    parser.add_argument('--points', type=int, default=2000,
+                        help='Number of parameter sets in each batch')
+    cmd_args = parser.parse_args()
+
+    results = check_noise(cmd_args.points) + check_schmitt() \
+        + check_ladder(cmd_args.points)
+    sys.exit(results.count(False))
@@ -0,0 +1,94 @@
+'''
+codegen.py --
+
+Writes closed-form expressions derived with sympy into a plain Python
+module that needs only NumPy, so that the design scripts that use the
+expressions need not import sympy, or redo the algebra, every time
+they run.
+
+A derivation script does the symbolic work and finishes with
+
+    write_module('xyz_equations.py', __file__,
+                 'Equations of the xyz circuit',
+                 functions=[('trip_points', [R1, R2], [Vh, Vl],
+                             'Returns the trip points (Vh, Vl)')],
+                 constants={'solution_text': [...]})
+
+The generated module records a hash of the derivation script, so the
+script that imports it can tell when the derivation has changed and
+run it again.
+'''
+
+import hashlib
+import os
+from pprint import pformat
+import sympy
+from sympy.printing.numpy import NumPyPrinter
+
+def source_hash(path):
+    '''
+    Returns the SHA-256 hash of a file, in hex
+    '''
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def function_source(name, args, exprs, doc):
+    '''
+    Returns the source code of a function that evaluates expressions.
+
+    name - Name of the function
+    args - Symbols that are its arguments, in order
+    exprs - An expression, or a list of them to be returned as a tuple
+    doc - Docstring of the function
+
+    Common subexpressions are computed once, in temporaries named
+    x0, x1, ..., skipping any names already in use. These are the
+    names that sympy.lambdify gives them, so the terms of the sums come
+    out in the same order, and the generated code rounds exactly as
+    a lambdified function does.
+    '''
+    printer = NumPyPrinter({'fully_qualified_modules': True})
+    single = not isinstance(exprs, (list, tuple))
+    exprs = [exprs] if single else list(exprs)
+    used = set(args).union(*(sympy.sympify(e).free_symbols for e in exprs))
+    temps, reduced = sympy.cse(exprs, symbols=sympy.numbered_symbols(
+        'x', exclude=used))
+    lines = [f'def {name}({", ".join(str(a) for a in args)}):',
+             "    '''"]
+    lines.extend(f'    {line}'.rstrip() for line in doc.splitlines())
+    lines.append("    '''")
+    for t, e in temps:
+        lines.append(f'    {t} = {printer.doprint(e)}')
+    if single:
+        lines.append(f'    return {printer.doprint(reduced[0])}')
+    else:
+        lines.append('    return (')
+        lines.extend(f'        {printer.doprint(e)},' for e in reduced)
+        lines.append('    )')
+    return '\n'.join(lines)
+
+def write_module(path, derivation, doc, functions=(), constants=None):
+    '''
+    Writes a module of generated code.
+
+    path - Path name of the module to write
+    derivation - Path name of the script that derived the equations
+    doc - First line(s) of the module's docstring
+    functions - List of (name, args, exprs, doc) tuples, as for
+                function_source
+    constants - Dictionary of other values (such as the text of
+                solutions) to define in the module; each must be a
+                Python literal
+    '''
+    parts = [f"'''\n{doc}\n\nGenerated by '{os.path.basename(derivation)}'."
+             " Do not edit; run that script again\nwhen the equations"
+             " change.\n'''",
+             'import numpy',
+             f'source_hash = {source_hash(derivation)!r}']
+    for name, value in (constants or {}).items():
+        parts.append(f'{name} = {pformat(value, width=76)}')
+    for spec in functions:
+        parts.append('\n' + function_source(*spec))
+    with open(path, 'w') as f:
+        f.write('\n\n'.join(parts) + '\n')
+    print(f'Wrote {path}')
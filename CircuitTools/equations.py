@@ -0,0 +1,53 @@
+'''
+equations.py --
+
+Loads the modules of equations that the derivation scripts write with
+'codegen.py'. This module needs only the standard library, so that
+the design scripts that use it need not have sympy.
+
+A design script 'xyz.py' beside its derivation 'xyz_derive.py' does
+
+    eqns = load_equations(__file__, 'xyz_equations', 'xyz_derive.py')
+
+and gets the generated module 'xyz_equations', regenerated first if
+the derivation has changed since the module was written.
+'''
+
+import hashlib
+import importlib
+import importlib.util
+import os
+import subprocess
+import sys
+
+def load_equations(script, module_name, derivation):
+    '''
+    Imports a generated module of equations, first running the
+    derivation again if it has changed since the module was generated
+
+    script - Path name of the script that uses the equations; the
+             module and the derivation are in its directory
+    module_name - Name of the generated module
+    derivation - File name of the script that generates the module
+    '''
+    here = os.path.dirname(os.path.abspath(script))
+    if here not in sys.path:
+        sys.path.insert(0, here)
+    with open(os.path.join(here, derivation), 'rb') as f:
+        current = hashlib.sha256(f.read()).hexdigest()
+    try:
+        module = importlib.import_module(module_name)
+        if module.source_hash == current:
+            return module
+    except ImportError:
+        pass
+    print(f'Running {derivation} to regenerate {module_name}.py',
+          file=sys.stderr)
+    subprocess.run([sys.executable, os.path.join(here, derivation)],
+                   cwd=here, check=True, stdout=subprocess.DEVNULL)
+    path = os.path.join(here, module_name + '.py')
+    if os.path.exists(importlib.util.cache_from_source(path)):
+        os.remove(importlib.util.cache_from_source(path))
+    sys.modules.pop(module_name, None)
+    importlib.invalidate_caches()
+    return importlib.import_module(module_name)
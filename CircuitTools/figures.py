@@ -0,0 +1,111 @@
+'''
+figures.py --
+
+Renders the figures of a design script, either one at a time on the
+screen or all at once in parallel worker processes with no display,
+skipping any figure whose inputs have not changed since its image file
+was written.
+
+A script describes each figure as a triple (filename, draw, args):
+'draw' is a module-level function that draws the figure, and 'args' a
+JSON-serializable dictionary of its keyword arguments, which is hashed
+with the source of the script to decide whether the figure is up to
+date. Anything that 'draw' prints is kept with the hash and printed
+again when the figure is skipped, so a report that goes with a figure
+does not disappear when the figure is up to date.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import matplotlib
+from matplotlib import pyplot as plt
+
+def render_figure(filename, draw, args, dpi=200, axes=True):
+    '''
+    Draws one figure and saves it
+
+    filename - Path name of the image file
+    draw, args - Function that draws the figure, and its arguments
+    dpi - Resolution of the figure
+    axes - True if draw takes the Axes to draw on as its first argument,
+           False if it draws on the current figure with pyplot
+
+    Returns the figure.
+    '''
+    fig = plt.figure(figsize=(8, 4.5), dpi=dpi)
+    if axes:
+        draw(fig.add_subplot(1, 1, 1), **args)
+    else:
+        draw(**args)
+    fig.savefig(filename, dpi=dpi)
+    return fig
+
+def render_headless(filename, draw, args, dpi=200, axes=True):
+    '''
+    Draws one figure and saves it, in a worker process with no display.
+    Returns a pair (filename, output), where output is what draw printed.
+    '''
+    plt.switch_backend('Agg')
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        plt.close(render_figure(filename, draw, args, dpi, axes))
+    return filename, output.getvalue()
+
+def figure_hash(draw, args):
+    '''
+    Returns a hash of everything that goes into a figure: the name of
+    the function that draws it, its arguments, the source of the script
+    that defines it and of this module, and the version of matplotlib
+    '''
+    h = hashlib.sha256()
+    h.update(json.dumps([draw.__name__, args], sort_keys=True).encode())
+    for path in (sys.modules[draw.__module__].__file__, __file__):
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    h.update(matplotlib.__version__.encode())
+    return h.hexdigest()
+
+def render_all_headless(specs, jobs=None, hashfile='Images/.hashes.json',
+                        dpi=200, axes=True):
+    '''
+    Draws figures in parallel with no display, skipping any whose image
+    file is already up to date
+
+    specs - List of (filename, draw, args) triples
+    jobs - Number of worker processes, or None for one per CPU
+    hashfile - JSON file that remembers the hash of each image's inputs,
+               and what was printed while drawing it
+    dpi, axes - As for render_figure
+    '''
+    try:
+        with open(hashfile) as f:
+            saved = json.load(f)
+    except (FileNotFoundError, ValueError):
+        saved = {}
+    todo = []
+    for filename, draw, args in specs:
+        h = figure_hash(draw, args)
+        entry = saved.get(filename)
+        if (isinstance(entry, dict) and entry.get('hash') == h
+                and os.path.exists(filename)):
+            print(f'{filename} is up to date')
+            print(entry['output'], end='')
+        else:
+            todo.append((filename, draw, args))
+            saved[filename] = {'hash': h, 'output': ''}
+    if todo:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(render_headless, *spec, dpi, axes)
+                       for spec in todo]
+            for future in futures:
+                filename, output = future.result()
+                print(f'{filename} rendered')
+                print(output, end='')
+                saved[filename]['output'] = output
+    with open(hashfile, 'w') as f:
+        json.dump(saved, f, indent=4)
@@ -0,0 +1,446 @@
+'''
+mna.py --
+
+DC operating points of small resistor, diode and transistor networks
+by modified nodal analysis.
+
+A Circuit is built up from a list of components, each joining named
+nodes ('0' is ground):
+
+    ckt = Circuit()
+    ckt.vsource('Vcc', 'vcc', '0', 12.0)
+    ckt.resistor('R1', 'vcc', 'a', 680e3)
+    ckt.diode('D1', 'b', 'a', Von=0.7, Vz=7.0)
+    ckt.npn('Q2', 'd', 'b', 'c', beta=np.linspace(100, 400, 31))
+    ...
+    op = ckt.solve()
+    print(op.v('d'), op.i('R1'), op.state('Q2'))
+
+The value of any component may be an array. All the values are
+broadcast together, and the circuit is solved for every parameter set
+in the resulting batch at once. The node voltages and branch currents
+come back as arrays of the batch's shape.
+
+Diodes and transistors have piecewise linear models. A diode is either
+off (no current), on (a drop of Von plus Ron times the current) or, if
+it has a breakdown voltage Vz, in breakdown. A transistor is in cutoff
+(no current), active (a base-emitter drop of Vbe, and beta times the
+base current in the collector) or saturated (a base-emitter drop of Vbe
+and a collector-emitter drop of Vce_sat). Each linear state adds its
+own equations to the nodal equations. The solver guesses a state for
+every device, solves the linear circuit, and moves every device whose
+voltages and currents contradict its state into the state that they
+point to, until every device is consistent.
+
+The equations are assembled from the stamps of the components as
+sparse coefficients. Those of every parameter set in a batch make one
+block-diagonal matrix, so each pass of the state search is a single
+solve of the whole batch. Only the parameter sets whose states changed
+take part in the next pass.
+'''
+
+import warnings
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+# Name of the reference node
+
+ground = '0'
+
+# Names of the linear states of the piecewise linear devices
+
+diode_states = ('off', 'on', 'breakdown')
+bjt_states = ('cutoff', 'active', 'saturated')
+
+# After this many passes of the state search, a parameter set that has
+# not settled changes only one device per pass, which cannot cycle the
+# way changing several devices at once sometimes can.
+
+greedy_passes = 10
+
+# Circuits with up to this many unknowns are solved as a stack of dense
+# matrices, one per parameter set, rather than as one sparse matrix
+
+dense_limit = 64
+
+class Circuit:
+    '''
+    A network of resistors, sources, diodes and bipolar transistors
+    '''
+
+    def __init__(self, gmin=1e-12):
+        '''
+        Makes an empty circuit.
+
+        gmin - Conductance from every node to ground, which keeps the
+               equations solvable when a node is cut off from the rest
+               of the circuit by devices that are not conducting
+        '''
+        self.gmin = gmin
+        self.nodes = {}
+        self.components = {}
+        self.branches = 0
+
+    def node(self, name):
+        '''
+        Returns the number of a node, adding it to the circuit if it
+        is new. Ground is -1.
+        '''
+        if name == ground:
+            return -1
+        return self.nodes.setdefault(name, len(self.nodes))
+
+    def add(self, name, kind, nodes, values, branches=0):
+        '''
+        Adds a component to the circuit.
+
+        name - Name of the component, which must be unique
+        kind - 'R', 'V', 'I', 'D' or 'Q'
+        nodes - Names of the nodes that the component joins
+        values - Dictionary of the values of its parameters
+        branches - Number of branch currents that it adds to the unknowns
+        '''
+        if name in self.components:
+            raise ValueError(f'duplicate component {name}')
+        self.components[name] = {
+            'kind': kind,
+            'nodes': [self.node(n) for n in nodes],
+            'values': values,
+            'branch': self.branches,
+        }
+        self.branches += branches
+
+    def resistor(self, name, a, b, R):
+        '''
+        Adds a resistor of R ohms between nodes a and b
+        '''
+        self.add(name, 'R', [a, b], {'R': R})
+
+    def vsource(self, name, p, n, V):
+        '''
+        Adds a voltage source that holds node p V volts above node n
+        '''
+        self.add(name, 'V', [p, n], {'V': V}, branches=1)
+
+    def isource(self, name, p, n, I):
+        '''
+        Adds a current source that drives I amperes out of node p,
+        through itself, and into node n
+        '''
+        self.add(name, 'I', [p, n], {'I': I})
+
+    def diode(self, name, anode, cathode, Von=0.7, Ron=0.0, Vz=None):
+        '''
+        Adds a diode.
+
+        Von - Forward voltage at which the diode starts to conduct
+        Ron - Resistance of the diode when it conducts
+        Vz - Reverse voltage at which the diode breaks down, or None
+             if it never does
+        '''
+        self.add(name, 'D', [anode, cathode],
+                 {'Von': Von, 'Ron': Ron,
+                  'Vz': np.inf if Vz is None else Vz}, branches=1)
+
+    def npn(self, name, c, b, e, beta=100.0, Vbe=0.7, Vce_sat=0.2):
+        '''
+        Adds an NPN transistor.
+
+        c, b, e - Nodes of the collector, base and emitter
+        beta - Current gain in the active region
+        Vbe - Base-emitter voltage when the transistor conducts
+        Vce_sat - Collector-emitter voltage in saturation
+        '''
+        self.add(name, 'Q', [c, b, e],
+                 {'sign': 1.0, 'beta': beta, 'Vbe': Vbe,
+                  'Vce_sat': Vce_sat}, branches=2)
+
+    def pnp(self, name, c, b, e, beta=100.0, Veb=0.7, Vec_sat=0.2):
+        '''
+        Adds a PNP transistor. The arguments are as for npn, with the
+        voltages measured from the emitter.
+        '''
+        self.add(name, 'Q', [c, b, e],
+                 {'sign': -1.0, 'beta': beta, 'Vbe': Veb,
+                  'Vce_sat': Vec_sat}, branches=2)
+
+    def solve(self, max_passes=50):
+        '''
+        Finds the DC operating point for every parameter set in the batch.
+
+        max_passes - Largest number of passes of the state search
+
+        Returns an OperatingPoint. Parameter sets whose device states
+        never settled are marked in its 'converged' array, and a
+        warning is issued.
+        '''
+        shape = np.broadcast_shapes(*(np.shape(v)
+                                      for c in self.components.values()
+                                      for v in c['values'].values()))
+        size = int(np.prod(shape))
+        values = {name: {k: np.broadcast_to(np.asarray(v, dtype=float),
+                                            shape).ravel()
+                         for k, v in c['values'].items()}
+                  for name, c in self.components.items()}
+        nnodes = len(self.nodes)
+        nunknowns = nnodes + self.branches
+
+        states = {name: np.full(size, 1 if c['kind'] == 'Q' else 0)
+                  for name, c in self.components.items()
+                  if c['kind'] in 'DQ'}
+        x = np.zeros((size, nunknowns))
+        todo = np.arange(size)
+        for npass in range(max_passes):
+            if todo.size == 0:
+                break
+            sel = {name: {k: v[todo] for k, v in vals.items()}
+                   for name, vals in values.items()}
+            sts = {name: s[todo] for name, s in states.items()}
+            xs = solve_blocks(*self.assemble(sel, sts, todo.size, nnodes,
+                                             nunknowns))
+            x[todo] = xs
+            changed = self.update_states(sel, sts, xs, nnodes,
+                                         greedy=npass >= greedy_passes)
+            for name in states:
+                states[name][todo] = sts[name]
+            todo = todo[changed]
+        converged = np.ones(size, dtype=bool)
+        converged[todo] = False
+        if todo.size:
+            warnings.warn(f'{todo.size} of {size} operating points did not'
+                          f' settle in {max_passes} passes')
+        return OperatingPoint(self, shape, x, values, states, converged)
+
+    def assemble(self, values, states, size, nnodes, nunknowns):
+        '''
+        Builds the equations of a batch of parameter sets.
+
+        values - Dictionary, by component, of the values of its
+                 parameters, one per parameter set
+        states - Dictionary, by device, of its states
+        size - Number of parameter sets
+        nnodes - Number of nodes other than ground
+        nunknowns - Number of unknowns in one parameter set
+
+        The unknowns of each parameter set are the node voltages
+        followed by the branch currents, and the equations are
+        Kirchhoff's current law at each node, followed by one equation
+        for each branch current.
+
+        Returns a tuple (rows, cols, vals, rhs) for solve_blocks.
+        '''
+        rows, cols, vals = [], [], []
+        rhs = np.zeros((size, nunknowns))
+
+        def stamp(r, c, v):
+            if r >= 0 and c >= 0:
+                rows.append(r)
+                cols.append(c)
+                vals.append(np.broadcast_to(v, (size,)))
+
+        for i in range(nnodes):
+            stamp(i, i, self.gmin)
+
+        for name, c in self.components.items():
+            kind = c['kind']
+            vals_ = values[name]
+            if kind == 'R':
+                a, b = c['nodes']
+                g = 1.0 / vals_['R']
+                stamp(a, a, g)
+                stamp(b, b, g)
+                stamp(a, b, -g)
+                stamp(b, a, -g)
+            elif kind == 'I':
+                p, n = c['nodes']
+                if p >= 0:
+                    rhs[:, p] -= vals_['I']
+                if n >= 0:
+                    rhs[:, n] += vals_['I']
+            elif kind in 'VD':
+                p, n = c['nodes']
+                j = nnodes + c['branch']
+                stamp(p, j, 1.0)
+                stamp(n, j, -1.0)
+                if kind == 'V':
+                    stamp(j, p, 1.0)
+                    stamp(j, n, -1.0)
+                    rhs[:, j] = vals_['V']
+                else:
+                    # off: I = 0; on: V - Ron*I = Von; breakdown: V - Ron*I = -Vz
+                    s = states[name]
+                    conducting = (s != 0).astype(float)
+                    stamp(j, p, conducting)
+                    stamp(j, n, -conducting)
+                    stamp(j, j, np.where(s == 0, 1.0, -vals_['Ron']))
+                    rhs[:, j] = np.select([s == 1, s == 2],
+                                          [vals_['Von'], -vals_['Vz']], 0.0)
+            elif kind == 'Q':
+                cn, bn, en = c['nodes']
+                jb = nnodes + c['branch']
+                jc = jb + 1
+                sign = vals_['sign']
+                s = states[name]
+                stamp(bn, jb, sign)
+                stamp(en, jb, -sign)
+                stamp(cn, jc, sign)
+                stamp(en, jc, -sign)
+                # Base row. cutoff: Ib = 0; otherwise: sign*(Vb - Ve) = Vbe
+                on = (s != 0).astype(float)
+                stamp(jb, bn, sign*on)
+                stamp(jb, en, -sign*on)
+                stamp(jb, jb, 1.0 - on)
+                rhs[:, jb] = on * vals_['Vbe']
+                # Collector row. cutoff: Ic = 0; active: Ic - beta*Ib = 0;
+                # saturated: sign*(Vc - Ve) = Vce_sat
+                sat = (s == 2).astype(float)
+                stamp(jc, cn, sign*sat)
+                stamp(jc, en, -sign*sat)
+                stamp(jc, jc, 1.0 - sat)
+                stamp(jc, jb, np.where(s == 1, -vals_['beta'], 0.0))
+                rhs[:, jc] = sat * vals_['Vce_sat']
+
+        return np.array(rows), np.array(cols), np.stack(vals, axis=-1), rhs
+
+    def update_states(self, values, states, x, nnodes, greedy=False):
+        '''
+        Moves every device whose solution contradicts its state into
+        the state that the solution points to.
+
+        values, states - As for assemble; 'states' is updated in place
+        x - Solutions, one row per parameter set
+        nnodes - Number of nodes other than ground
+        greedy - True to change only the first inconsistent device in
+                 each parameter set
+
+        Returns a boolean array telling which parameter sets changed.
+        '''
+        def volts(n):
+            return x[:, n] if n >= 0 else 0.0
+
+        changed = np.zeros(x.shape[0], dtype=bool)
+        for name, s in states.items():
+            c = self.components[name]
+            vals_ = values[name]
+            j = nnodes + c['branch']
+            if c['kind'] == 'D':
+                p, n = c['nodes']
+                v = volts(p) - volts(n)
+                i = x[:, j]
+                new = np.select([(s == 0) & (v > vals_['Von']),
+                                 (s == 0) & (v < -vals_['Vz']),
+                                 (s == 1) & (i < 0),
+                                 (s == 2) & (i > 0)],
+                                [1, 2, 0, 0], s)
+            else:
+                cn, bn, en = c['nodes']
+                sign = vals_['sign']
+                vbe = sign * (volts(bn) - volts(en))
+                vce = sign * (volts(cn) - volts(en))
+                ib, ic = x[:, j], x[:, j+1]
+                new = np.select([(s == 0) & (vbe > vals_['Vbe']),
+                                 (s != 0) & (ib < 0),
+                                 (s == 1) & (vce < vals_['Vce_sat']),
+                                 (s == 2) & (ic > vals_['beta'] * ib)],
+                                [1, 0, 2, 1], s)
+            flip = (new != s)
+            if greedy:
+                flip &= ~changed
+            s[flip] = new[flip]
+            changed |= flip
+        return changed
+
+def solve_blocks(rows, cols, vals, rhs):
+    '''
+    Solves the equations of a batch of parameter sets.
+
+    rows, cols - Positions of the coefficients in the matrix of one
+                 parameter set. Coefficients at the same position add.
+    vals - Array (parameter sets, coefficients) of the coefficients
+    rhs - Array (parameter sets, unknowns) of the right-hand sides
+
+    The coefficients of the whole batch make one block-diagonal sparse
+    matrix. When the blocks are small, LAPACK factors them as a stack
+    of dense matrices much faster than SuperLU factors the sparse one,
+    so they are scattered into place and solved that way, unless one
+    of them is singular.
+
+    Returns an array (parameter sets, unknowns) of the solutions.
+    '''
+    size, n = rhs.shape
+    if n <= dense_limit:
+        scatter = sparse.csr_matrix((np.ones(rows.size),
+                                     (rows * n + cols, np.arange(rows.size))),
+                                    shape=(n * n, rows.size))
+        A = (scatter @ vals.T).T.reshape(size, n, n)
+        try:
+            return np.linalg.solve(A, rhs[..., np.newaxis])[..., 0]
+        except np.linalg.LinAlgError:
+            pass
+    offset = (np.arange(size) * n)[:, np.newaxis]
+    A = sparse.csc_matrix((vals.ravel(), ((offset + rows).ravel(),
+                                          (offset + cols).ravel())),
+                          shape=(size * n, size * n))
+    return np.atleast_1d(spsolve(A, rhs.ravel())).reshape(size, n)
+
+class OperatingPoint:
+    '''
+    The solution of a circuit for a batch of parameter sets. Every
+    result has the shape of the batch.
+    '''
+
+    def __init__(self, circuit, shape, x, values, states, converged):
+        self.circuit = circuit
+        self.shape = shape
+        self.x = x
+        self.values = values
+        self.states = states
+        self.converged = converged.reshape(shape)
+
+    def _result(self, a):
+        return a.reshape(self.shape)
+
+    def _volts(self, n):
+        return self.x[:, n] if n >= 0 else np.zeros(self.x.shape[0])
+
+    def v(self, node, ref=ground):
+        '''
+        Returns the voltage of a node, relative to ground or to
+        another node
+        '''
+        nodes = self.circuit.nodes
+        return self._result(self._volts(nodes.get(node, -1))
+                            - self._volts(nodes.get(ref, -1)))
+
+    def i(self, name, terminal=None):
+        '''
+        Returns the current in a component.
+
+        For a two-terminal component, this is the current that flows
+        from its first node, through it, to its second. For a
+        transistor, it is the current that flows into the given
+        terminal, 'c' (the default), 'b' or 'e'.
+        '''
+        c = self.circuit.components[name]
+        vals_ = self.values[name]
+        j = len(self.circuit.nodes) + c['branch']
+        if c['kind'] == 'R':
+            a, b = c['nodes']
+            i = (self._volts(a) - self._volts(b)) / vals_['R']
+        elif c['kind'] == 'I':
+            i = vals_['I']
+        elif c['kind'] in 'VD':
+            i = self.x[:, j]
+        else:
+            ib, ic = vals_['sign'] * self.x[:, j], vals_['sign'] * self.x[:, j+1]
+            i = {'b': ib, 'c': ic, 'e': -ib - ic}[terminal or 'c']
+        return self._result(i)
+
+    def state(self, name):
+        '''
+        Returns the name of the linear state of a diode or transistor
+        '''
+        names = diode_states if self.circuit.components[name]['kind'] == 'D' \
+            else bjt_states
+        return self._result(np.array(names)[self.states[name]])
@@ -0,0 +1,70 @@
+'''
+solvecache.py --
+
+Solves equations with sympy through a cache of solutions on disk, so
+that a derivation script that is run again, or goes back to equations
+that it solved before, does no symbolic work at all.
+'''
+
+import glob
+import hashlib
+import json
+import os
+import sys
+import sympy
+from sympy import solve, srepr, sympify
+
+# Number of solutions that a cache keeps
+
+solve_cache_size = 64
+
+def cached_solve(eqns, unknowns, *steps, cache_dir=None):
+    '''
+    Solves a set of equations with solve(..., dict=True), through a
+    cache of solutions on disk.
+
+    eqns - Expressions that are to be zero
+    unknowns - Symbols to solve for
+    steps - Names of methods (such as 'expand' or 'simplify') to apply,
+            in order, to each value in the solutions before they are cached
+    cache_dir - Directory of the cache; by default, '.sympy-cache'
+                beside the script being run
+
+    The cache key is a hash of the canonical form (srepr) of the
+    equations, taken as a set, the unknowns, the steps and the version
+    of sympy, so a rerun, or a run that goes back to values used before,
+    does no symbolic work at all. The least recently used solutions are
+    discarded when there are more than solve_cache_size of them.
+    '''
+    if cache_dir is None:
+        script = os.path.abspath(sys.argv[0])
+        cache_dir = os.path.join(os.path.dirname(script), '.sympy-cache')
+    eqns = [sympify(e) for e in eqns]
+    key = hashlib.sha256(json.dumps([sorted(srepr(e) for e in eqns),
+                                     [srepr(u) for u in unknowns],
+                                     list(steps), sympy.__version__])
+                         .encode()).hexdigest()
+    path = os.path.join(cache_dir, key + '.json')
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        os.utime(path)
+        return [{sympify(k): sympify(v) for k, v in s} for s in cached]
+    except (OSError, ValueError):
+        pass
+
+    solns = solve(eqns, unknowns, dict=True)
+    for s in solns:
+        for k in s:
+            for step in steps:
+                s[k] = getattr(s[k], step)()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump([[[srepr(k), srepr(v)] for k, v in s.items()]
+                   for s in solns], f)
+    entries = sorted(glob.glob(os.path.join(cache_dir, '*.json')),
+                     key=os.path.getmtime)
+    for p in entries[:-solve_cache_size]:
+        os.remove(p)
+    return solns
@@ -1,8 +1,15 @@
+import argparse
 import numpy as np
+import os
+import sys
 from numpy import abs, angle, log10, logspace, pi, sqrt, zeros
 from matplotlib import pyplot as plt
 from matplotlib.ticker import EngFormatter
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'CircuitTools'))
+from figures import render_all_headless, render_figure
+
 HzFormatter = EngFormatter(unit='Hz', places=1, sep='\N{THIN SPACE}')
 dBFormatter = EngFormatter(unit='dB', places=1, sep='\N{THIN SPACE}')
 
@@ -12,23 +19,90 @@ def par(a, b):
     '''
     return a*b/(a+b)
 
+def gain_dB(Av):
+    '''
+    Return the modulus of a complex circuit gain in decibels
+    '''
+    return 20*log10(abs(Av))
+
+def phase_deg(Av):
+    '''
+    Return the phase shift of a complex circuit gain in degrees,
+    in the range (-360, 0]
+    '''
+    alpha = -angle(Av, True)
+    return np.where(alpha < 0, alpha, alpha-360.0)
+
+class OpAmp():
+    '''
+    Model of an op-amp with finite gain and bandwidth
+    '''
+    def __init__(self, A0=2e5, GBW=3e6, fp2=np.inf, name=None):
+        '''
+        Parameters:
+        A0 - open-loop gain at DC
+        GBW - gain-bandwidth product
+        fp2 - second pole frequency, or infinity for a single-pole op-amp
+        name - name of the part, for reports
+
+        The parameters may be arrays, to model a set of op-amps at once.
+        '''
+        self.A0 = np.asarray(A0, dtype=float)
+        self.GBW = np.asarray(GBW, dtype=float)
+        self.fp2 = np.asarray(fp2, dtype=float)
+        self.name = name
+
+    def A(self, f):
+        '''
+        Return the open-loop gain as a complex number
+
+        Parameters:
+        f - Frequency. If the op-amp parameters are arrays, f must
+            broadcast against them.
+
+        The sign of the imaginary part follows the j/wC convention for
+        capacitors that is used in the rest of this file.
+        '''
+        fp1 = self.GBW/self.A0
+        return self.A0/((1 - 1j*f/fp1)*(1 - 1j*f/self.fp2))
+
+def closed_loop(Av, A):
+    '''
+    Return the gain of an inverting amplifier with finite open-loop gain
+
+    Parameters:
+    Av - ideal gain, -Zfb/Zin
+    A - open-loop gain of the op-amp
+    '''
+    return Av/(1 + (1 - Av)/A)
+
+# A few common op-amps, with approximate data sheet figures
+
+opamp_library = OpAmp(
+    A0=np.array([2e5, 1e5, 2e5, 1e5, 1e6]),
+    GBW=np.array([1e6, 1e6, 3e6, 10e6, 8e6]),
+    fp2=np.array([np.inf, np.inf, 10e6, 25e6, 20e6]),
+    name=['LM741', 'LM358', 'TL072', 'NE5532', 'OPA2134'])
+
 class Diff():
     '''
     Model of a differentiator
     '''
-    def __init__(self, R1=1e3, C1=10e-9, R2=100e3, C2=100e-12):
+    def __init__(self, R1=1e3, C1=10e-9, R2=100e3, C2=100e-12, opamp=None):
         '''
         Parameters;
         R1 - input resistor
         C1 - input capacitor
         R2 = feedback resistor
         C2 - compensation capacitor
+        opamp - OpAmp model, or None for an ideal op-amp
         '''
 
         self.R1 = R1
         self.C1 = C1
         self.R2 = R2
         self.C2 = C2
+        self.opamp = opamp
 
     def Zin(self, f):
         '''
@@ -53,32 +127,36 @@ class Diff():
 
     def Av(self, f):
         '''
-        Return the idealized circuit gain as a complex number
+        Return the circuit gain as a complex number, with the op-amp
+        model if the circuit has one and an ideal op-amp otherwise
 
         Parameters:
         f - Frequency
         '''
-        return -self.Zfb(f)/self.Zin(f)
+        Av = -self.Zfb(f)/self.Zin(f)
+        if self.opamp is not None:
+            Av = closed_loop(Av, self.opamp.A(f))
+        return Av
 
     def Gv(self, f):
         '''
-        Return the modulus of the idealized circuit gain in decibels
+        Return the modulus of the circuit gain in decibels, with the
+        op-amp model if the circuit has one
 
         Parameters:
         f - Frequency
         '''
-        return 20*log10(abs(self.Av(f)))
+        return gain_dB(self.Av(f))
 
     def phi(self,f):
         '''
-        Return the idealized circuit phase shift in degrees
+        Return the circuit phase shift in degrees, with the op-amp
+        model if the circuit has one
 
         Parameters:
         f - Frequency
         '''
-        alpha = -angle(self.Av(f), True)
-        alpha = np.where(alpha < 0, alpha, alpha-360.0)
-        return alpha
+        return phase_deg(self.Av(f))
 
     def bode(self, ax, title='Bode plot'):
         '''
@@ -104,8 +182,9 @@ class Diff():
 
         fs = logspace(1, 7, num=70)
 
-        Gs = self.Gv(fs)
-        phis = self.phi(fs)
+        Avs = self.Av(fs)
+        Gs = gain_dB(Avs)
+        phis = phase_deg(Avs)
         minG = min(Gs)
         maxG = max(Gs)
         Grange = maxG - minG
@@ -201,24 +280,326 @@ class Diff():
         ax.plot(fs, Gs, '-b')
         ax2.plot(fs, phis, '-r')
 
+class DiffBatch():
+    '''
+    Model of many differentiator designs at once, evaluated over a
+    common grid of frequencies
+    '''
+    def __init__(self, f, R1=1e3, C1=10e-9, R2=100e3, C2=100e-12,
+                 opamp=None):
+        '''
+        Parameters:
+        f - Array of frequencies
+        R1 - input resistors
+        C1 - input capacitors
+        R2 - feedback resistors
+        C2 - compensation capacitors
+        opamp - OpAmp model, or None for an ideal op-amp
+
+        The component values, and the parameters of the op-amp model,
+        may be scalars or arrays; they are broadcast against one another
+        to give the set of designs. The complex gain of every design at
+        every frequency is computed once, here, as an array of shape
+        (designs..., frequencies).
+        '''
+
+        self.f = np.asarray(f, dtype=float)
+        values = [np.asarray(x, dtype=float) for x in (R1, C1, R2, C2)]
+        if opamp is not None:
+            values += [opamp.A0, opamp.GBW, opamp.fp2]
+        values = np.broadcast_arrays(*values)
+        self.R1, self.C1, self.R2, self.C2 = values[:4]
+        R1, C1, R2, C2 = [x[..., np.newaxis] for x in values[:4]]
+        w = 2*pi*self.f
+        Zin = R1 + 1j/(w*C1)
+        Zfb = R2/(1 - 1j*w*R2*C2)
+        self.Av = -Zfb/Zin
+        if opamp is not None:
+            A0, GBW, fp2 = [x[..., np.newaxis] for x in values[4:]]
+            self.Av = closed_loop(self.Av, OpAmp(A0, GBW, fp2).A(self.f))
+
+    def Gv(self):
+        '''
+        Return the modulus of the circuit gains in decibels
+        '''
+        return gain_dB(self.Av)
+
+    def phi(self):
+        '''
+        Return the circuit phase shifts in degrees
+        '''
+        return phase_deg(self.Av)
+
+    def corners(self):
+        '''
+        Return the corner frequencies (f1, fc, f2) of every design.
+
+        f1 is where the differentiator's gain crosses 0 dB, fc is where
+        it stops differentiating, and f2 is where the integrating
+        slope crosses 0 dB. fc and f2 are NaN for designs that do
+        not have them.
+        '''
+        R1, C1, R2, C2 = self.R1, self.C1, self.R2, self.C2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f1 = 1/(2*pi*C1*R2)
+            f2 = np.where((R1 > 0) & (C2 > 0), 1/(2*pi*R1*C2), np.nan)
+            fc = np.select([(R1 > 0) & (C2 > 0), R1 > 0, C2 > 0],
+                           [1/(2*pi*sqrt(R1*C1*R2*C2)),
+                            1/(2*pi*C1*R1),
+                            1/(2*pi*R2*C2)],
+                           np.nan)
+        return f1, fc, f2
+
+def screen_opamps(ckt, library=opamp_library, fs=logspace(1, 7, num=601)):
+    '''
+    Compare the response of a differentiator built with each op-amp
+    in a library against its idealized response
+
+    Parameters:
+    ckt - Diff object giving the design
+    library - OpAmp object whose parameters are arrays, one element
+              per op-amp
+    fs - Frequencies at which to evaluate the response
+
+    Prints, and returns as arrays, the peak gain of each op-amp's
+    circuit, the frequency of the peak, and the largest deviation in
+    gain from the idealized circuit at frequencies below both peaks,
+    that of the op-amp's circuit and that of the idealized one.
+    '''
+    ideal = DiffBatch(fs, ckt.R1, ckt.C1, ckt.R2, ckt.C2).Gv()
+    real = DiffBatch(fs, ckt.R1, ckt.C1, ckt.R2, ckt.C2, opamp=library).Gv()
+    peak = np.max(real, axis=-1)
+    fpeak = fs[np.argmax(real, axis=-1)]
+    band = fs <= np.minimum(fs[np.argmax(ideal)], fpeak)[..., np.newaxis]
+    error = np.max(np.where(band, np.abs(real - ideal), 0), axis=-1)
+    names = library.name
+    if names is None:
+        names = [str(i) for i in range(peak.shape[0])]
+    print(f'{"Op-amp":<10} {"Peak gain":>10} {"at":>12} {"Max error":>10}')
+    for name, G, fp, err in zip(names, peak, fpeak, error):
+        print(f'{name:<10} {dBFormatter(G):>10} {HzFormatter(fp):>12} '
+              f'{dBFormatter(err):>10}')
+    return peak, fpeak, error
+
+def hist_rows(x, span, step):
+    '''
+    Histogram each column of a 2-d array into equal bins
+
+    Parameters:
+    x - Array of shape (samples, columns)
+    span - The bins cover [-span, span); values outside land in the end bins
+    step - Width of a bin
+
+    Returns an array of counts of shape (columns, bins)
+    '''
+    nbins = int(round(2*span/step))
+    ncols = x.shape[-1]
+    idx = np.clip(np.floor((x + span)/step).astype(np.int64), 0, nbins-1)
+    flat = idx + nbins*np.arange(ncols)
+    return np.bincount(flat.ravel(),
+                       minlength=ncols*nbins).reshape(ncols, nbins)
+
+def hist_percentiles(counts, span, step, ps):
+    '''
+    Find percentiles of the values in each row of a histogram
+
+    Parameters:
+    counts - Histogram counts from hist_rows
+    span, step - Bins used in hist_rows
+    ps - Percentiles to find
+
+    Returns an array of shape (percentiles, rows)
+    '''
+    cdf = np.cumsum(counts, axis=-1) / np.sum(counts, axis=-1, keepdims=True)
+    qs = np.asarray(ps)[:, np.newaxis, np.newaxis] / 100
+    idx = np.argmax(cdf[np.newaxis] >= qs, axis=-1)
+    return -span + (idx + 0.5)*step
+
+def draw_values(rng, nominal, tol, n):
+    '''
+    Draw component values from a tolerance distribution.
+
+    The values are normally distributed around 'nominal', with the
+    tolerance taken as three standard deviations, and clipped to the
+    tolerance band.
+    '''
+    dev = np.clip(rng.standard_normal(n) * tol/3, -tol, tol)
+    return nominal * (1 + dev)
+
+def monte_carlo(ckt, ax, title='Monte Carlo tolerance analysis',
+                n=200000, tol_R=0.01, tol_C=0.05, chunk=10000, seed=None):
+    '''
+    Produce a Bode plot showing the spread of a differentiator's response
+    when it is built with toleranced components
+
+    Parameters:
+    ckt - Diff object giving the nominal design
+    ax - matplotlib Axes object where the plot should be produced
+    title - Title of the plot
+    n - Number of component sets to draw
+    tol_R - Tolerance of the resistors (0.01 = 1%)
+    tol_C - Tolerance of the capacitors
+    chunk - Number of component sets to evaluate at once. Memory use
+            depends on this and not on n.
+    seed - Seed for the random number generator
+
+    The deviations of gain and phase from the nominal design are
+    accumulated in fine histograms at each frequency, from which the
+    percentile bands are read. Returns a dictionary whose keys are
+    'f1', 'fc' and 'f2', and whose values are the 0.5, 2.5, 50, 97.5
+    and 99.5 percentiles of the corresponding corner frequency.
+    '''
+
+    rng = np.random.default_rng(seed)
+    fs = logspace(1, 7, num=70)
+    nom = DiffBatch(fs, ckt.R1, ckt.C1, ckt.R2, ckt.C2)
+    G0 = nom.Gv()
+    phi0 = nom.phi()
+
+    G_span, G_step = 10.0, 0.001
+    phi_span, phi_step = 45.0, 0.005
+    G_counts = 0
+    phi_counts = 0
+    corners = []
+    for start in range(0, n, chunk):
+        m = min(chunk, n - start)
+        batch = DiffBatch(fs,
+                          R1=draw_values(rng, ckt.R1, tol_R, m),
+                          C1=draw_values(rng, ckt.C1, tol_C, m),
+                          R2=draw_values(rng, ckt.R2, tol_R, m),
+                          C2=draw_values(rng, ckt.C2, tol_C, m))
+        dG = batch.Gv() - G0
+        dphi = (batch.phi() - phi0 + 180) % 360 - 180
+        G_counts = G_counts + hist_rows(dG, G_span, G_step)
+        phi_counts = phi_counts + hist_rows(dphi, phi_span, phi_step)
+        corners.append(np.stack(batch.corners(), axis=-1))
+    corners = np.concatenate(corners)
+
+    ps = [0.5, 2.5, 50, 97.5, 99.5]
+    Gs = G0 + hist_percentiles(G_counts, G_span, G_step, ps)
+    phis = phi0 + hist_percentiles(phi_counts, phi_span, phi_step, ps)
+
+    ax.set_title(title)
+    ax.set_xscale('log')
+    ax.set_xlabel('Frequency (Hz)', color='k')
+    ax.xaxis.set_major_formatter(HzFormatter)
+    ax.set_ylabel('Gain (dB)', color='b')
+    ax2 = ax.twinx()
+    ax2.set_ylabel('Phase shift (deg)', color='r')
+    ax.fill_between(fs, Gs[0], Gs[4], color='b', alpha=0.15, linewidth=0)
+    ax.fill_between(fs, Gs[1], Gs[3], color='b', alpha=0.3, linewidth=0)
+    ax.plot(fs, Gs[2], '-b')
+    ax2.fill_between(fs, phis[0], phis[4], color='r', alpha=0.15, linewidth=0)
+    ax2.fill_between(fs, phis[1], phis[3], color='r', alpha=0.3, linewidth=0)
+    ax2.plot(fs, phis[2], '-r')
+
+    result = {}
+    print(f'{title}: {n} trials, R {100*tol_R:g}%, C {100*tol_C:g}%')
+    for name, values in zip(['f1', 'fc', 'f2'], corners.T):
+        if np.all(np.isnan(values)):
+            continue
+        result[name] = np.nanpercentile(values, ps)
+        lo, med, hi = result[name][1:4]
+        print(f'    {name}: median {HzFormatter(med)}, 95% between '
+              f'{HzFormatter(lo)} and {HzFormatter(hi)} '
+              f'({100*np.nanstd(values)/np.nanmean(values):.2f}% rms)')
+    return result
+
+
+def draw_bode(ax, title, opamp=None, **values):
+    '''
+    Draw the Bode plot of a differentiator
+
+    Parameters:
+    ax - matplotlib Axes object where the plot should be produced
+    title - Title of the plot
+    opamp - Dictionary of OpAmp parameters, or None for an ideal op-amp
+    values - Component values, passed to Diff
+    '''
+    if opamp is not None:
+        values['opamp'] = OpAmp(**opamp)
+    Diff(**values).bode(ax, title=title)
+
+def draw_monte_carlo(ax, title, n, tol_R, tol_C, seed, **values):
+    '''
+    Draw the Monte Carlo tolerance analysis of a differentiator
+
+    Parameters:
+    ax - matplotlib Axes object where the plot should be produced
+    title - Title of the plot
+    n, tol_R, tol_C, seed - Parameters of the analysis, see monte_carlo
+    values - Nominal component values, passed to Diff
+    '''
+    monte_carlo(Diff(**values), ax, title=title, n=n,
+                tol_R=tol_R, tol_C=tol_C, seed=seed)
+
+def figure_specs(cmd_args):
+    '''
+    List the figures that the script produces
+
+    Parameters:
+    cmd_args - Parsed command line arguments
+
+    Returns a list of (filename, draw, args) triples. Each figure is
+    drawn by calling draw(ax, **args); args must be JSON-serializable,
+    because it is hashed to decide whether the figure has changed.
+    '''
+    specs = [
+        ('Images/diff-ideal.png', draw_bode,
+         {'title': "'Ideal' differentiator", 'R1': 0, 'C2': 0}),
+        ('Images/diff-with-R1.png', draw_bode,
+         {'title': "Differentiator with input resistor added",
+          'R1': 1000, 'C2': 0}),
+        ('Images/diff-integ.png', draw_bode,
+         {'title': "Practical differentiator", 'R1': 1000, 'C2': 100e-12}),
+    ]
+    if cmd_args.trials > 0:
+        specs.append(('Images/diff-integ-tolerance.png', draw_monte_carlo,
+                      {'title': "Practical differentiator, toleranced parts",
+                       'n': cmd_args.trials, 'tol_R': cmd_args.tol_R,
+                       'tol_C': cmd_args.tol_C, 'seed': 1,
+                       'R1': 1000, 'C2': 100e-12}))
+    if cmd_args.opamps:
+        specs.append(('Images/diff-integ-gbw.png', draw_bode,
+                      {'title': "Practical differentiator, 3\N{THIN SPACE}MHz"
+                       " GBW op-amp", 'R1': 1000, 'C2': 100e-12,
+                       'opamp': {'A0': 2e5, 'GBW': 3e6}}))
+    return specs
 
-ckt1 = Diff(R1=0, C2=0)
-fig = plt.figure(figsize=(8, 4.5), dpi=200)
-ax = fig.add_subplot(1, 1, 1)
-ckt1.bode(ax, title="'Ideal' differentiator")
-fig.savefig('Images/diff-ideal.png', dpi=200)
+if __name__ == '__main__':
 
-ckt2 = Diff(R1=1000, C2=0)
-fig = plt.figure(figsize=(8, 4.5), dpi=200)
-ax = fig.add_subplot(1, 1, 1)
-ckt2.bode(ax, title="Differentiator with input resistor added")
-fig.savefig('Images/diff-with-R1.png', dpi=200)
+    parser = argparse.ArgumentParser\
+        (description='Produce the Bode plots of the differentiator.')
+    parser.add_argument('--monte-carlo', dest='trials', type=int, default=0,
+                        help='Number of trials in a tolerance analysis of the'
+                        ' practical differentiator')
+    parser.add_argument('--tol-r', dest='tol_R', type=float, default=0.01,
+                        help='Resistor tolerance for the tolerance analysis')
+    parser.add_argument('--tol-c', dest='tol_C', type=float, default=0.05,
+                        help='Capacitor tolerance for the tolerance analysis')
+    parser.add_argument('--opamps', dest='opamps', action='store_true',
+                        help='Plot the practical differentiator with real'
+                        ' op-amps and screen a library of op-amps against it')
+    parser.add_argument('--headless', dest='headless', action='store_true',
+                        help='Render the figures in parallel without'
+                        ' displaying them, skipping any that are unchanged')
+    parser.add_argument('--jobs', dest='jobs', type=int, default=None,
+                        help='Number of processes to use with --headless')
+    cmd_args = parser.parse_args()
 
-ckt3 = Diff(R1=1000, C2=100e-12)
-fig = plt.figure(figsize=(8, 4.5), dpi=200)
-ax = fig.add_subplot(1, 1, 1)
-ckt3.bode(ax, title="Practical differentiator")
-fig.savefig('Images/diff-integ.png', dpi=200)
+    os.makedirs('Images', exist_ok=True)
+    specs = figure_specs(cmd_args)
+    if cmd_args.headless:
+        render_all_headless(specs, cmd_args.jobs)
+    else:
+        for spec in specs:
+            render_figure(*spec)
 
-plt.show()
+    if cmd_args.opamps:
+        print('Practical differentiator:')
+        screen_opamps(Diff(R1=1000, C2=100e-12))
+        print('Ideal differentiator:')
+        screen_opamps(Diff(R1=0, C2=0))
 
+    if not cmd_args.headless:
+        plt.show()
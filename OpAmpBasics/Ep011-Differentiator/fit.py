@@ -0,0 +1,268 @@
+'''
+Fit the differentiator model in 'bode.py' to measured Bode plots.
+
+Usage: fit.py [options] <file.csv|directory>...
+
+The measured data are CSV files with 'Freq', 'Gain' and 'Phase' columns,
+such as are written by Synth/Ep007a-Integrator-vs-LPF/bode.py. A
+directory stands for all the CSV files in it. Files without those
+columns, such as the job lists and statistics that orchestrate.py
+writes beside the sweeps, are skipped with a note. The files are
+fitted in parallel, each in its own process.
+
+For each file, the component values R1, C1, R2 and C2 are adjusted
+to minimize the difference between the logarithms of the measured
+and modelled complex gains, so that errors in gain (in nepers) and
+phase (in radians) carry equal weight at every frequency. The model
+has a scale invariance (multiplying all the resistors by k and
+dividing all the capacitors by k leaves the response unchanged),
+so one of the components must be held at its nominal value;
+by default, it is C1.
+
+Each fit is plotted over the measurement, in a PNG file beside the
+CSV file, and the fitted values are written to a summary CSV file.
+A file that cannot be fitted gets a row in the summary giving the
+error, and the exit status is nonzero if any file failed.
+'''
+
+import argparse
+import csv
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+from numpy import log, pi
+from matplotlib import pyplot as plt
+from scipy.optimize import least_squares
+
+from bode import Diff, DiffBatch, HzFormatter, gain_dB, phase_deg
+
+param_names = ['R1', 'C1', 'R2', 'C2']
+bode_columns = ['Freq', 'Gain', 'Phase']
+
+def has_bode_columns(path):
+    '''
+    Tell whether a CSV file has the columns of a measured Bode plot
+
+    Parameters:
+    path - Path name of the CSV file
+
+    A file that cannot be read is taken to have them, so that trying
+    to fit it reports the error.
+    '''
+    try:
+        with open(path, newline='') as csvfile:
+            header = next(csv.reader(csvfile), [])
+    except (OSError, UnicodeDecodeError):
+        return True
+    return all(name in header for name in bode_columns)
+
+def load_bode_csv(path):
+    '''
+    Read a measured Bode plot
+
+    Parameters:
+    path - Path name of a CSV file with 'Freq', 'Gain' and 'Phase' columns
+
+    Returns a triple (f, G, phi) of arrays giving the frequencies,
+    gains in dB and phase shifts in degrees.
+    '''
+    with open(path, newline='') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    f = np.array([float(row['Freq']) for row in rows])
+    G = np.array([float(row['Gain']) for row in rows])
+    phi = np.array([float(row['Phase']) for row in rows])
+    return f, G, phi
+
+def log_response(logp, f):
+    '''
+    Return the logarithm of the model's complex gain and its Jacobian
+
+    Parameters:
+    logp - Natural logarithms of R1, C1, R2 and C2
+    f - Frequencies
+
+    Returns a pair (lnA, J), where lnA is log|Av| + j*phase at each
+    frequency, and J, of shape (frequencies, 4), holds its derivatives
+    with respect to the elements of logp.
+
+    Diff writes the impedance of a capacitor as j/wC, so the angle
+    of its Av is the negative of the phase shift; the conjugates here
+    put the result back in terms of the phase shift.
+    '''
+    R1, C1, R2, C2 = np.exp(logp)
+    w = 2*pi*f
+    Zin = R1 + 1j/(w*C1)
+    D = 1 - 1j*w*R2*C2
+    lnA = log(DiffBatch(f, R1, C1, R2, C2).Av)
+    J = np.stack([-R1/Zin, (1j/(w*C1))/Zin, 1/D, 1j*w*R2*C2/D], axis=-1)
+    return np.conj(lnA), np.conj(J)
+
+def fit_bode(f, G, phi, guess, fixed='C1'):
+    '''
+    Fit the model to a measured Bode plot
+
+    Parameters:
+    f, G, phi - Measured frequencies, gains (dB) and phase shifts (deg)
+    guess - Diff object giving the starting values
+    fixed - Name of the component to hold at its starting value
+
+    Returns a pair (ckt, result), where ckt is a Diff object holding the
+    fitted values and result is the result from least_squares.
+    '''
+    measured = G*log(10)/20 + 1j*np.radians(phi)
+    logp0 = log([guess.R1, guess.C1, guess.R2, guess.C2])
+    free = [i for i, name in enumerate(param_names) if name != fixed]
+
+    def unpack(x):
+        logp = logp0.copy()
+        logp[free] = x
+        return logp
+
+    def residuals(x):
+        r = log_response(unpack(x), f)[0] - measured
+        return np.concatenate([r.real, np.angle(np.exp(1j*r.imag))])
+
+    def jacobian(x):
+        J = log_response(unpack(x), f)[1][:, free]
+        return np.concatenate([J.real, J.imag])
+
+    result = least_squares(residuals, logp0[free], jac=jacobian)
+    R1, C1, R2, C2 = np.exp(unpack(result.x))
+    return Diff(R1=R1, C1=C1, R2=R2, C2=C2), result
+
+def plot_fit(ax, ckt, f, G, phi, title):
+    '''
+    Plot a fitted model over the measurement that it was fitted to
+
+    Parameters:
+    ax - matplotlib Axes object where the plot should be produced
+    ckt - Diff object giving the fitted model
+    f, G, phi - Measured frequencies, gains (dB) and phase shifts (deg)
+    title - Title of the plot
+    '''
+    fs = np.logspace(np.log10(f[0]), np.log10(f[-1]), 200)
+    Avs = ckt.Av(fs)
+    ax.set_title(title)
+    ax.set_xscale('log')
+    ax.set_xlabel('Frequency (Hz)', color='k')
+    ax.xaxis.set_major_formatter(HzFormatter)
+    ax.set_ylabel('Gain (dB)', color='b')
+    ax2 = ax.twinx()
+    ax2.set_ylabel('Phase shift (deg)', color='r')
+    ax.plot(f, G, '+b')
+    ax.plot(fs, gain_dB(Avs), '-b', linewidth=0.75)
+    ax2.plot(f, (phi - 360) % -360, '+r')
+    ax2.plot(fs, phase_deg(Avs), '-r', linewidth=0.75)
+
+def fit_file(path, guess, fixed):
+    '''
+    Fit the model to one CSV file, and plot the fit beside it
+
+    Parameters:
+    path - Path name of the CSV file
+    guess - Diff object giving the starting values
+    fixed - Name of the component to hold at its starting value
+
+    Returns a dictionary summarizing the fit. If the file can't be
+    read or fitted, the component values are NaN and 'Error' gives
+    the reason.
+    '''
+    try:
+        return plot_file_fit(path, guess, fixed)
+    except Exception as e:
+        return {'File': path, 'R1': np.nan, 'C1': np.nan, 'R2': np.nan,
+                'C2': np.nan, 'GainRMS': np.nan, 'PhaseRMS': np.nan,
+                'Converged': False, 'Error': f'{type(e).__name__}: {e}'}
+
+def plot_file_fit(path, guess, fixed):
+    '''
+    Fit the model to one CSV file, and plot the fit beside it, letting
+    any error propagate. Parameters and result are as for fit_file.
+    '''
+    f, G, phi = load_bode_csv(path)
+    ckt, result = fit_bode(f, G, phi, guess, fixed)
+    n = f.shape[0]
+    rms_G = 20/log(10) * np.sqrt(np.mean(result.fun[:n]**2))
+    rms_phi = np.degrees(np.sqrt(np.mean(result.fun[n:]**2)))
+
+    fig = plt.figure(figsize=(8, 4.5), dpi=200)
+    try:
+        ax = fig.add_subplot(1, 1, 1)
+        title = (f'{os.path.basename(path)}: R1={ckt.R1:.4g} '
+                 f'C1={ckt.C1:.4g} R2={ckt.R2:.4g} C2={ckt.C2:.4g}')
+        plot_fit(ax, ckt, f, G, phi, title)
+        fig.savefig(os.path.splitext(path)[0] + '-fit.png', dpi=200)
+    finally:
+        plt.close(fig)
+
+    return {'File': path, 'R1': ckt.R1, 'C1': ckt.C1, 'R2': ckt.R2,
+            'C2': ckt.C2, 'GainRMS': rms_G, 'PhaseRMS': rms_phi,
+            'Converged': result.success, 'Error': ''}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser\
+        (description='Fit the differentiator model to measured Bode plots.')
+    parser.add_argument('paths', metavar='file.csv|directory', nargs='+',
+                        help='Measured Bode plots, or directories of them')
+    parser.add_argument('--R1', type=float, default=1e3,
+                        help='Starting value of R1')
+    parser.add_argument('--C1', type=float, default=10e-9,
+                        help='Starting value of C1')
+    parser.add_argument('--R2', type=float, default=100e3,
+                        help='Starting value of R2')
+    parser.add_argument('--C2', type=float, default=100e-12,
+                        help='Starting value of C2')
+    parser.add_argument('--fixed', choices=param_names, default='C1',
+                        help='Component held at its starting value')
+    parser.add_argument('--summary', default='fits.csv',
+                        help='CSV file that receives the fitted values')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Number of files to fit at once')
+    cmd_args = parser.parse_args()
+
+    paths = []
+    for p in cmd_args.paths:
+        if os.path.isdir(p):
+            paths.extend(sorted(glob.glob(os.path.join(p, '*.csv'))))
+        else:
+            paths.append(p)
+    summary = os.path.abspath(cmd_args.summary)
+    paths = [p for p in paths if os.path.abspath(p) != summary]
+    for p in [p for p in paths if not has_bode_columns(p)]:
+        print(f'{p}: skipped, no {"/".join(bode_columns)} columns')
+    paths = [p for p in paths if has_bode_columns(p)]
+    if not paths:
+        print('no data: no CSV files to fit in',
+              ', '.join(cmd_args.paths))
+        sys.exit(0)
+    guess = Diff(R1=cmd_args.R1, C1=cmd_args.C1,
+                 R2=cmd_args.R2, C2=cmd_args.C2)
+
+    with ProcessPoolExecutor(max_workers=cmd_args.jobs) as pool:
+        fits = list(pool.map(fit_file, paths, repeat(guess),
+                             repeat(cmd_args.fixed)))
+
+    with open(cmd_args.summary, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=list(fits[0].keys()))
+        writer.writeheader()
+        writer.writerows(fits)
+    failed = 0
+    for fit in fits:
+        if fit['Error']:
+            print(f'{fit["File"]}: failed, {fit["Error"]}')
+            failed += 1
+        else:
+            print(f'{fit["File"]}: R1={fit["R1"]:.4g} C1={fit["C1"]:.4g} '
+                  f'R2={fit["R2"]:.4g} C2={fit["C2"]:.4g} '
+                  f'(rms error {fit["GainRMS"]:.2f} dB, '
+                  f'{fit["PhaseRMS"]:.2f} deg)')
+    if failed:
+        print(f'{failed} of {len(fits)} fits failed')
+        sys.exit(1)
@@ -0,0 +1,73 @@
+# Derives the equations for the design calculations for the
+# quick-and-dirty noise source, and writes them to 'bias_equations.py'
+# as plain NumPy code for 'calculations.py' to use. Run this again
+# whenever the equations change; it needs sympy, but
+# 'calculations.py' does not.
+
+import os
+import sys
+from sympy import symbols
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'CircuitTools'))
+from codegen import write_module
+from solvecache import cached_solve
+
+# KNOWN VALUES
+
+# 3 resistor values (see schematic)
+R1, R2, R3 = symbols('R1 R2 R3')
+
+# Forward voltage drop of the B-E junction of Q2
+Vdrop = symbols('Vdrop')
+
+# Reverse avalanche voltage of the B-E junction of Q1
+Vzener = symbols('Vzener')
+
+# Positive power supply voltage
+Vcc = symbols('Vcc')
+
+# Current gain of Q2
+beta = symbols('beta')
+
+# UNKNOWN VALUES
+
+# DC voltages, currents 
+V_A, V_B, V_C, V_D = symbols('V_A V_B V_C V_D')
+I_R1, I_R2 = symbols('I_R1 I_R2')
+
+# Base current of Q2 is just I_R1 because there's no other path for it to flow
+# I_R2 is alpha*I_R3 but alpha is close enough to 1 to ignore
+
+# Solve equations to give the calculation/solution
+
+constraints = [
+    (Vcc - V_A) - (I_R1 * R1),    # Ohm's Law, R1
+    (V_A - V_B) - Vzener,         # Zener voltae
+    (V_B - V_C) - Vdrop,          # Diode drop
+    (Vcc - V_D) - (I_R2 * R2),    # Ohm's Law, R2
+    V_C - (I_R2 * R3),            # Ohm's Law, R3
+    I_R2 - beta * I_R1,           # Transistor h_FE
+]
+unknowns = [I_R1, I_R2, V_A, V_B, V_C, V_D]
+solns = cached_solve(constraints, unknowns, 'simplify', 'factor')
+
+# Print the values we found
+
+for s in solns:
+    for v, val in s.items():
+        print(f'{v} = {val}')
+
+# Write them out as code
+
+here = os.path.dirname(os.path.abspath(__file__))
+write_module(os.path.join(here, 'bias_equations.py'), __file__,
+             'Equations for the design calculations for the quick-and-dirty'
+             ' noise source',
+             functions=[('operating_point',
+                         [Vcc, Vdrop, Vzener, beta, R1, R2, R3],
+                         [solns[0][v] for v in unknowns],
+                         'Returns the operating point\n'
+                         '(I_R1, I_R2, V_A, V_B, V_C, V_D)')],
+             constants={'solution_text': [f'{v} = {val}'
+                                          for v, val in solns[0].items()]})
@@ -0,0 +1,39 @@
+'''
+Equations for the design calculations for the quick-and-dirty noise source
+
+Generated by 'bias_derive.py'. Do not edit; run that script again
+when the equations change.
+'''
+
+import numpy
+
+source_hash = 'e13cffaa79c9e87e66f3245078b8c9428f248ea2f2fb573b8ae9eef1fc8fdf3f'
+
+solution_text = ['I_R1 = (Vcc - Vdrop - Vzener)/(R1 + R3*beta)',
+ 'I_R2 = beta*(Vcc - Vdrop - Vzener)/(R1 + R3*beta)',
+ 'V_A = (R1*Vdrop + R1*Vzener + R3*Vcc*beta)/(R1 + R3*beta)',
+ 'V_B = (R1*Vdrop + R3*Vcc*beta - R3*Vzener*beta)/(R1 + R3*beta)',
+ 'V_C = R3*beta*(Vcc - Vdrop - Vzener)/(R1 + R3*beta)',
+ 'V_D = (R1*Vcc - R2*Vcc*beta + R2*Vdrop*beta + R2*Vzener*beta + '
+ 'R3*Vcc*beta)/(R1 + R3*beta)']
+
+
+def operating_point(Vcc, Vdrop, Vzener, beta, R1, R2, R3):
+    '''
+    Returns the operating point
+    (I_R1, I_R2, V_A, V_B, V_C, V_D)
+    '''
+    x0 = R3*beta
+    x1 = (R1 + x0)**(-1.0)
+    x2 = x1*(Vcc - Vdrop - Vzener)
+    x3 = Vcc*x0
+    x4 = R1*Vdrop + x3
+    x5 = R2*beta
+    return (
+        x2,
+        beta*x2,
+        x1*(R1*Vzener + x4),
+        x1*(-Vzener*x0 + x4),
+        x0*x2,
+        x1*(R1*Vcc - Vcc*x5 + Vdrop*x5 + Vzener*x5 + x3),
+    )
@@ -1,65 +1,172 @@
 # Python code giving the design calculations for the
 # quick-and-dirty noise source.
 
-from sympy import symbols, solve
-
-# KNOWN VALUES
-
-# 3 resistor values (see schematic)
-R1, R2, R3 = symbols('R1 R2 R3')
-
-# Forward voltage drop of the B-E junction of Q2
-Vdrop = symbols('Vdrop')
-
-# Reverse avalanche voltage of the B-E junction of Q1
-Vzener = symbols('Vzener')
-
-# Positive power supply voltage
-Vcc = symbols('Vcc')
-
-# Current gain of Q2
-beta = symbols('beta')
-
-# UNKNOWN VALUES
-
-# DC voltages, currents 
-V_A, V_B, V_C, V_D = symbols('V_A V_B V_C V_D')
-I_R1, I_R2 = symbols('I_R1 I_R2')
+import argparse
+import numpy as np
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'CircuitTools'))
+from equations import load_equations
+
+# Standard resistor values in one decade
+
+e24 = np.array([1.0, 1.1, 1.2, 1.3, 1.5, 1.6, 1.8, 2.0, 2.2, 2.4, 2.7, 3.0,
+                3.3, 3.6, 3.9, 4.3, 4.7, 5.1, 5.6, 6.2, 6.8, 7.5, 8.2, 9.1])
+
+def series_values(base, lo, hi):
+    '''
+    Returns the values of a resistor series between lo and hi, inclusive
+    '''
+    decades = np.arange(np.floor(np.log10(lo)), np.ceil(np.log10(hi)) + 1)
+    vals = np.round((base[np.newaxis, :] * 10**decades[:, np.newaxis])
+                    .ravel(), 6)
+    return vals[(vals >= lo) & (vals <= hi)]
+
+def sweep_operating_point(point, R1s, R2s, R3s, Vccs, Vzeners, betas, Vdrop,
+                          iz_range, ic_max, vce_min):
+    '''
+    Evaluates the operating point over every combination of resistors
+    and every supply, zener voltage and current gain, all at once.
+
+    point - Compiled function giving (I_R1, I_R2, V_A, V_B, V_C, V_D)
+            from (Vcc, Vdrop, Vzener, beta, R1, R2, R3)
+    R1s, R2s, R3s - Arrays of the values that the resistors may take
+    Vccs, Vzeners, betas - Arrays of the supply voltages, avalanche
+                           voltages and current gains to allow for
+    Vdrop - Forward drop of the B-E junction of Q2
+    iz_range - Pair (lo, hi) bounding the avalanche current I_R1
+    ic_max - Largest acceptable collector current I_R2
+    vce_min - Smallest acceptable collector-emitter voltage of Q2
+
+    The arguments are laid along the six axes of one grid, so the
+    compiled expressions are evaluated once over the whole design space.
+    A combination of resistors is acceptable if the operating point
+    stays inside the limits at every supply, zener voltage and gain.
+
+    Returns an array with a row (R1, R2, R3, I_R1 min, I_R1 max,
+    I_R2 min, I_R2 max, V_D min, V_D max, swing) for each acceptable
+    combination, in order of decreasing 'swing', the worst-case room
+    that the collector of Q2 has to move before it hits either the
+    supply or saturation.
+    '''
+    grid = np.ix_(R1s, R2s, R3s, Vccs, Vzeners, betas)
+    R1g, R2g, R3g, Vccg, Vzg, betag = grid
+    shape = np.broadcast_shapes(*(g.shape for g in grid))
+    I1, I2, VA, VB, VC, VD = (np.broadcast_to(v, shape) for v in
+                              point(Vccg, Vdrop, Vzg, betag, R1g, R2g, R3g))
+
+    spread = (3, 4, 5)
+    ok = ((I1 >= iz_range[0]) & (I1 <= iz_range[1])
+          & (I2 <= ic_max) & (VD - VC >= vce_min)).all(axis=spread)
+    swing = np.minimum(VD - VC - vce_min, Vccg - VD).min(axis=spread)
+
+    R1c, R2c, R3c = (np.broadcast_to(g.reshape(g.shape[:3]), ok.shape)
+                     for g in (R1g, R2g, R3g))
+    found = np.stack([a[ok] for a in
+                      (R1c, R2c, R3c,
+                       I1.min(axis=spread), I1.max(axis=spread),
+                       I2.min(axis=spread), I2.max(axis=spread),
+                       VD.min(axis=spread), VD.max(axis=spread), swing)],
+                     axis=-1)
+    return found[np.argsort(-found[:, -1], kind='stable')]
+
+
+parser = argparse.ArgumentParser\
+    (description='Design calculations for the noise source\'s bias network.')
+parser.add_argument('--nominal', action='store_true',
+                    help='Evaluate the solution at the nominal values')
+parser.add_argument('--sweep', action='store_true',
+                    help='Search E24 resistors for an operating point that'
+                    ' stays inside the limits')
+parser.add_argument('--vcc', type=float, nargs='+', default=[11.4, 12.0, 12.6],
+                    help='Supply voltages to allow for')
+parser.add_argument('--vzener', type=float, nargs='+',
+                    default=[6.5, 7.0, 7.5],
+                    help='Avalanche voltages of Q1 to allow for')
+parser.add_argument('--vdrop', type=float, default=0.7,
+                    help='Forward drop of the B-E junction of Q2')
+parser.add_argument('--beta', type=float, nargs=3, default=[100, 400, 7],
+                    metavar=('MIN', 'MAX', 'STEPS'),
+                    help='Spread of the current gain of Q2')
+parser.add_argument('--r1', type=float, nargs=2, default=[100e3, 2.2e6],
+                    metavar=('MIN', 'MAX'), help='Range of R1')
+parser.add_argument('--r2', type=float, nargs=2, default=[1e3, 22e3],
+                    metavar=('MIN', 'MAX'), help='Range of R2')
+parser.add_argument('--r3', type=float, nargs=2, default=[100, 10e3],
+                    metavar=('MIN', 'MAX'), help='Range of R3')
+parser.add_argument('--iz', type=float, nargs=2, default=[1e-6, 20e-6],
+                    metavar=('MIN', 'MAX'),
+                    help='Acceptable range of the avalanche current in Q1')
+parser.add_argument('--ic-max', type=float, default=5e-3,
+                    help='Largest acceptable collector current in Q2')
+parser.add_argument('--vce-min', type=float, default=1.0,
+                    help='Smallest acceptable collector-emitter voltage'
+                    ' of Q2')
+parser.add_argument('--top', type=int, default=20,
+                    help='Number of combinations to list')
+cmd_args = parser.parse_args()
+
+# Values used for a single operating point: see the schematic
+
+nominal = {
+    'Vcc': 12.0,          # Positive power supply voltage
+    'Vdrop': 0.7,         # Forward voltage drop of the B-E junction of Q2
+    'Vzener': 7.0,        # Reverse avalanche voltage of the B-E junction of Q1
+    'beta': 160.0,        # Current gain of Q2
+    'R1': 680.0e3,
+    'R2': 4.7e3,
+    'R3': 1.0e3,
+}
 
 # Base current of Q2 is just I_R1 because there's no other path for it to flow
 # I_R2 is alpha*I_R3 but alpha is close enough to 1 to ignore
+#
+# The equations are solved in 'bias_derive.py', which is the only script
+# that needs sympy
 
-# UNCOMMENT THE NEXT LINES TO PROVIDE SPECIFIC VALUES
-
-# Vcc = 12.0
-# Vdrop = 0.7
-# Vzener = 7.0
-# beta = 160.0
-# R1 = 680.0e3
-# R2 = 4.7e3
-# R3 = 1.0e3
-
-# Solve equations to give the calculation/solution
-
-constraints = [
-    (Vcc - V_A) - (I_R1 * R1),    # Ohm's Law, R1
-    (V_A - V_B) - Vzener,         # Zener voltae
-    (V_B - V_C) - Vdrop,          # Diode drop
-    (Vcc - V_D) - (I_R2 * R2),    # Ohm's Law, R2
-    V_C - (I_R2 * R3),            # Ohm's Law, R3
-    I_R2 - beta * I_R1,           # Transistor h_FE
-]
-unknowns = [I_R1, I_R2, V_A, V_B, V_C, V_C, V_D]
-solns = solve(constraints, unknowns, dict=True)
+eqns = load_equations(__file__, 'bias_equations', 'bias_derive.py')
 
 # Print the values we found
 
-for s in solns:
-    for v, val in s.items():
-        print(f'{v} = {val.simplify().factor()}')
-
-    
-    
-
-
-
+for line in eqns.solution_text:
+    print(line)
+
+# Evaluate them at the nominal values
+
+if cmd_args.nominal:
+    print()
+    print('With ' + ', '.join(f'{k} = {v:g}' for k, v in nominal.items())
+          + ':')
+    for line, val in zip(eqns.solution_text,
+                         eqns.operating_point(**nominal)):
+        print(f'{line.split(" = ")[0]} = {val:.6g}')
+
+
+# Sweep the design space: every E24 combination of resistors against
+# the whole spread of supply, zener voltage and current gain
+
+if cmd_args.sweep:
+    point = eqns.operating_point
+    R1s, R2s, R3s = (series_values(e24, *r) for r in
+                     (cmd_args.r1, cmd_args.r2, cmd_args.r3))
+    betas = np.linspace(cmd_args.beta[0], cmd_args.beta[1],
+                        int(cmd_args.beta[2]))
+    found = sweep_operating_point(point, R1s, R2s, R3s,
+                                  np.array(cmd_args.vcc),
+                                  np.array(cmd_args.vzener), betas,
+                                  cmd_args.vdrop, cmd_args.iz,
+                                  cmd_args.ic_max, cmd_args.vce_min)
+    print()
+    print(f'{len(found)} of {len(R1s) * len(R2s) * len(R3s)} E24'
+          f' combinations stay inside the limits for Vcc in {cmd_args.vcc},'
+          f' Vzener in {cmd_args.vzener}, beta {betas[0]:g}..{betas[-1]:g}')
+    print(f'{"R1":>8} {"R2":>8} {"R3":>8} {"I_R1 (uA)":>13} '
+          f'{"I_R2 (mA)":>13} {"V_D (V)":>13} {"swing":>6}')
+    for (r1, r2, r3, i1lo, i1hi, i2lo, i2hi, vdlo, vdhi,
+         swing) in found[:cmd_args.top]:
+        print(f'{r1:>8.4g} {r2:>8.4g} {r3:>8.4g} '
+              f'{i1lo*1e6:>6.2f}-{i1hi*1e6:<6.2f} '
+              f'{i2lo*1e3:>6.3f}-{i2hi*1e3:<6.3f} '
+              f'{vdlo:>6.2f}-{vdhi:<6.2f} {swing:>6.2f}')
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+'''
+check_analysis.py --
+
+Checks the statistics computed by 'scope-analysis.py' against direct,
+slow computations of the same quantities.
+
+Usage: check_analysis.py
+
+    autocorrelation  The FFT autocorrelation, against np.correlate, for
+                     record lengths whose padded transforms have both
+                     odd and even lengths
+    adc scale        That samples which drift off the ADC scale detected
+                     from the start of a record are rejected
+    capture cache    That a capture with blank lines at its end is cached
+                     intact, and that eviction spares the entries written
+                     since the run began
+
+The exit status is the number of checks that failed.
+'''
+
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from scipy.fft import next_fast_len
+
+spec = importlib.util.spec_from_file_location(
+    'scope_analysis',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                 'scope-analysis.py'))
+scope_analysis = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(scope_analysis)
+
+def report(name, err, tol):
+    '''
+    Prints the outcome of one comparison and returns True if it passed
+    '''
+    ok = bool(err <= tol)
+    print(f'{name:<48} max error {err:10.3g}  {"ok" if ok else "FAILED"}')
+    return ok
+
+def check_autocorrelation():
+    '''
+    Compares autocorrelation() with np.correlate on random codes.
+    1000+28 and 5000+100 samples pad to odd transform lengths (1029
+    and 5103); 1000+24 pads to an even one.
+    '''
+    rng = np.random.default_rng(1)
+    results = []
+    for N, maxlag in ((1000, 28), (5000, 100), (1000, 24)):
+        codes = rng.integers(0, 256, N).astype(np.uint8)
+        x = codes - codes.mean()
+        expected = np.correlate(x, x, 'full')[N-1:N+maxlag]
+        expected /= expected[0]
+        r = scope_analysis.autocorrelation(codes, maxlag)
+        nfft = next_fast_len(N + maxlag)
+        results.append(report(f'autocorrelation: N={N} maxlag={maxlag}'
+                              f' (nfft {nfft})',
+                              np.max(np.abs(r - expected)), 1e-6))
+    return results
+
+def check_adc_scale():
+    '''
+    Converts a record whose later samples are shifted by half an ADC
+    step, and one whose later samples are shifted past the 256 codes,
+    with the scale detected from its first half, and checks that both
+    are rejected while the unshifted record is accepted.
+    '''
+    rng = np.random.default_rng(2)
+    volts = np.float32(0.008 * rng.integers(-100, 100, 2000))
+    scale = scope_analysis.detect_adc_scale(volts[:1000])
+    results = []
+    for name, shift, fails in (('unshifted', 0.0, False),
+                               ('half a step off the grid', 0.004, True),
+                               ('past the last code', 1.2, True)):
+        x = volts.copy()
+        x[1000:] += np.float32(shift)
+        try:
+            codes = scale.to_codes(x[1000:], 1000)
+            err = np.max(np.abs(scale.to_volts(codes) - x[1000:]))
+            rejected = False
+        except ValueError:
+            err = 0.0
+            rejected = True
+        results.append(report(f'adc scale: {name}'
+                              f' ({"rejected" if rejected else "accepted"})',
+                              err if rejected == fails else np.inf, 1e-6))
+    return results
+
+def write_capture(path, volts, blank_lines=0):
+    '''
+    Writes samples as a Rigol CSV file, with some blank lines at the end
+    '''
+    with open(path, 'w') as f:
+        f.write('X,CH1,Start,Increment,\nSequence,Volt,0.000000e+00,'
+                '1.000000e-06,\n')
+        for i, v in enumerate(volts):
+            f.write(f'{i},{v:.4e},\n')
+        f.write('\n' * blank_lines)
+
+def check_capture_cache():
+    '''
+    Caches a capture whose line count overstates its samples, which
+    makes load_capture rewrite the cached array, and compares the cached
+    codes with the samples. Then caches two captures, backdates one of
+    them, and checks that eviction to a zero budget removes only the
+    one from before the run.
+    '''
+    rng = np.random.default_rng(3)
+    volts = 0.008 * rng.integers(-100, 100, 2000)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, 'cache')
+        write_capture(os.path.join(tmp, 'a.csv'), volts, blank_lines=5)
+        codes, scale, _, _ = scope_analysis.load_capture(
+            os.path.join(tmp, 'a.csv'), cache_dir=cache_dir)
+        err = (np.max(np.abs(scale.to_volts(codes) - volts))
+               if codes.shape[0] == volts.shape[0] else np.inf)
+        del codes
+        results.append(report('capture cache: blank lines at the end',
+                              err, 1e-6))
+
+        since = time.time()
+        write_capture(os.path.join(tmp, 'b.csv'), volts[::-1])
+        scope_analysis.load_capture(os.path.join(tmp, 'b.csv'),
+                                    cache_dir=cache_dir)
+        old = scope_analysis.cache_paths(cache_dir,
+                                         os.path.join(tmp, 'a.csv'), 'CH1')
+        new = scope_analysis.cache_paths(cache_dir,
+                                         os.path.join(tmp, 'b.csv'), 'CH1')
+        os.utime(old[1], (since - 100, since - 100))
+        scope_analysis.evict_captures(cache_dir, 0, since=since)
+        wrong = sum(os.path.exists(p) for p in old) \
+            + sum(not os.path.exists(p) for p in new)
+        results.append(report('capture cache: eviction spares this run',
+                              wrong, 0))
+    return results
+
+
+if __name__ == '__main__':
+
+    results = check_autocorrelation() + check_adc_scale() \
+        + check_capture_cache()
+    sys.exit(results.count(False))
@@ -1,107 +1,1015 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import csv
+import glob
+import hashlib
+from itertools import chain, islice, repeat
+import json
 import numpy as np
+import os
 import matplotlib.pyplot as plt
-from scipy.fft import fft
-from scipy.signal import periodogram, welch
+from scipy.fft import fft, irfft, next_fast_len, rfft, rfftfreq
+from scipy.signal import get_window, periodogram, welch
 from scipy.stats import norm
 import sys
+import time
 
-# argv[1] is the name of the CSV file saved off the oscilloscope
-
-samplefile = sys.argv[1]
-
-# liszt - list of observed values, in time order
-# startval - initial time point
-# incrval - time increment
-
-liszt = []
-with open(samplefile, newline='') as csvfile:
-    rdr = csv.reader(csvfile)
-    n = 0
-    for row in rdr:
-        n = n + 1
-        if n == 2:
-            startval = float(row[2])
-            incrval = float(row[3])
-            print(f'Start={startval} Incr={incrval}')
-        elif n >= 3:
-            val = np.float32(row[1])
-            liszt.append(val)
-print(f'N = {len(liszt)}')
-liszt = np.array(liszt, dtype=np.float32)
-
-# uniq - unique observed values
-# counts - counts of the observed values
-# binwidth - width of bins using scope's quantization
-
-uniq, counts = np.unique(liszt, return_counts=True)
-binwidth = 1e38
-for idx, val in enumerate(uniq):
-    if idx > 0:
-        thisbin = val - lastval
-        if thisbin < binwidth:
-            binwidth = thisbin
-    lastval = val
-
-# xbar - Sample mean
-# sigma - Sample standard deviation
-# gausscdf - Gaussian CDF corresponding to 'uniq' values
-# empcdf - Empirical CDF corresponding to 'uniq' values
-
-xbar = np.mean(liszt)
-print(f'Mean value = {xbar}')
-sigma = np.std(liszt)
-gausscdf = norm.cdf((uniq  - xbar) / sigma)
-empcdf = np.cumsum(counts) / liszt.shape[0]
-
-fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
-
-# Figure 1 - Histogram of values (unequanl bins)
-
-plt.title(f'Histogram of voltages\nMean = {xbar:.6f} Standard deviation = {sigma:.6f}')
-plt.ylabel("Number of samples")
-plt.xlabel("Voltage")
-plt.hist(liszt, bins=uniq)
-
-# Figure 2 - CDF
-
-fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
-
-plt.title('Cumulative probability density of voltages')
-plt.xlabel('Voltage')
-plt.ylabel('Probability')
-plt.step(uniq, empcdf, label='Observed', where='post')
-plt.plot(uniq, gausscdf, 'k--', label='Gaussian')
-plt.legend()
-
-# Figrue 3 - CDF compared with Gaussian
-
-fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
-
-plt.title('Probability density of voltages, compared with Gaussian')
-plt.xlabel('Expected CDF for Gaussian distribution')
-plt.ylabel('Empirical CDF for voltage samples')
-plt.plot(gausscdf, empcdf)
-plt.plot([0, 1], [0, 1])
-plt.axis('square')
-
-# Figure 4 - Power spectral densityu
-
-fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
-
-
-freqs1, Pxx = welch(liszt,
-                    fs=1.0/incrval,
-                    window='hann',
-                    nperseg = 0.05 / incrval)
-plt.title('Spectrogram of noise')
-plt.xlabel('Frequency (Hz)')
-plt.ylabel('Power spectral density (V²/Hz)')
-plt.semilogy(freqs1,Pxx)
-plt.ylim([1e-8, 1e-6])
-
-plt.subplots_adjust(left=0.1, bottom=0.1, right=0.9, top=0.9,
-                    wspace=0.3, hspace=0.3)
-
-plt.show()
+def read_rigol_header(f, channel='CH1'):
+    '''
+    Reads the two header lines of a CSV file saved off a Rigol oscilloscope.
 
+    The first line names the columns, and the second gives the units of
+    the data columns and the values of 'Start' (the time of the first
+    sample) and 'Increment' (the sampling interval).
+
+    f - File object open for reading at the start of the file
+    channel - Name of the column that will be read
+
+    Returns a tuple (start, increment, column), where 'column' is the
+    index of the channel's column.
+    '''
+    names = f.readline().rstrip().split(',')
+    values = f.readline().rstrip().split(',')
+    start = float(values[names.index('Start')])
+    incr = float(values[names.index('Increment')])
+    return start, incr, names.index(channel)
+
+def iter_rigol_samples(f, column, chunk=1 << 20):
+    '''
+    Parses the samples of a Rigol CSV file a chunk at a time.
+
+    f - File object positioned after the header lines
+    column - Index of the column to read
+    chunk - Number of lines to parse at a time
+
+    Yields float32 arrays of at most 'chunk' samples, in time order.
+    '''
+    while first := f.readline():
+        block = np.loadtxt(chain([first], islice(f, chunk - 1)),
+                           delimiter=',', usecols=column,
+                           dtype=np.float32, ndmin=1)
+        if block.shape[0] > 0:
+            yield block
+
+def count_samples(path, digest=None):
+    '''
+    Counts the samples in a Rigol CSV file, by counting its lines
+    16 MiB at a time. If 'digest' is a hashlib object, the file's
+    contents are fed to it on the way.
+    '''
+    nlines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        while block := f.read(1 << 24):
+            nlines += block.count(b'\n')
+            last = block[-1:]
+            if digest is not None:
+                digest.update(block)
+    if last != b'\n':
+        nlines += 1
+    return max(nlines - 2, 0)
+
+class AdcScale:
+    '''
+    Relation between the 8-bit codes of the scope's ADC and volts:
+    volts = offset + step*code
+    '''
+
+    def __init__(self, step, offset):
+        self.step = step
+        self.offset = offset
+
+    def to_codes(self, x, first=0):
+        '''
+        Converts an array of voltages to an array of uint8 codes.
+
+        x - Voltages
+        first - Number of the first sample of x in its record, for
+                error messages
+
+        Raises ValueError if a voltage is outside the 256 codes, or
+        is further from the nearest code than a quarter of a step plus
+        the rounding of the three significant digits in a Rigol CSV
+        file. Either means that the scale, which is detected from the
+        start of a record, does not fit the rest of it; for instance,
+        the vertical scale or offset of the scope changed during the
+        capture.
+        '''
+        codes = np.rint((x - self.offset) / self.step)
+        if codes.shape[0] == 0:
+            return codes.astype(np.uint8)
+        bad = np.flatnonzero((codes < 0) | (codes > 255))
+        if bad.shape[0] > 0:
+            raise ValueError(f'sample {first + bad[0]} ({x[bad[0]]} V) is'
+                             ' outside the 256 codes of the ADC scale'
+                             ' detected from the start of the record'
+                             f' (step {self.step:.6g} V, codes from'
+                             f' {self.offset:.6g} V);'
+                             ' did the scope settings change?')
+        residual = np.abs(x - (self.offset + self.step * codes))
+        bad = np.flatnonzero(residual > 0.25 * self.step + 0.005 * np.abs(x))
+        if bad.shape[0] > 0:
+            raise ValueError(f'sample {first + bad[0]} ({x[bad[0]]} V) is'
+                             ' off the grid of ADC steps detected from the'
+                             f' start of the record (step {self.step:.6g}'
+                             ' V); did the scope settings change?')
+        return codes.astype(np.uint8)
+
+    def to_volts(self, codes):
+        '''
+        Converts an array of codes to an array of voltages
+        '''
+        return self.offset + self.step * codes
+
+def detect_adc_scale(x):
+    '''
+    Finds the step and offset of the ADC that produced a set of samples.
+
+    The step is estimated from the smallest gap between distinct
+    sample values, and refined by a least-squares fit of all the distinct
+    values to the codes that it implies, which averages away the rounding
+    in the CSV file. The offset puts the middle of the observed values
+    at code 128, which leaves room for any sample that the scope can
+    produce as long as 'x' is representative.
+
+    Returns an AdcScale object.
+    '''
+    uniq = np.unique(x).astype(np.float64)
+    if uniq.shape[0] < 2:
+        raise ValueError('cannot find the ADC step of a constant signal')
+    codes = np.rint((uniq - uniq[0]) / np.min(np.diff(uniq)))
+    step, origin = np.polyfit(codes, uniq, 1)
+    mid = np.rint((codes[0] + codes[-1]) / 2)
+    return AdcScale(step, origin + (mid - 128) * step)
+
+def load_rigol_codes(path, channel='CH1', chunk=1 << 20, allocate=None,
+                     digest=None):
+    '''
+    Reads a CSV file saved off a Rigol oscilloscope, as ADC codes.
+
+    path - Path name of the CSV file
+    channel - Name of the column to read
+    chunk - Number of lines to parse at a time
+    allocate - Function that returns a uint8 array of a given length
+               to receive the codes; by default, np.empty
+    digest - hashlib object that is fed the contents of the file
+
+    Returns a tuple (codes, scale, start, increment), where 'codes' is
+    a uint8 array, a quarter the size of the float32 samples, and 'scale'
+    is the AdcScale, detected from the first chunk, that converts them
+    to volts. Every later chunk is checked against the scale, and
+    ValueError, naming the file, is raised if it does not fit.
+    '''
+    n = count_samples(path, digest)
+    if allocate is None:
+        codes = np.empty(n, dtype=np.uint8)
+    else:
+        codes = allocate(n)
+    scale = None
+    with open(path) as f:
+        start, incr, col = read_rigol_header(f, channel)
+        n = 0
+        for block in iter_rigol_samples(f, col, chunk):
+            if scale is None:
+                scale = detect_adc_scale(block)
+            try:
+                codes[n:n+block.shape[0]] = scale.to_codes(block, n)
+            except ValueError as e:
+                raise ValueError(f'{path}: {e}') from None
+            n += block.shape[0]
+    return codes[:n], scale, start, incr
+
+# Version of the layout of the capture cache. Entries written with any
+# other version are never used.
+
+cache_version = 1
+
+# Time at which this run began. Cache entries written or used since then
+# belong to this run, or to a batch worker running alongside it, and are
+# never evicted.
+run_started = time.time()
+
+def file_sha256(path):
+    '''
+    Returns the SHA-256 digest of a file's contents, as a hex string
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(1 << 24):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_paths(cache_dir, path, channel):
+    '''
+    Returns the path names of the array and of the metadata that cache
+    one channel of a capture file
+    '''
+    key = hashlib.sha256(f'{os.path.abspath(path)}\0{channel}\0'
+                         f'{cache_version}'.encode()).hexdigest()[:32]
+    return (os.path.join(cache_dir, key + '.npy'),
+            os.path.join(cache_dir, key + '.json'))
+
+def cache_is_current(meta, path):
+    '''
+    Tells whether cache metadata still describe a capture file. A file
+    whose modification time has changed but whose contents have not,
+    as when it has been copied, still matches, and the metadata are
+    updated to its new time.
+    '''
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if meta.get('version') != cache_version or meta['size'] != st.st_size:
+        return False
+    if meta['mtime_ns'] != st.st_mtime_ns:
+        if file_sha256(path) != meta['sha256']:
+            return False
+        meta['mtime_ns'] = st.st_mtime_ns
+    return True
+
+def write_meta(meta_path, meta):
+    '''
+    Writes the metadata of a cache entry, replacing the old file in one
+    step so that another process never reads it half written
+    '''
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=4)
+    os.replace(tmp_path, meta_path)
+
+def evict_captures(cache_dir, budget, keep=(), since=None):
+    '''
+    Removes cache entries whose capture files have gone or changed, and
+    then the least recently used entries until the cache fits its budget.
+
+    cache_dir - Directory holding the cache
+    budget - Size, in bytes, that the cache may occupy
+    keep - Metadata paths of entries that must not be removed
+    since - Time, as from time.time(), after which entries were written
+            or used by the current run; they are not removed even if
+            the cache stays over its budget, so that batch workers
+            sharing the cache do not delete one another's entries
+    '''
+    entries = []
+    for meta_path in glob.glob(os.path.join(cache_dir, '*.json')):
+        npy_path = meta_path[:-5] + '.npy'
+        try:
+            if since is not None and os.path.getmtime(meta_path) >= since:
+                continue
+        except OSError:
+            continue
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            stale = meta_path not in keep \
+                and not cache_is_current(meta, meta['source'])
+        except (OSError, ValueError, KeyError):
+            stale = True
+        if stale:
+            for p in (npy_path, meta_path):
+                if os.path.exists(p):
+                    os.remove(p)
+            continue
+        size = os.path.getsize(meta_path) + (os.path.getsize(npy_path)
+                                             if os.path.exists(npy_path)
+                                             else 0)
+        entries.append((os.path.getmtime(meta_path), meta_path,
+                        npy_path, size))
+    total = sum(e[3] for e in entries)
+    for _, meta_path, npy_path, size in sorted(entries):
+        if total <= budget:
+            break
+        if meta_path in keep:
+            continue
+        for p in (npy_path, meta_path):
+            if os.path.exists(p):
+                os.remove(p)
+        total -= size
+
+def load_capture(path, channel='CH1', chunk=1 << 20, cache_dir=None,
+                 budget=1 << 30):
+    '''
+    Reads a Rigol CSV file as ADC codes, through a cache of parsed
+    captures.
+
+    path - Path name of the CSV file
+    channel - Name of the column to read
+    chunk - Number of lines to parse at a time
+    cache_dir - Directory holding the cache; by default,
+                '.capture-cache' beside the CSV file
+    budget - Size, in bytes, that the cache may occupy
+
+    Returns a tuple (codes, scale, start, increment), as
+    load_rigol_codes does, except that 'codes' is a read-only memory
+    map of the cached array. Each cache entry is a .npy file of codes
+    and a .json file giving the header values, the ADC scale and the
+    size, modification time and SHA-256 digest of the CSV file it was
+    parsed from. On a miss, the file is parsed straight into the .npy
+    file, so that the cache costs no extra memory.
+    '''
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)),
+                                 '.capture-cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    npy_path, meta_path = cache_paths(cache_dir, path, channel)
+
+    # Look for a current entry
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        hit = os.path.exists(npy_path) and cache_is_current(meta, path)
+    except (OSError, ValueError, KeyError):
+        hit = False
+
+    if hit:
+        write_meta(meta_path, meta)
+    else:
+        st = os.stat(path)
+        digest = hashlib.sha256()
+        tmp_path = npy_path + '.tmp'
+        def allocate(n):
+            return np.lib.format.open_memmap(tmp_path, mode='w+',
+                                             dtype=np.uint8, shape=(n,))
+        codes, scale, start, incr = load_rigol_codes(path, channel, chunk,
+                                                     allocate, digest)
+        if codes.base is None or codes.shape[0] != codes.base.shape[0]:
+            # The file was shorter than its size suggested. Copy the codes
+            # out and close the memory map before overwriting the file
+            # behind it, which Windows does not allow while it is mapped.
+            codes = np.array(codes)
+            with open(tmp_path, 'wb') as f:
+                np.save(f, codes)
+        else:
+            codes.base.flush()
+        del codes
+        os.replace(tmp_path, npy_path)
+        meta = {'version': cache_version, 'source': os.path.abspath(path),
+                'channel': channel, 'size': st.st_size,
+                'mtime_ns': st.st_mtime_ns, 'sha256': digest.hexdigest(),
+                'start': start, 'increment': incr,
+                'step': scale.step, 'offset': scale.offset}
+        write_meta(meta_path, meta)
+        evict_captures(cache_dir, budget, keep=(meta_path,),
+                       since=run_started)
+
+    codes = np.load(npy_path, mmap_mode='r')
+    return (codes, AdcScale(meta['step'], meta['offset']),
+            meta['start'], meta['increment'])
+
+def code_statistics(counts, scale):
+    '''
+    Computes statistics of a record from the histogram of its codes.
+
+    counts - Number of samples having each of the 256 codes
+    scale - AdcScale that converts the codes to volts
+
+    Returns a tuple (uniq, counts, mean, sigma), giving the voltages
+    that occurred, the number of samples at each, and the mean and
+    standard deviation of the record in volts.
+    '''
+    codes = np.nonzero(counts)[0]
+    uniq = scale.to_volts(codes)
+    counts = counts[codes]
+    N = np.sum(counts)
+    mean = np.sum(counts * uniq) / N
+    sigma = np.sqrt(np.sum(counts * (uniq - mean)**2) / N)
+    return uniq, counts, mean, sigma
+
+class StreamingStats:
+    '''
+    Accumulates the statistics of a noise record that arrives a chunk
+    of ADC codes at a time, so that the record never has to be in
+    memory at once.
+
+    n - Number of samples seen
+    counts - Number of samples seen having each of the 256 codes. The
+             mean, variance and empirical CDF all follow exactly from
+             this histogram; see code_statistics.
+
+    The power spectral density is estimated by Welch's method with a
+    Hann window and half-overlapping segments, exactly as scipy's
+    'welch' does by default; only the samples of one partial segment
+    are carried from one chunk to the next. The window, the per-bin
+    scale factors and the buffer that the segments are windowed in are
+    made once and reused, and every FFT has the same length, so that
+    scipy reuses its plan.
+    '''
+
+    def __init__(self, fs, nperseg, scale, monitor=None):
+        '''
+        fs - Sampling frequency
+        nperseg - Length of a segment for the PSD estimate
+        scale - AdcScale that converts the codes to volts
+        monitor - Optional NoiseMonitor that receives the periodogram,
+                  mean and variance of every segment
+        '''
+        self.fs = fs
+        self.nperseg = nperseg
+        self.scale = scale
+        self.monitor = monitor
+        self.step = nperseg - nperseg // 2
+        self.window = get_window('hann', nperseg)
+        self.n = 0
+        self.counts = np.zeros(256, dtype=np.int64)
+        self.carry = np.empty(0, dtype=np.float64)
+        self.work = np.empty((0, nperseg))
+        self.power = np.zeros(nperseg // 2 + 1)
+        self.nseg = 0
+
+        # Scale factors that make a segment's squared FFT into a
+        # one-sided PSD in V²/Hz
+        self.bin_scale = np.full(nperseg // 2 + 1, 2 * scale.step**2
+                                 / (fs * np.sum(self.window**2)))
+        self.bin_scale[0] /= 2
+        if nperseg % 2 == 0:
+            self.bin_scale[-1] /= 2
+
+    def update(self, codes):
+        '''
+        Adds a chunk of codes, which follow the ones already seen
+        '''
+        self.n += codes.shape[0]
+        self.counts += np.bincount(codes, minlength=256)
+
+        # Welch segments that are complete
+        buf = np.concatenate([self.carry, codes])
+        nseg = max(0, (buf.shape[0] - self.nperseg) // self.step + 1)
+        if nseg > 0:
+            if self.work.shape[0] < nseg:
+                self.work = np.empty((nseg, self.nperseg))
+            work = self.work[:nseg]
+            segs = np.lib.stride_tricks.sliding_window_view\
+                (buf, self.nperseg)[::self.step][:nseg]
+            means = np.mean(segs, axis=1)
+            np.subtract(segs, means[:, np.newaxis], out=work)
+            variances = np.einsum('ij,ij->i', work, work) / self.nperseg
+            work *= self.window
+            spectra = rfft(work, axis=1)
+            p = spectra.real**2
+            p += spectra.imag**2
+            p *= self.bin_scale
+            self.power += np.sum(p, axis=0)
+            self.nseg += nseg
+            if self.monitor is not None:
+                self.monitor.add(p, self.scale.to_volts(means),
+                                 variances * self.scale.step**2)
+        self.carry = buf[nseg * self.step:]
+
+    def psd(self):
+        '''
+        Returns a pair (freqs, Pxx) giving the one-sided power spectral
+        density in V²/Hz, averaged over the complete segments seen so far
+        '''
+        return rfftfreq(self.nperseg, 1.0/self.fs), self.power / self.nseg
+
+def robust_z(x):
+    '''
+    Returns the distance of each element of x from the median of x,
+    in units of the standard deviation estimated from the median
+    absolute deviation, so that a few outliers don't mask themselves
+    '''
+    med = np.median(x)
+    mad = 1.4826 * np.median(np.abs(x - med))
+    return (x - med) / max(mad, 1e-12 * max(abs(med), 1e-300))
+
+class NoiseMonitor:
+    '''
+    Time-resolved spectrogram and rolling statistics of a noise record,
+    for spotting drift or popcorn noise that a single averaged PSD hides.
+
+    The Welch segments handed over by StreamingStats are grouped into
+    frames of consecutive segments, and each segment's periodogram is
+    averaged into a number of equal frequency bands. Each frame keeps
+    its band PSD, its mean and its variance, so the memory needed
+    grows with the number of frames, not the number of samples.
+
+    frame_psd - List of arrays of band PSDs (V²/Hz), one per frame
+    frame_mean - List of the frames' mean voltages
+    frame_var - List of the frames' variances (V²)
+    '''
+
+    def __init__(self, nbins, segs_per_frame, nbands=128):
+        '''
+        nbins - Number of frequency bins in a segment's periodogram
+        segs_per_frame - Number of Welch segments in a frame
+        nbands - Number of frequency bands in the spectrogram
+        '''
+        nbands = min(nbands, nbins)
+        self.edges = np.linspace(0, nbins, nbands + 1).astype(int)
+        self.widths = np.diff(self.edges)
+        self.segs_per_frame = segs_per_frame
+        self.frame_psd = []
+        self.frame_mean = []
+        self.frame_var = []
+        self._reset()
+
+    def _reset(self):
+        self.acc_psd = np.zeros(self.widths.shape[0])
+        self.acc_mean = 0.0
+        self.acc_var = 0.0
+        self.acc_n = 0
+
+    def add(self, p, means, variances):
+        '''
+        Adds the periodograms (one row per segment), means and variances
+        of consecutive segments
+        '''
+        bands = np.add.reduceat(p, self.edges[:-1], axis=1) / self.widths
+        i = 0
+        while i < p.shape[0]:
+            take = min(self.segs_per_frame - self.acc_n, p.shape[0] - i)
+            self.acc_psd += np.sum(bands[i:i+take], axis=0)
+            self.acc_mean += np.sum(means[i:i+take])
+            self.acc_var += np.sum(variances[i:i+take])
+            self.acc_n += take
+            i += take
+            if self.acc_n == self.segs_per_frame:
+                self.frame_psd.append(self.acc_psd / self.acc_n)
+                self.frame_mean.append(self.acc_mean / self.acc_n)
+                self.frame_var.append(self.acc_var / self.acc_n)
+                self._reset()
+
+    def summary(self, threshold=5.0):
+        '''
+        Compares every frame with the run as a whole.
+
+        threshold - Robust z-score beyond which a frame is flagged
+
+        Returns a dictionary of arrays, one element per frame:
+        'mean' and 'sigma' - mean and standard deviation (V)
+        'z_mean', 'z_var' - robust z-scores of the mean and of the
+                            logarithm of the variance
+        'psd_dev' - RMS deviation, in dB, of the frame's band PSD from
+                    the average over all frames
+        'z_psd' - robust z-score of 'psd_dev'
+        'flagged' - True for frames that depart from the run average
+        '''
+        psd = np.array(self.frame_psd)
+        mean = np.array(self.frame_mean)
+        var = np.array(self.frame_var)
+        dev = 10*np.log10(psd / np.mean(psd, axis=0))
+        psd_dev = np.sqrt(np.mean(dev**2, axis=1))
+        result = {'mean': mean, 'sigma': np.sqrt(var), 'psd_dev': psd_dev}
+        if mean.shape[0] >= 3:
+            result['z_mean'] = robust_z(mean)
+            result['z_var'] = robust_z(np.log(var))
+            result['z_psd'] = robust_z(psd_dev)
+        else:
+            for key in ('z_mean', 'z_var', 'z_psd'):
+                result[key] = np.zeros_like(mean)
+        result['flagged'] = ((np.abs(result['z_mean']) > threshold)
+                             | (np.abs(result['z_var']) > threshold)
+                             | (result['z_psd'] > threshold))
+        return result
+
+def autocorrelation(codes, maxlag):
+    '''
+    Computes the autocorrelation of a record by FFT, in O(N log N) time.
+
+    codes - ADC codes of the record, in time order
+    maxlag - Largest lag wanted, in samples
+
+    Returns an array of maxlag+1 elements giving the normalized
+    (biased) autocorrelation at lags 0, 1, ..., maxlag. The record is
+    zero-padded so that the circular correlation that the FFT computes
+    does not wrap around, and the transform is done in single precision
+    to hold down the memory needed for a multi-million-point record. The
+    correlation is normalized, so it needs no conversion to volts.
+    '''
+    N = codes.shape[0]
+    maxlag = min(maxlag, N - 1)
+    x = codes.astype(np.float32)
+    x -= np.mean(x, dtype=np.float64)
+    nfft = next_fast_len(N + maxlag)
+    X = rfft(x, n=nfft)
+    del x
+    X *= X.conj()
+    r = irfft(X, n=nfft)[:maxlag+1]
+    return r / r[0]
+
+def allan_deviation(codes, scale, tau0, per_decade=10):
+    '''
+    Computes the overlapping Allan deviation of a record.
+
+    codes - ADC codes of the record, in time order
+    scale - AdcScale that converts the codes to volts
+    tau0 - Sampling interval
+    per_decade - Number of averaging times per decade
+
+    Returns a pair (taus, adev) giving the averaging times, spaced
+    logarithmically from tau0 up to a third of the record, and the
+    Allan deviation in volts at each.
+
+    With S the cumulative sum of the codes, the difference between the
+    means of adjacent blocks of m samples starting at sample j is
+    ((S[j+2m] - S[j+m]) - (S[j+m] - S[j])) / m, so each averaging time
+    costs one pass over S rather than a pass per block. The sums of codes
+    are integers, and are kept as 32-bit integers when they can't
+    overflow, so they are exact and take no more memory than they must.
+    '''
+    N = codes.shape[0]
+    dtype = np.int32 if N * 255 < 2**31 else np.int64
+    S = np.zeros(N + 1, dtype=dtype)
+    np.cumsum(codes, dtype=dtype, out=S[1:])
+    ms = np.unique(np.rint(np.logspace(0, np.log10(max(1, N // 3)),
+                                       1 + int(per_decade
+                                               * np.log10(max(1, N // 3)))))
+                   .astype(int))
+    adev = np.empty(ms.shape[0])
+    for i, m in enumerate(ms):
+        mid = S[m:N+1-m]
+        d = ((S[2*m:] - mid) - (mid - S[:N+1-2*m])).astype(np.float64)
+        adev[i] = np.sqrt(np.mean(d**2) / 2) / m
+    return ms * tau0, adev * scale.step
+
+def make_stats(scale, incrval, monitor=False, frame=0.1, bands=128):
+    '''
+    Makes the accumulator for the streaming statistics of a record, and
+    a noise monitor with frames of 'frame' seconds and 'bands' frequency
+    bands if 'monitor' is true
+    '''
+    nperseg = int(round(0.05 / incrval))
+    mon = None
+    if monitor:
+        hop = (nperseg - nperseg // 2) * incrval
+        mon = NoiseMonitor(nperseg // 2 + 1, max(1, round(frame / hop)),
+                           bands)
+    return StreamingStats(1.0/incrval, nperseg, scale, mon)
+
+def analyze_capture(samplefile, opts, verbose=True):
+    '''
+    Computes the statistics of one capture file.
+
+    samplefile - Path name of the CSV file
+    opts - Parsed command line options
+    verbose - True to report progress on the standard output
+
+    Returns a dictionary with keys:
+    'codes' - Array of observed ADC codes, in time order, or None if
+              the record was parsed a chunk at a time
+    'scale' - Relation between ADC codes and volts
+    'start', 'incr' - Initial time point and time increment
+    'stats' - StreamingStats accumulator, or None if the record was
+              analyzed in memory
+    'N' - Number of samples
+    'uniq', 'counts' - Unique observed values and their counts
+    'mean', 'sigma' - Sample mean and standard deviation
+    'freqs', 'Pxx' - Power spectral density of the noise
+    '''
+    streaming = opts.stream or opts.monitor
+    if opts.no_cache:
+        codes = None
+        if not streaming:
+            codes, scale, startval, incrval = load_rigol_codes(samplefile)
+    else:
+        codes, scale, startval, incrval = \
+            load_capture(samplefile, cache_dir=opts.cache_dir,
+                         budget=int(opts.cache_budget * 2**20))
+
+    stats = None
+    if streaming:
+
+        # Read the record a chunk at a time, from the cache if there is
+        # one. Otherwise, the ADC scale is detected from the first chunk.
+
+        if codes is not None:
+            stats = make_stats(scale, incrval, opts.monitor, opts.frame,
+                               opts.bands)
+            for i in range(0, codes.shape[0], opts.chunk):
+                stats.update(codes[i:i+opts.chunk])
+        else:
+            with open(samplefile) as f:
+                startval, incrval, col = read_rigol_header(f)
+                for block in iter_rigol_samples(f, col, opts.chunk):
+                    if stats is None:
+                        scale = detect_adc_scale(block)
+                        stats = make_stats(scale, incrval, opts.monitor,
+                                           opts.frame, opts.bands)
+                    try:
+                        stats.update(scale.to_codes(block, stats.n))
+                    except ValueError as e:
+                        raise ValueError(f'{samplefile}: {e}') from None
+        N = stats.n
+        code_counts = stats.counts
+        freqs, Pxx = stats.psd()
+
+    else:
+
+        N = len(codes)
+        code_counts = np.bincount(codes, minlength=256)
+        freqs, Pxx = welch(codes,
+                           fs=1.0/incrval,
+                           window='hann',
+                           nperseg = int(round(0.05 / incrval)))
+        Pxx *= scale.step**2
+
+    uniq, counts, xbar, sigma = code_statistics(code_counts, scale)
+    if verbose:
+        print(f'Start={startval} Incr={incrval}')
+        print(f'N = {N}')
+        print(f'ADC step = {scale.step:.6g} V, code 0 = {scale.offset:.6g} V')
+        print(f'Mean value = {xbar}')
+    return {'codes': codes, 'scale': scale, 'start': startval,
+            'incr': incrval, 'stats': stats, 'N': N,
+            'uniq': uniq, 'counts': counts, 'mean': xbar, 'sigma': sigma,
+            'freqs': freqs, 'Pxx': Pxx}
+
+def gaussianity(result):
+    '''
+    Measures how far the distribution of a record is from Gaussian.
+
+    result - Dictionary returned by analyze_capture
+
+    Returns a dictionary with keys:
+    'KS' - Largest difference between the empirical CDF and the CDF of
+           the Gaussian having the same mean and standard deviation
+           (the Kolmogorov-Smirnov distance). The Gaussian CDF is taken
+           at the top of each ADC step, where the empirical CDF
+           includes all the samples at that step.
+    'Skew' - Skewness (0 for a Gaussian)
+    'Kurtosis' - Excess kurtosis (0 for a Gaussian)
+    'z' - Observed values in units of standard deviations from the mean
+    'cdf_error' - Empirical CDF minus Gaussian CDF at each of 'z'
+    '''
+    uniq, counts = result['uniq'], result['counts']
+    xbar, sigma, N = result['mean'], result['sigma'], result['N']
+    z = (uniq - xbar) / sigma
+    empcdf = np.cumsum(counts) / N
+    cdf_error = empcdf - norm.cdf(z + result['scale'].step / (2 * sigma))
+    return {'KS': np.max(np.abs(cdf_error)),
+            'Skew': np.sum(counts * z**3) / N,
+            'Kurtosis': np.sum(counts * z**4) / N - 3,
+            'z': z, 'cdf_error': cdf_error}
+
+def compare_capture(samplefile, opts):
+    '''
+    Analyzes one capture file for a batch comparison, in a worker
+    process. Returns a dictionary holding a row of the comparison table
+    and the curves for the overlay plots.
+    '''
+    result = analyze_capture(samplefile, opts, verbose=False)
+    g = gaussianity(result)
+    return {'File': samplefile, 'N': result['N'],
+            'Mean': result['mean'], 'Sigma': result['sigma'],
+            'KS': g['KS'], 'Skew': g['Skew'], 'Kurtosis': g['Kurtosis'],
+            'Density': float(np.sqrt(np.median(result['Pxx'][1:]))),
+            'z': g['z'], 'cdf_error': g['cdf_error'],
+            'freqs': result['freqs'], 'Pxx': result['Pxx']}
+
+def compare_captures(samplefiles, opts):
+    '''
+    Analyzes many capture files in parallel worker processes, prints a
+    table comparing them, and saves the table as '<output>.csv' and
+    overlaid plots of their CDF errors and power spectral densities as
+    '<output>-cdf.png' and '<output>-psd.png'. No windows are opened.
+    '''
+    plt.switch_backend('Agg')
+    with ProcessPoolExecutor(max_workers=opts.jobs) as pool:
+        rows = list(pool.map(compare_capture, samplefiles,
+                             repeat(opts)))
+
+    fields = ['File', 'N', 'Mean', 'Sigma', 'KS', 'Skew', 'Kurtosis',
+              'Density']
+    with open(opts.output + '.csv', 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fields,
+                                extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f'{"File":<30} {"N":>10} {"Mean (V)":>10} {"Sigma (V)":>10}'
+          f' {"KS":>7} {"Skew":>7} {"Kurt":>7} {"V/rtHz":>10}')
+    for r in rows:
+        print(f'{os.path.basename(r["File"]):<30} {r["N"]:>10}'
+              f' {r["Mean"]:>10.5f} {r["Sigma"]:>10.5f} {r["KS"]:>7.4f}'
+              f' {r["Skew"]:>7.3f} {r["Kurtosis"]:>7.3f}'
+              f' {r["Density"]:>10.3e}')
+
+    fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
+    plt.title('Departure of voltage distributions from Gaussian')
+    plt.xlabel('Standard deviations from the mean')
+    plt.ylabel('Empirical CDF minus Gaussian CDF')
+    for r in rows:
+        plt.plot(r['z'], r['cdf_error'], label=os.path.basename(r['File']))
+    plt.legend()
+    fig.savefig(opts.output + '-cdf.png')
+    plt.close(fig)
+
+    fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
+    plt.title('Power spectral density of noise')
+    plt.xlabel('Frequency (Hz)')
+    plt.ylabel('Power spectral density (V²/Hz)')
+    for r in rows:
+        plt.semilogy(r['freqs'], r['Pxx'], label=os.path.basename(r['File']))
+    plt.legend()
+    fig.savefig(opts.output + '-psd.png')
+    plt.close(fig)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser\
+        (description='Plot the statistics of noise records saved off the'
+         ' scope.')
+    parser.add_argument('samplefiles', metavar='file.csv', nargs='+',
+                        help='CSV file saved off the oscilloscope. With more'
+                        ' than one, the files are compared in a batch.')
+    parser.add_argument('--stream', action='store_true',
+                        help='Compute the statistics a chunk at a time,'
+                        ' without holding the whole record in memory')
+    parser.add_argument('--chunk', type=int, default=1 << 20,
+                        help='Number of samples in a chunk with --stream')
+    parser.add_argument('--monitor', action='store_true',
+                        help='Also plot a spectrogram and rolling'
+                        ' statistics, and flag stretches of the record that'
+                        ' depart from the average (implies --stream)')
+    parser.add_argument('--frame', type=float, default=0.1,
+                        help='Length in seconds of a frame of the'
+                        ' spectrogram')
+    parser.add_argument('--bands', type=int, default=128,
+                        help='Number of frequency bands in the spectrogram')
+    parser.add_argument('--threshold', type=float, default=5.0,
+                        help='Robust z-score beyond which a frame is flagged')
+    parser.add_argument('--correlation', action='store_true',
+                        help='Also plot the autocorrelation and the Allan'
+                        ' deviation of the record')
+    parser.add_argument('--max-lag', type=float, default=0.01,
+                        help='Largest lag of the autocorrelation, in seconds')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Directory that caches parsed captures'
+                        ' (default: .capture-cache beside the CSV file)')
+    parser.add_argument('--cache-budget', type=float, default=1024,
+                        help='Size in MiB that the cache of parsed captures'
+                        ' may occupy')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Parse the CSV file without using the cache')
+    parser.add_argument('--batch', action='store_true',
+                        help='Compare the files in a batch even if there is'
+                        ' only one')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Number of files to analyze at once in a batch')
+    parser.add_argument('--output', default='noise-comparison',
+                        help='Base name of the table and plots written by'
+                        ' a batch comparison')
+    cmd_args = parser.parse_args()
+    batch = cmd_args.batch or len(cmd_args.samplefiles) > 1
+    if cmd_args.correlation and (cmd_args.stream or cmd_args.monitor):
+        parser.error('--correlation needs the whole record, and cannot be'
+                     ' used with --stream or --monitor')
+    if batch and (cmd_args.correlation or cmd_args.monitor):
+        parser.error('--correlation and --monitor work on one file at a'
+                     ' time, and cannot be used in a batch')
+
+    if batch:
+        compare_captures(cmd_args.samplefiles, cmd_args)
+        sys.exit(0)
+
+    samplefile = cmd_args.samplefiles[0]
+
+    # startval - initial time point
+    # incrval - time increment
+    # scale - relation between ADC codes and volts
+    # codes - array of observed ADC codes, in time order, or None if
+    #         the record was parsed a chunk at a time
+    # stats - streaming accumulator, or None
+    # N - number of samples
+    # uniq - unique observed values
+    # counts - counts of the observed values
+    # xbar - Sample mean
+    # sigma - Sample standard deviation
+    # freqs1, Pxx - Power spectral density of the noise
+
+    result = analyze_capture(samplefile, cmd_args)
+    codes, scale, stats = result['codes'], result['scale'], result['stats']
+    startval, incrval, N = result['start'], result['incr'], result['N']
+    uniq, counts = result['uniq'], result['counts']
+    xbar, sigma = result['mean'], result['sigma']
+    freqs1, Pxx = result['freqs'], result['Pxx']
+    monitor = None if stats is None else stats.monitor
+
+    # binwidth - width of bins using scope's quantization
+
+    binwidth = scale.step
+
+    # gausscdf - Gaussian CDF corresponding to 'uniq' values
+    # empcdf - Empirical CDF corresponding to 'uniq' values
+
+    gausscdf = norm.cdf((uniq  - xbar) / sigma)
+    empcdf = np.cumsum(counts) / N
+
+    fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
+
+    # Figure 1 - Histogram of values (unequanl bins)
+
+    plt.title(f'Histogram of voltages\nMean = {xbar:.6f} Standard deviation = {sigma:.6f}')
+    plt.ylabel("Number of samples")
+    plt.xlabel("Voltage")
+    plt.hist(uniq, bins=uniq, weights=counts)
+
+    # Figure 2 - CDF
+
+    fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
+
+    plt.title('Cumulative probability density of voltages')
+    plt.xlabel('Voltage')
+    plt.ylabel('Probability')
+    plt.step(uniq, empcdf, label='Observed', where='post')
+    plt.plot(uniq, gausscdf, 'k--', label='Gaussian')
+    plt.legend()
+
+    # Figrue 3 - CDF compared with Gaussian
+
+    fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
+
+    plt.title('Probability density of voltages, compared with Gaussian')
+    plt.xlabel('Expected CDF for Gaussian distribution')
+    plt.ylabel('Empirical CDF for voltage samples')
+    plt.plot(gausscdf, empcdf)
+    plt.plot([0, 1], [0, 1])
+    plt.axis('square')
+
+    # Figure 4 - Power spectral densityu
+
+    fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
+
+
+    plt.title('Spectrogram of noise')
+    plt.xlabel('Frequency (Hz)')
+    plt.ylabel('Power spectral density (V²/Hz)')
+    plt.semilogy(freqs1,Pxx)
+    plt.ylim([1e-8, 1e-6])
+
+    plt.subplots_adjust(left=0.1, bottom=0.1, right=0.9, top=0.9,
+                        wspace=0.3, hspace=0.3)
+
+    if monitor is not None and len(monitor.frame_mean) > 0:
+
+        # frame_t - times at the edges of the frames
+        # band_f - frequencies at the edges of the bands
+
+        summary = monitor.summary(cmd_args.threshold)
+        nframes = summary['mean'].shape[0]
+        frame_len = monitor.segs_per_frame * stats.step * incrval
+        frame_t = startval + frame_len * np.arange(nframes + 1)
+        band_f = monitor.edges * stats.fs / stats.nperseg
+
+        print(f'{nframes} frames of {frame_len:.3f} s;'
+              f' {np.count_nonzero(summary["flagged"])} depart from the average')
+        print('    Time     Mean    Sigma  z(mean) z(var) PSD dev (dB) z(PSD)')
+        for i in np.nonzero(summary['flagged'])[0]:
+            print(f'{frame_t[i]:8.3f} {summary["mean"][i]:8.5f}'
+                  f' {summary["sigma"][i]:8.5f} {summary["z_mean"][i]:8.1f}'
+                  f' {summary["z_var"][i]:6.1f} {summary["psd_dev"][i]:12.2f}'
+                  f' {summary["z_psd"][i]:6.1f}')
+
+        # Figure 5 - Spectrogram
+
+        fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
+
+        plt.title('Spectrogram of noise')
+        plt.xlabel('Time (s)')
+        plt.ylabel('Frequency (Hz)')
+        plt.pcolormesh(frame_t, band_f, 10*np.log10(np.array(monitor.frame_psd)).T,
+                       shading='flat')
+        plt.colorbar(label='Power spectral density (dB re 1 V²/Hz)')
+
+        # Figure 6 - Rolling statistics
+
+        fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
+
+        plt.title('Rolling statistics of noise (flagged frames shaded)')
+        plt.xlabel('Time (s)')
+        plt.ylabel('Voltage')
+        mid_t = (frame_t[:-1] + frame_t[1:]) / 2
+        plt.plot(mid_t, summary['mean'], 'b-', label='Mean')
+        plt.plot(mid_t, summary['sigma'], 'g-', label='Standard deviation')
+        for i in np.nonzero(summary['flagged'])[0]:
+            plt.axvspan(frame_t[i], frame_t[i+1], color='r', alpha=0.2)
+        plt.legend()
+
+    if cmd_args.correlation:
+
+        # Figure 7 - Autocorrelation
+
+        fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
+
+        acf = autocorrelation(codes, int(round(cmd_args.max_lag / incrval)))
+        plt.title('Autocorrelation of noise')
+        plt.xlabel('Lag (s)')
+        plt.ylabel('Normalized autocorrelation')
+        plt.plot(incrval * np.arange(acf.shape[0]), acf)
+        plt.xscale('symlog', linthresh=10*incrval)
+
+        # Figure 8 - Allan deviation
+
+        fig = plt.figure(frameon=False, figsize=(16.0, 9.0))
+
+        taus, adev = allan_deviation(codes, scale, incrval)
+        plt.title('Overlapping Allan deviation of noise')
+        plt.xlabel('Averaging time (s)')
+        plt.ylabel('Allan deviation (V)')
+        plt.loglog(taus, adev, 'b+-', label='Observed')
+        plt.loglog(taus, adev[0] * np.sqrt(taus[0] / taus), 'k--',
+                   label='White noise')
+        plt.legend()
+
+    plt.show()
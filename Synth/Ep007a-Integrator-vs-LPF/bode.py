@@ -28,15 +28,16 @@ from fygen import fygen
 from math import floor, pi
 import matplotlib as mpl
 from matplotlib import pyplot as plt
+import os
 from time import sleep
 from math import floor, log, log10
 import numpy as np
+from scipy.stats import t as student_t
 import sys
 
 parser = argparse.ArgumentParser\
     (description='Measure a filter and produce a Bode plot.')
 parser.add_argument('csvFile', metavar='fileName.csv',
-                    type=argparse.FileType('w'),
                     nargs=1,
                     help='CSV file that receives the plot data')
 parser.add_argument('--start', dest='start_frequency',
@@ -48,14 +49,38 @@ parser.add_argument('--end', dest='end_frequency',
 parser.add_argument('--steps', dest='frequency_steps',
                     type=int, default=76,
                     help='Number of frequency steps to take')
+parser.add_argument('--captures', dest='captures',
+                    type=int, default=1,
+                    help='Number of captures to average at each frequency')
+parser.add_argument('--harmonics', dest='harmonics',
+                    type=int, default=5,
+                    help='Highest harmonic to report in the distortion data'
+                    ' (at least 2)')
+parser.add_argument('--live', dest='live', action='store_true',
+                    help='Plot each point as soon as it is measured')
+parser.add_argument('--resume', dest='resume', action='store_true',
+                    help='Continue an interrupted sweep, keeping the results'
+                    ' already in the CSV file')
+parser.add_argument('--scope', dest='scope_ip',
+                    default='192.168.2.101',
+                    help='IP address of the oscilloscope')
+parser.add_argument('--fygen', dest='fygen_port',
+                    default='COM3',
+                    help='Serial port of the function generator')
+parser.add_argument('--no-show', dest='show', action='store_false',
+                    help='Save the plots as PNG files beside the CSV file'
+                    ' instead of displaying them')
 cmd_args = parser.parse_args()
+if cmd_args.harmonics < 2:
+    parser.error('--harmonics must be at least 2: the distortion data'
+                 ' begin at the second harmonic')
 print(cmd_args)
 
 # IP address of DS1054Z scope.
-scope_ip = '192.168.2.101'
+scope_ip = cmd_args.scope_ip
 
 # USB-serial port communicating with FY6900 function generator
-fygen_port = 'COM3'
+fygen_port = cmd_args.fygen_port
 
 # Frequency range to plot
 
@@ -71,6 +96,10 @@ input_amplitude = 5
 
 output_amplitude = 40
 
+# Confidence level of the intervals reported when averaging several captures
+
+confidence = 0.95
+
 # Remember scope scales so that we can skip resetting if they don't change
 
 scope_v_scales = [None, None, None, None]
@@ -83,17 +112,40 @@ def fine_argmax(arr):
     points
 
     Arguments:
-        arr - Array to search
+        arr - Array to search. If it has more than one dimension, the
+              search is along the last axis.
 
     Results:
         Returns a floating point argmax that interpolates parabolically
         near the maximum value of 'arr'
     """
-    coarse = np.argmax(arr)
-    ym1 = arr[coarse-1]
-    y0 = arr[coarse]
-    y1 = arr[coarse+1]
-    return coarse + (ym1 - y1)/(2*(ym1 - 2*y0 + y1))
+    coarse = np.argmax(arr, axis=-1)[..., np.newaxis]
+    ym1 = np.take_along_axis(arr, coarse-1, axis=-1)
+    y0 = np.take_along_axis(arr, coarse, axis=-1)
+    y1 = np.take_along_axis(arr, coarse+1, axis=-1)
+    return (coarse + (ym1 - y1)/(2*(ym1 - 2*y0 + y1)))[..., 0]
+
+
+def correlate_same(a, v):
+
+    """
+    Like np.correlate(a, v, 'same'), but computed with FFTs and broadcast
+    over the leading axes of 'v', so that a stack of captures can be
+    correlated against the same wave in one call.
+
+    Arguments:
+        a - 1-D array to correlate against
+        v - Array whose last axis has the same length as 'a'
+
+    Results:
+        Returns an array the shape of 'v' holding the correlations.
+    """
+    N = a.shape[-1]
+    L = 2*N - 1
+    c = np.fft.irfft(np.fft.rfft(a, L) * np.conj(np.fft.rfft(v, L, axis=-1)),
+                     L, axis=-1)
+    lags = np.arange(N) - N//2
+    return c[..., lags % L]
 
 
 class ScopeFault(Exception):
@@ -144,6 +196,7 @@ def set_channel_scale(scope, channel, scale):
     if scope_v_scales[channel-1] == scale:
         return False
     scope.set_channel_scale(channel, scale)
+    scope_v_scales[channel-1] = scale
     return True
 
 def find_scope_v_scale(mn, mx):
@@ -234,7 +287,7 @@ def reset_scope_v_scale(scope):
     scope.set_channel_offset(2, 0)
     return set_channel_scale(scope, 2, scale)
     
-def setup_one_freq(scope, fg, freq):
+def setup_one_freq(scope, fg, freq, start_scale=None):
 
     """
     Sets up to take data for a single frequency.
@@ -243,10 +296,17 @@ def setup_one_freq(scope, fg, freq):
         scope - Handle to the scope
         fg - Handle to the function generator
         freq - Frequency to set
+        start_scale - Vertical scale of channel 2 to start autoscaling
+                      from. By default, the scale is reset to the power
+                      supply range.
     """
 
     stop_scope(scope)
-    changed = reset_scope_v_scale(scope)
+    if start_scale is None:
+        changed = reset_scope_v_scale(scope)
+    else:
+        scope.set_channel_offset(2, 0)
+        changed = set_channel_scale(scope, 2, start_scale)
     scale, offset = find_scope_h_scale(freq)
     scope.timebase_scale = scale
     scope.timebase_offset = offset
@@ -277,9 +337,13 @@ def analyze_sweep(freq, ts, ins, outs):
         ins - Input voltages at the given times
         outs - Output voltages at the given times.
 
+    'ins' and 'outs' may be two-dimensional, with one capture per row,
+    in which case all the captures are reduced at once.
+
     Returns a pair (dB, phase) where db is the gain/loss of the circuit
     in decibels and phase is the phase lead/lag, suitable for adding to
-    the Bode plot.
+    the Bode plot. If several captures were supplied, 'dB' and 'phase'
+    are arrays with one element per capture.
     """
     N = ts.shape[0] # Number of data ppoints
 
@@ -290,8 +354,8 @@ def analyze_sweep(freq, ts, ins, outs):
     window = np.blackman(N)
     wave = np.sin(ts*(2*pi*freq))
     wwave = wave*window
-    c_in = np.correlate(wwave, window*ins, "same")
-    c_out = np.correlate(wwave, window*outs, "same")
+    c_in = correlate_same(wwave, window*ins)
+    c_out = correlate_same(wwave, window*outs)
 
     # The locations of the two peaks in the correlation give the
     # phase delay
@@ -299,10 +363,7 @@ def analyze_sweep(freq, ts, ins, outs):
     out_idx = fine_argmax(c_out)
     time_delay = time_per_step * (out_idx - in_idx)
     phase_delay_deg = time_delay * freq * 360
-    while phase_delay_deg > 180:
-        phase_delay_deg -= 360
-    while phase_delay_deg < -180:
-        phase_delay_deg += 360
+    phase_delay_deg = 180 - (180 - phase_delay_deg) % 360
 
     # Isolate the values for a complete number of cycles
     steps_per_cycle = 1/(freq * time_per_step)
@@ -311,8 +372,8 @@ def analyze_sweep(freq, ts, ins, outs):
 
     # Find the RMS voltage of the isolated values, removing any
     # DC component
-    in_rms = np.std(ins[0:steps_to_sample])
-    out_rms = np.std(outs[0:steps_to_sample])
+    in_rms = np.std(ins[..., 0:steps_to_sample], axis=-1)
+    out_rms = np.std(outs[..., 0:steps_to_sample], axis=-1)
 
     # Find the gain/loss in decibels
     dB = 20 * np.log10(out_rms / in_rms)
@@ -320,7 +381,65 @@ def analyze_sweep(freq, ts, ins, outs):
     # Return gain/loss and phase lead/lag
     return dB, phase_delay_deg
 
-def run_sweep(scope, fg, freq):
+def summarize_captures(gs, phs):
+    """
+    Combines the gains and phases measured in several captures at
+    a single frequency
+
+    Arguments:
+        gs - Gains in decibels, one per capture
+        phs - Phase leads/lags in degrees, one per capture
+
+    Returns a quadruple (dB, phase, dB_ci, phase_ci), where dB and
+    phase are the mean gain and phase, and dB_ci and phase_ci are the
+    half-widths of their confidence intervals.
+
+    The phases are averaged as unit vectors, so that captures on
+    either side of +/-180 degrees do not cancel out.
+    """
+    K = gs.shape[-1]
+    dB = np.mean(gs, axis=-1)
+    phase = np.angle(np.mean(np.exp(1j * np.radians(phs)), axis=-1), deg=True)
+    if K < 2:
+        return dB, phase, np.nan, np.nan
+    dev = 180 - (180 - (phs - phase)) % 360
+    tval = student_t.ppf(0.5 + confidence/2, K - 1)
+    dB_ci = tval * np.std(gs, axis=-1, ddof=1) / np.sqrt(K)
+    phase_ci = tval * np.sqrt(np.sum(dev**2, axis=-1) / (K - 1)) / np.sqrt(K)
+    return dB, phase, dB_ci, phase_ci
+
+def analyze_harmonics(freq, ts, outs, nharmonics):
+    """
+    Measures the harmonic distortion of the output at a single frequency
+
+    Arguments:
+        freq - Frequency under test
+        ts - Time stamps of the oscilloscope values
+        outs - Output voltages at the given times, one row per capture
+        nharmonics - Highest harmonic to measure
+
+    Returns a pair (thd, levels) where thd is the total harmonic
+    distortion in percent, and levels is an array giving the amplitudes
+    of harmonics 2..nharmonics in dB relative to the fundamental.
+
+    The output is fitted by least squares to a sum of sines and
+    cosines at the harmonics of the test frequency, so the record
+    need not hold a whole number of cycles. The amplitudes from all
+    the captures are fitted together and then averaged.
+    """
+    t = np.float64(ts - ts[0])
+    ks = np.arange(1, nharmonics+1)
+    phase = np.outer(t, 2*pi*freq*ks)
+    basis = np.hstack([np.ones((t.shape[0], 1)), np.cos(phase), np.sin(phase)])
+    samples = np.reshape(outs, (-1, t.shape[0])).T
+    coeffs, _, _, _ = np.linalg.lstsq(basis, samples, rcond=None)
+    amplitudes = np.mean(np.hypot(coeffs[1:nharmonics+1],
+                                  coeffs[nharmonics+1:]), axis=-1)
+    thd = 100 * np.sqrt(np.sum(amplitudes[1:]**2)) / amplitudes[0]
+    levels = 20 * np.log10(amplitudes[1:] / amplitudes[0])
+    return thd, levels
+
+def run_sweep(scope, fg, freq, captures=1, start_scale=None):
 
     """
     Runs the generator and oscilloscope to grab the waveform at a single
@@ -330,22 +449,190 @@ def run_sweep(scope, fg, freq):
         scope - Handle to the scope
         fg    - Handle to the function generator
         freq  - Frequency for which to acquire the data
+        captures - Number of captures to take. The generator is allowed
+                   to settle only once, before the first capture.
+        start_scale - Vertical scale of channel 2 to start autoscaling
+                      from, as for setup_one_freq
 
     Returns a triple (ts, ins, outs)
         ts - Timestamps at which voltages were acquired
-        ins - Input voltages at the given times
-        outs - Output voltages at the given times.
+        ins - Input voltages at the given times, one row per capture
+        outs - Output voltages at the given times, one row per capture
     """
 
-    setup_one_freq(scope, fg, freq)
-    scope.run()
-    sleep(10.0/freq + 0.25)
-    scope.stop()
-    ts = np.float32(scope.waveform_time_values)
-    ins = np.float32(scope.get_waveform_samples(1, 'NORM'))
-    outs = np.float32(scope.get_waveform_samples(2, 'NORM'))
+    setup_one_freq(scope, fg, freq, start_scale)
+    for i in range(0, captures):
+        scope.run()
+        sleep(10.0/freq + 0.25)
+        scope.stop()
+        if i == 0:
+            ts = np.float32(scope.waveform_time_values)
+            ins = np.empty((captures, ts.shape[0]), dtype=np.float32)
+            outs = np.empty((captures, ts.shape[0]), dtype=np.float32)
+        ins[i] = scope.get_waveform_samples(1, 'NORM')
+        outs[i] = scope.get_waveform_samples(2, 'NORM')
     return ts, ins, outs
 
+def read_previous_results(path, fieldnames, freqs):
+    """
+    Reads the results of an interrupted sweep so that it can be resumed
+
+    Arguments:
+        path - Path name of the CSV file from the interrupted sweep
+        fieldnames - Columns that the file is expected to have
+        freqs - Frequencies in the sweep
+
+    Returns a pair (results, scale), where 'results' is a dictionary
+    whose keys are indices into 'freqs' and whose values are the rows
+    already measured at those frequencies, and 'scale' is the vertical
+    scale of scope channel 2 when the last row was measured, or None
+    if there are no rows.
+
+    A row that was cut short by the interruption is discarded. Exits
+    without touching the file if it was not written by a sweep with
+    the same columns and frequencies.
+    """
+    results = {}
+    scale = None
+    if not os.path.exists(path):
+        return results, scale
+    with open(path, newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        if reader.fieldnames is None:
+            return results, scale
+        if reader.fieldnames != fieldnames:
+            sys.exit(f'{path} has columns {reader.fieldnames}, '
+                     f'expected {fieldnames}; cannot resume')
+        for row in reader:
+            if None in row.values() or '' in row.values():
+                print(f'Discarding incomplete row {row}')
+                continue
+            row = {k: float(v) for k, v in row.items()}
+            idx = np.flatnonzero(np.isclose(freqs, row['Freq'], rtol=1e-9))
+            if idx.shape[0] == 0:
+                sys.exit(f'{path} has a result at {row["Freq"]} Hz, '
+                         f'which is not in this sweep; cannot resume')
+            results[idx[0]] = row
+            scale = row['Scale']
+    return results, scale
+
+def save_results(path, fieldnames, rows):
+    """
+    Writes the results of a sweep, replacing the file in one step
+
+    Arguments:
+        path - Path name of the CSV file
+        fieldnames - Columns of the file
+        rows - Rows to write, in order
+
+    The rows are written to 'path' + '.tmp', which then replaces 'path'.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+class LivePlot:
+    """
+    Bode plot that grows a point at a time while the sweep is running,
+    so that a bad sweep can be spotted and aborted early.
+
+    The axes are drawn only once. Each new segment is drawn onto a saved
+    copy of the canvas and blitted to the screen, so the cost of adding a
+    point does not grow with the length of the sweep. The whole figure is
+    redrawn only when the gain leaves the range of its axis, or when the
+    window is resized.
+    """
+
+    def __init__(self, start_frequency, end_frequency):
+        """
+        Opens the window for the live plot
+
+        Arguments:
+            start_frequency - Lowest frequency in the sweep
+            end_frequency - Highest frequency in the sweep
+        """
+        plt.ion()
+        self.fig, self.ax1 = plt.subplots()
+        self.ax1.set_xlabel('Frequency (Hz)')
+        self.ax1.set_xscale('log')
+        self.ax1.set_xlim(start_frequency, end_frequency)
+        self.ax1.set_ylabel('Gain (dB)', color='tab:blue')
+        self.ax1.set_ylim(-20, 20)
+        self.ax1.tick_params(axis='y', labelcolor='tab:blue',
+                             color='tab:blue')
+        self.ax2 = self.ax1.twinx()
+        self.ax2.set_ylabel('Phase (degrees)', color='tab:red')
+        self.ax2.set_ylim(-180, 180)
+        self.ax2.tick_params(axis='y', labelcolor='tab:red', color='tab:red')
+
+        self.freqs = []
+        self.gs = []
+        self.phs = []
+
+        # Lines holding the whole sweep, drawn only on a full redraw
+        self.gain_line, = self.ax1.plot([], [], color='tab:blue',
+                                        animated=True)
+        self.phase_line, = self.ax2.plot([], [], color='tab:red',
+                                         animated=True)
+
+        # Lines holding the newest segment, drawn as each point arrives
+        self.gain_seg, = self.ax1.plot([], [], color='tab:blue',
+                                       animated=True)
+        self.phase_seg, = self.ax2.plot([], [], color='tab:red',
+                                        animated=True)
+
+        self.background = None
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+        plt.show(block=False)
+        plt.pause(0.1)
+
+    def on_draw(self, event):
+        """
+        Draws the sweep so far after a full redraw of the figure, and
+        saves the canvas for blitting.
+        """
+        self.ax1.draw_artist(self.gain_line)
+        self.ax2.draw_artist(self.phase_line)
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+
+    def append(self, freq, g, ph):
+        """
+        Adds a point to the live plot
+
+        Arguments:
+            freq - Frequency that was measured
+            g - Gain in decibels
+            ph - Phase lead/lag in degrees
+
+        A point whose gain is not finite, as when the output capture
+        was flat, is left out of the plot.
+        """
+        if not np.isfinite(g):
+            return
+        self.freqs.append(freq)
+        self.gs.append(g)
+        self.phs.append(ph)
+        self.gain_line.set_data(self.freqs, self.gs)
+        self.phase_line.set_data(self.freqs, self.phs)
+
+        lo, hi = self.ax1.get_ylim()
+        if not lo <= g <= hi or self.background is None:
+            self.ax1.set_ylim(min(lo, 10*np.floor(g/10) - 10),
+                              max(hi, 10*np.ceil(g/10) + 10))
+            self.fig.canvas.draw()
+        else:
+            self.gain_seg.set_data(self.freqs[-2:], self.gs[-2:])
+            self.phase_seg.set_data(self.freqs[-2:], self.phs[-2:])
+            self.fig.canvas.restore_region(self.background)
+            self.ax1.draw_artist(self.gain_seg)
+            self.ax2.draw_artist(self.phase_seg)
+            self.fig.canvas.blit(self.fig.bbox)
+            self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.fig.canvas.flush_events()
+
 print('bode.py starting')
 
 scope = DS1054Z(scope_ip)
@@ -353,36 +640,136 @@ fg = fygen.FYGen(fygen_port, debug_level=0)
 
 setup(scope, fg)
 
-writer = csv.DictWriter(cmd_args.csvFile[0],
-                        fieldnames=['Freq', 'Gain', 'Phase'])
-
-writer.writeheader()
+harmonic_names = [f'H{k}' for k in range(2, cmd_args.harmonics+1)]
+fieldnames = ['Freq', 'Gain', 'Phase']
+if cmd_args.captures > 1:
+    fieldnames += ['GainCI', 'PhaseCI']
+fieldnames += ['THD'] + harmonic_names + ['Scale']
 freqs = np.logspace(np.log10(cmd_args.start_frequency),
                     np.log10(cmd_args.end_frequency),
                     num=cmd_args.frequency_steps)
+
+# When resuming, pick up the results already measured, and start
+# autoscaling the first new measurement from the scale that the output
+# channel had when the sweep stopped. The results are written to a
+# temporary file that replaces the old one when the sweep ends or is
+# interrupted, so that a row cut off by the interruption does not
+# remain, and the old results are not lost if the rewrite fails.
+# A sweep that was killed outright never replaces the old file, so its
+# results are recovered from the temporary file that it left behind,
+# and saved in the CSV file before the temporary file is reused.
+
+tmp_path = cmd_args.csvFile[0] + '.tmp'
+previous = {}
+last_scale = None
+if cmd_args.resume:
+    previous, last_scale = read_previous_results(cmd_args.csvFile[0],
+                                                 fieldnames, freqs)
+    if os.path.exists(tmp_path):
+        leftover, leftover_scale = read_previous_results(tmp_path,
+                                                         fieldnames, freqs)
+        print(f'Recovered {len(leftover)} results from {tmp_path}')
+        previous.update(leftover)
+        if leftover_scale is not None:
+            last_scale = leftover_scale
+        save_results(cmd_args.csvFile[0], fieldnames,
+                     [previous[i] for i in sorted(previous)])
+    print(f'Resuming with {len(previous)} of {len(freqs)} frequencies done')
+
+csvfile = open(tmp_path, 'w', newline='')
+writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+
+writer.writeheader()
+if cmd_args.live:
+    live = LivePlot(cmd_args.start_frequency, cmd_args.end_frequency)
 gs = []
 phs = []
-for f in freqs:
-    print(f'get started, f={f}')
-    ts, ins, outs = run_sweep(scope, fg, f)
-    g, ph = analyze_sweep(f, ts, ins, outs)
-    gs.append(g)
-    phs.append(ph)
-    writer.writerow({'Freq': f, 'Gain': g, 'Phase': ph})
-
-del writer
-del cmd_args.csvFile
+g_cis = []
+ph_cis = []
+thds = []
+hlevels = []
+try:
+    for i, f in enumerate(freqs):
+        if i in previous:
+            print(f'already measured, f={f}')
+            row = previous[i]
+            g = row['Gain']
+            ph = row['Phase']
+            g_ci = row.get('GainCI', np.nan)
+            ph_ci = row.get('PhaseCI', np.nan)
+            thd = row['THD']
+            levels = np.array([row[name] for name in harmonic_names])
+        else:
+            print(f'get started, f={f}')
+            ts, ins, outs = run_sweep(scope, fg, f, cmd_args.captures,
+                                      last_scale)
+            last_scale = None
+            g, ph, g_ci, ph_ci = summarize_captures(*analyze_sweep(f, ts,
+                                                                   ins, outs))
+            thd, levels = analyze_harmonics(f, ts, outs, cmd_args.harmonics)
+            row = {'Freq': f, 'Gain': g, 'Phase': ph}
+            if cmd_args.captures > 1:
+                row.update({'GainCI': g_ci, 'PhaseCI': ph_ci})
+            row['THD'] = thd
+            row.update(zip(harmonic_names, levels))
+            row['Scale'] = scope_v_scales[1]
+        gs.append(g)
+        phs.append(ph)
+        g_cis.append(g_ci)
+        ph_cis.append(ph_ci)
+        thds.append(thd)
+        hlevels.append(levels)
+        writer.writerow(row)
+        csvfile.flush()
+        if cmd_args.live:
+            live.append(f, g, ph)
+finally:
+    del writer
+    csvfile.close()
+    os.replace(tmp_path, cmd_args.csvFile[0])
+
+if cmd_args.live:
+    plt.close(live.fig)
+    plt.ioff()
+
+gs = np.array(gs)
+phs = np.array(phs)
+g_cis = np.array(g_cis)
+ph_cis = np.array(ph_cis)
+thds = np.array(thds)
+hlevels = np.array(hlevels)
 
 fig, ax1 = plt.subplots()
 ax1.set_xlabel('Frequency (Hz)')
 ax1.set_xscale('log')
 ax1.set_ylabel('Gain (dB)', color='tab:blue')
 ax1.plot(freqs, gs, color='tab:blue')
+if cmd_args.captures > 1:
+    ax1.fill_between(freqs, gs - g_cis, gs + g_cis,
+                     color='tab:blue', alpha=0.25, linewidth=0)
 ax1.tick_params(axis='y', labelcolor='tab:blue', color='tab:blue')
 ax2 = ax1.twinx()
 ax2.set_ylabel('Phase (degrees)', color='tab:red')
 ax2.plot(freqs, phs, color='tab:red')
+if cmd_args.captures > 1:
+    ax2.fill_between(freqs, phs - ph_cis, phs + ph_cis,
+                     color='tab:red', alpha=0.25, linewidth=0)
 ax2.tick_params(axis='y', labelcolor='tab:red', color='tab:red')
 fig.tight_layout()
-plt.show()
+if not cmd_args.show:
+    fig.savefig(os.path.splitext(cmd_args.csvFile[0])[0] + '-bode.png')
+
+fig, ax3 = plt.subplots()
+ax3.set_xlabel('Frequency (Hz)')
+ax3.set_xscale('log')
+ax3.set_ylabel('Level relative to fundamental (dB)')
+ax3.plot(freqs, 20*np.log10(thds/100), color='k', label='THD')
+for name, levels in zip(harmonic_names, hlevels.T):
+    ax3.plot(freqs, levels, linewidth=0.75, label=name)
+ax3.legend()
+fig.tight_layout()
+if cmd_args.show:
+    plt.show()
+else:
+    fig.savefig(os.path.splitext(cmd_args.csvFile[0])[0] + '-thd.png')
 
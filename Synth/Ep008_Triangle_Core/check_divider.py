@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+'''
+check_divider.py --
+
+Checks the ratio index of 'divider_values.py' against the direct search
+that it replaces.
+
+Usage: check_divider.py [--points N]
+
+For each series from E6 to E192, looks up random ratios, with random
+off-grid minimums for the smaller resistor, both with RatioIndex.lookup
+and with find_value_pairs, and counts the ratios for which the two
+choose different pairs of values.
+
+The exit status is the number of comparisons that failed.
+'''
+
+import argparse
+import sys
+import numpy as np
+
+from divider_values import RatioIndex, find_value_pairs, series
+
+def report(name, err, tol):
+    '''
+    Prints the outcome of one comparison and returns True if it passed
+    '''
+    ok = bool(err <= tol)
+    print(f'{name:<40} max error {err:10.3g}  {"ok" if ok else "FAILED"}')
+    return ok
+
+def check_series(name, points):
+    '''
+    Compares the pairs chosen by the index and by the direct search
+    from one series, and returns True if they are all the same
+    '''
+    rng = np.random.default_rng(1)
+    ratios = 10**rng.uniform(-1, 1, points)
+    mins = 10**rng.uniform(2, 5, points)
+    v1, v2, err = RatioIndex(series[name]).lookup(ratios, mins, 10 * mins)
+    ref_v1, ref_v2, ref_err = find_value_pairs(ratios, mins, series[name])
+    differ = ~(np.isclose(v1, ref_v1, rtol=1e-9)
+               & np.isclose(v2, ref_v2, rtol=1e-9))
+    return report(f'{name}: {points} ratios ({differ.sum()} differ)',
+                  np.max(np.abs(err - ref_err)) if not differ.any()
+                  else np.inf, 1e-12)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser\
+        (description='Check the ratio index of divider_values.py against'
+         ' the direct search.')
+    parser.add_argument('--points', type=int, default=2000,
+                        help='Number of ratios to look up in each series')
+    cmd_args = parser.parse_args()
+
+    results = [check_series(name, cmd_args.points) for name in series]
+    sys.exit(results.count(False))
@@ -5,118 +5,574 @@
 # terms and conditiopns on hte use of this script, and a
 # DISCLAIMER OF ALL WARRANTIES.
 
-import bisect
-from math import log10
+import argparse
+import hashlib
+import os
 import numpy as np
-from sympy import symbols, solve
 
 ########################################################################
 #
-# Code to find a pair of E24 components in a given ratio of values.
+# Code to find pairs of standard components in given ratios of values.
 #
 ########################################################################
 
-# E24 standard values, such as are used for 5% tolerance components
+# Standard values in one decade, for the E6 (20%) through E192 (0.5%)
+# tolerance series. E48 and E96 are every fourth and every second
+# value of E192.
 
+e6 = np.array([1.0, 1.5, 2.2, 3.3, 4.7, 6.8])
+e12 = np.array([1.0, 1.2, 1.5, 1.8, 2.2, 2.7, 3.3, 3.9, 4.7, 5.6, 6.8, 8.2])
 e24 = np.array([1.0, 1.1, 1.2, 1.3, 1.5, 1.6,
                 1.8, 2.0, 2.2, 2.4, 2.7, 3.0,
                 3.3, 3.6, 3.9, 4.3, 4.7, 5.1,
-                5.6, 6.2, 6.8, 7.5, 8.2, 9.1,
-                10.0], dtype=np.float32)
+                5.6, 6.2, 6.8, 7.5, 8.2, 9.1])
+e192 = np.array([1.00, 1.01, 1.02, 1.04, 1.05, 1.06, 1.07, 1.09, 1.10, 1.11,
+                 1.13, 1.14, 1.15, 1.17, 1.18, 1.20, 1.21, 1.23, 1.24, 1.26,
+                 1.27, 1.29, 1.30, 1.32, 1.33, 1.35, 1.37, 1.38, 1.40, 1.42,
+                 1.43, 1.45, 1.47, 1.49, 1.50, 1.52, 1.54, 1.56, 1.58, 1.60,
+                 1.62, 1.64, 1.65, 1.67, 1.69, 1.72, 1.74, 1.76, 1.78, 1.80,
+                 1.82, 1.84, 1.87, 1.89, 1.91, 1.93, 1.96, 1.98, 2.00, 2.03,
+                 2.05, 2.08, 2.10, 2.13, 2.15, 2.18, 2.21, 2.23, 2.26, 2.29,
+                 2.32, 2.34, 2.37, 2.40, 2.43, 2.46, 2.49, 2.52, 2.55, 2.58,
+                 2.61, 2.64, 2.67, 2.71, 2.74, 2.77, 2.80, 2.84, 2.87, 2.91,
+                 2.94, 2.98, 3.01, 3.05, 3.09, 3.12, 3.16, 3.20, 3.24, 3.28,
+                 3.32, 3.36, 3.40, 3.44, 3.48, 3.52, 3.57, 3.61, 3.65, 3.70,
+                 3.74, 3.79, 3.83, 3.88, 3.92, 3.97, 4.02, 4.07, 4.12, 4.17,
+                 4.22, 4.27, 4.32, 4.37, 4.42, 4.48, 4.53, 4.59, 4.64, 4.70,
+                 4.75, 4.81, 4.87, 4.93, 4.99, 5.05, 5.11, 5.17, 5.23, 5.30,
+                 5.36, 5.42, 5.49, 5.56, 5.62, 5.69, 5.76, 5.83, 5.90, 5.97,
+                 6.04, 6.12, 6.19, 6.26, 6.34, 6.42, 6.49, 6.57, 6.65, 6.73,
+                 6.81, 6.90, 6.98, 7.06, 7.15, 7.23, 7.32, 7.41, 7.50, 7.59,
+                 7.68, 7.77, 7.87, 7.96, 8.06, 8.16, 8.25, 8.35, 8.45, 8.56,
+                 8.66, 8.76, 8.87, 8.98, 9.09, 9.20, 9.31, 9.42, 9.53, 9.65,
+                 9.76, 9.88])
+series = {'E6': e6, 'E12': e12, 'E24': e24,
+          'E48': e192[::4], 'E96': e192[::2], 'E192': e192}
 
-def find_e24_value_pair(v2_over_v1, min_v1):
+def find_value_pairs(v2_over_v1, min_v1, base=e24):
 
     '''
-    Finds a pair of E24 values v1 and v2,
-    where the ratio v2/v1 is as close as possible to v2_over_v1,
-    with v1 constrained to lie between min_v1 and 10*min_v1
+    Finds pairs of standard values v1 and v2, where each ratio v2/v1
+    is as close as possible to the corresponding v2_over_v1, with v1
+    taken from the decade of the series that starts at the largest
+    standard value not above min_v1.
+
+    This is the direct search that RatioIndex replaces: it is kept as
+    the reference that check_divider.py compares the index with.
+
+    v2_over_v1 - Array of wanted ratios
+    min_v1 - Smallest value of v1, an array that broadcasts against
+             v2_over_v1
+    base - Values of the series in one decade, such as e24 or
+           series['E96']
+
+    Every candidate v1 in the decade, and the standard values just
+    below and just above v1*v2_over_v1, are evaluated at once as
+    arrays of shape (ratios, candidates, 2), so there is no loop in
+    Python. Ties go to the smaller v1, and then to the smaller v2.
+
+    Returns a triple (v1, v2, err) of arrays of the shape of the
+    ratios, where err is the relative error (v2/v1 - v2_over_v1) /
+    v2_over_v1 of the best pair.
     '''
-    
-    # Split min_v1 into a power of 10 times a significand between 1 and 10
-    min_v1_char = int(np.floor(log10(min_v1)))
-    min_v1_decade = 10.0**min_v1_char
-    min_v1_significand = min_v1 / min_v1_decade
-
-    # Find the E24 value less than min_v1
-    v1ind = bisect.bisect(e24, min_v1_significand) - 1
-
-    # Find a range of E24 values between min_v1 and 10*min_v1
-    trial = min_v1_decade * np.concatenate((e24[v1ind:-1], 10.0*e24[:v1ind]))
-
-    # Initialize to search for a pair of values with a close ratio
-    # to v2_over_v1
-
-    besterr = 1.
-    bestv1 = None
-    bestv2 = None
-
-    # Iterate over the trial values
-    for v1 in trial:
-
-        # Find the exact value of v2 given v1
-        v2_nominal = v1 * v2_over_v1
-
-        # Split into significand and power of 10
-        v2_char = int(log10(v2_nominal))
-        v2_decade = 10.0**v2_char
-        v2_significand = v2_nominal / v2_decade
-
-        # Find the E24 values above and below the computed V2 value
-        v2ind = bisect.bisect(e24, v2_significand)
-        v2lo = e24[v2ind - 1] * v2_decade
-        v2hi = e24[v2ind] * v2_decade
-
-        # Find the relative errors produced by the two values
-        errlo = (v2_nominal - v2lo) / v2_nominal
-        errhi = (v2hi - v2_nominal) / v2_nominal
-
-        # Update best-so-far if we've found a new best.
-        if errlo < besterr:
-            besterr = errlo
-            bestv1 = v1
-            bestv2 = v2lo
-        if errhi < besterr:
-            besterr = errhi
-            bestv1 = v1
-            bestv2 = v2hi
-            
-    return bestv1, bestv2
+    ratio, min_v1 = np.broadcast_arrays(np.asarray(v2_over_v1, dtype=float),
+                                        np.asarray(min_v1, dtype=float))
+    n = len(base)
+
+    # Split min_v1 into a power of 10 times a significand between 1 and
+    # 10, and find the standard value at or below the significand
+    decade = 10.0**np.floor(np.log10(min_v1))
+    first = np.searchsorted(base, np.round(min_v1 / decade, 9),
+                            side='right') - 1
+
+    # Candidate v1 values: a decade of the series, starting there
+    two_decades = np.concatenate([base, 10*base])
+    v1 = (decade[..., np.newaxis]
+          * two_decades[first[..., np.newaxis] + np.arange(n)])
 
+    # The standard values on either side of the exact v2
+    v2_nominal = v1 * ratio[..., np.newaxis]
+    v2_decade = 10.0**np.floor(np.log10(v2_nominal))
+    v2_significand = np.round(v2_nominal / v2_decade, 9)
+    i = np.searchsorted(base, v2_significand, side='right')
+    extended = np.append(base, 10.0)
+    v2 = np.stack([extended[i-1], extended[i]], axis=-1) \
+        * v2_decade[..., np.newaxis]
 
+    # Pick the pair with the smallest relative error. Pairs in the same
+    # ratio differ only by rounding, so the errors are rounded to keep
+    # such ties in order.
+    err = v2 / v2_nominal[..., np.newaxis] - 1
+    flat = np.round(np.abs(err), 12).reshape(err.shape[:-2] + (-1,))
+    best = np.argmin(flat, axis=-1)[..., np.newaxis]
+    pick = lambda a: np.take_along_axis(a.reshape(flat.shape), best,
+                                        axis=-1)[..., 0]
+    return (np.round(pick(np.broadcast_to(v1[..., np.newaxis], v2.shape)), 9),
+            np.round(pick(v2), 9), pick(err))
+
+
+########################################################################
+#
+# A prebuilt index of the ratios of pairs of standard values, for
+# looking up many ratios at once.
+#
 ########################################################################
 
-# Parameters for the Buchla-like oscillator
+# Directory that caches the ratio indexes
+
+ratio_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '.ratio-cache')
+
+class RatioIndex:
+
+    '''
+    Index of every ratio v2/v1 of two standard values of a series,
+    with both values in a span of decades.
+
+    base - Values of the series in one decade, such as e24 or
+           series['E96']
+    decades - Pair (lo, hi): the values run from 10**lo up to, but not
+              including, 10**hi
+
+    Members:
+    values - The standard values in the span, in increasing order
+    log_ratios - The distinct values of log10(v2/v1), in increasing
+                 order
+    start - Offsets of the pairs of each distinct ratio: the pairs of
+            log_ratios[g] are v1[start[g]:start[g+1]] and
+            v2[start[g]:start[g+1]]
+    v1, v2 - Indices in 'values' of the values of each pair, with the
+             pairs of each ratio in increasing order of v1
+
+    The index is cached in a file named after the span and a hash of
+    the values, so it is built once for each series and span.
+    '''
+
+    def __init__(self, base, decades=(0, 7)):
+        lo, hi = decades
+        self.values = np.round((10.0**np.arange(lo, hi)[:, np.newaxis]
+                                * base).ravel(), 9)
+        key = hashlib.sha256(self.values.tobytes()).hexdigest()[:16]
+        path = os.path.join(ratio_cache_dir,
+                            f'{len(base)}-{lo}-{hi}-{key}.npz')
+        try:
+            with np.load(path) as cached:
+                self.log_ratios = cached['log_ratios']
+                self.start = cached['start']
+                self.v1 = cached['v1']
+                self.v2 = cached['v2']
+        except (OSError, KeyError, ValueError):
+            self.build()
+            os.makedirs(ratio_cache_dir, exist_ok=True)
+            np.savez(path + '.tmp.npz', log_ratios=self.log_ratios,
+                     start=self.start, v1=self.v1, v2=self.v2)
+            os.replace(path + '.tmp.npz', path)
+
+        # Key that sorts the pairs by ratio, then by v1, so that one
+        # search finds the first pair of a ratio with v1 in a range
+        n = len(self.values)
+        self.key = (np.repeat(np.arange(len(self.log_ratios)),
+                              np.diff(self.start)) * n + self.v1)
+
+    def build(self):
+
+        '''
+        Builds the index from the values
+        '''
+        n = len(self.values)
+        v1, v2 = np.divmod(np.arange(n * n), n)
+        log_ratio = np.log10(self.values[v2] / self.values[v1])
+
+        # Sort by ratio. Pairs in the same ratio differ only by rounding,
+        # so a step of more than 1e-12 starts a new ratio.
+        order = np.argsort(log_ratio, kind='stable')
+        new = np.diff(log_ratio[order]) > 1e-12
+        group = np.concatenate([[0], np.cumsum(new)])
+        order = order[np.lexsort((v1[order], group))]
+
+        self.log_ratios = log_ratio[order][np.concatenate([[True], new])]
+        self.start = np.searchsorted(group, np.arange(group[-1] + 2)) \
+                       .astype(np.int32)
+        self.v1 = v1[order].astype(np.uint16)
+        self.v2 = v2[order].astype(np.uint16)
+
+    def first_pair(self, g, lo, hi):
+
+        '''
+        Finds the first pair of each ratio log_ratios[g] whose v1 has an
+        index in 'values' between lo and hi - 1. Returns a pair (k, ok),
+        where k is the position of the pair in v1 and v2, and ok is
+        false where there is no such pair, or g is out of range.
+        '''
+        inside = (g >= 0) & (g < len(self.log_ratios))
+        g = np.where(inside, g, 0)
+        k = np.searchsorted(self.key, g * len(self.values) + lo)
+        ok = inside & (k < self.start[g + 1])
+        k = np.where(ok, k, 0)
+        return k, ok & (self.v1[k] < hi)
+
+    def lookup(self, v2_over_v1, min_v1=None, max_v1=None):
+
+        '''
+        Finds pairs of standard values v1 and v2, where each ratio v2/v1
+        is as close as possible to the corresponding v2_over_v1.
+
+        v2_over_v1 - Array of wanted ratios
+        min_v1, max_v1 - If given, arrays that broadcast against
+                         v2_over_v1, giving the range of v1. As in the
+                         original E24 search, v1 may start at the
+                         standard value at or below min_v1; max_v1 is
+                         inclusive.
+
+        The nearest distinct ratios below and above each wanted ratio
+        are found by binary search. If a range of v1 is given and none
+        of the pairs of one of them has v1 in the range, the search
+        steps outward from it until one does; a range of a decade or
+        more has every ratio in it, so this happens only with narrower
+        ones. Of the pairs in the chosen ratio, the one with the
+        smallest v1 is returned.
+
+        Returns a triple (v1, v2, err) of arrays of the shape of the
+        ratios, as for find_value_pairs. All three are NaN where no pair
+        has v1 in the range.
+        '''
+        q, min_v1, max_v1 = np.broadcast_arrays(
+            np.log10(np.asarray(v2_over_v1, dtype=float)),
+            np.asarray(-np.inf if min_v1 is None else min_v1, dtype=float),
+            np.asarray(np.inf if max_v1 is None else max_v1, dtype=float))
+        lo = np.maximum(np.searchsorted(self.values, min_v1 * (1 + 1e-9),
+                                        side='right') - 1, 0)
+        hi = np.searchsorted(self.values, max_v1 * (1 + 1e-9), side='right')
+
+        above = np.searchsorted(self.log_ratios, q)
+        below = above - 1
+        while True:
+            kb, ok_b = self.first_pair(below, lo, hi)
+            ka, ok_a = self.first_pair(above, lo, hi)
+            more_b = ~ok_b & (below >= 0)
+            more_a = ~ok_a & (above < len(self.log_ratios))
+            if not (more_b.any() or more_a.any()):
+                break
+            below = below - more_b
+            above = above + more_a
+
+        # Take the ratio with the smaller relative error
+        error = lambda g: np.abs(10**(self.log_ratios[np.clip(
+            g, 0, len(self.log_ratios) - 1)] - q) - 1)
+        use_a = ok_a & (~ok_b | (error(above) < error(below)))
+        k = np.where(use_a, ka, kb)
+        found = ok_a | ok_b
+        v1 = np.where(found, self.values[self.v1[k]], np.nan)
+        v2 = np.where(found, self.values[self.v2[k]], np.nan)
+        return v1, v2, v2 / v1 / 10**q - 1
+
+
+########################################################################
+#
+# Dividers whose legs are networks of two or three standard parts in
+# series and parallel, for ratios that no pair of single parts gives
+# closely enough.
+#
+########################################################################
+
+# Forms of the networks, by number in NetworkTable.kind, and the number
+# of parts in each
+
+network_forms = ['{a}', '{a} + {b}', '{a} || {b}', '{a} + {b} + {c}',
+                 '{a} || {b} || {c}', '{a} + ({b} || {c})',
+                 '{a} || ({b} + {c})']
+network_parts = np.array([1, 2, 2, 3, 3, 3, 3])
+
+def parallel(*rs):
+
+    '''
+    Returns the resistance of resistors in parallel
+    '''
+    return 1.0 / sum(1.0 / r for r in rs)
+
+def format_ohms(r):
+
+    '''
+    Formats a resistance the way it is written on a schematic,
+    such as 220, 4.7k or 1M
+    '''
+    for unit, scale in (('M', 1e6), ('k', 1e3)):
+        if r >= scale:
+            return f'{r / scale:.3g}{unit}'
+    return f'{r:.3g}'
+
+class NetworkTable:
+
+    '''
+    Table of the resistances in one decade, from 1 up to 10 ohms, that
+    networks of up to three standard parts can make. Multiplying by a
+    power of ten gives the networks of any other decade.
+
+    base - Values of the series in one decade, such as e24
+    max_parts - Largest number of parts in a network, 1 to 3
+
+    The parts run from 0.01 to 910 ohms (for E24): small ones trim a
+    larger one in series, and large ones trim a smaller one in
+    parallel. Where several networks give the same resistance, only one
+    with the fewest parts is kept.
+
+    Members:
+    values - The values of the parts, in increasing order
+    r - Resistances of the networks, in increasing order
+    parts - Number of parts in each network
+    kind - Form of each network, as an index in network_forms
+    a, b, c - Indices in 'values' of the parts of each network, or -1
+
+    Like a RatioIndex, the table is cached in .ratio-cache/. The
+    three-part table of E24 has some 400,000 networks; that of E96
+    would have 25 million, too many to be worth building.
+    '''
+
+    def __init__(self, base, max_parts=3):
+        self.values = np.round((10.0**np.arange(-2, 3)[:, np.newaxis]
+                                * base).ravel(), 9)
+        key = hashlib.sha256(self.values.tobytes()).hexdigest()[:16]
+        path = os.path.join(ratio_cache_dir,
+                            f'networks-{len(base)}-{max_parts}-{key}.npz')
+        try:
+            with np.load(path) as cached:
+                self.r = cached['r']
+                self.kind = cached['kind']
+                self.a = cached['a']
+                self.b = cached['b']
+                self.c = cached['c']
+        except (OSError, KeyError, ValueError):
+            self.build(max_parts)
+            os.makedirs(ratio_cache_dir, exist_ok=True)
+            np.savez(path + '.tmp.npz', r=self.r, kind=self.kind,
+                     a=self.a, b=self.b, c=self.c)
+            os.replace(path + '.tmp.npz', path)
+        self.parts = network_parts[self.kind]
+
+    def build(self, max_parts):
+
+        '''
+        Builds the table from the values
+        '''
+        p = self.values
+        n = len(p)
+        none = np.full(n, -1)
+        found = [(p, 0, np.arange(n), none, none)]
+        if max_parts >= 2:
+            a, b = np.triu_indices(n)
+            c = np.full_like(a, -1)
+            found += [(p[a] + p[b], 1, a, b, c),
+                      (parallel(p[a], p[b]), 2, a, b, c)]
+        if max_parts >= 3:
+            # Every a with every pair b <= c, and only a <= b for the
+            # networks that are symmetric in all three
+            b, c = np.triu_indices(n)
+            a = np.repeat(np.arange(n), len(b))
+            b, c = np.tile(b, n), np.tile(c, n)
+            s = a <= b
+            found += [(p[a[s]] + p[b[s]] + p[c[s]], 3, a[s], b[s], c[s]),
+                      (parallel(p[a[s]], p[b[s]], p[c[s]]), 4,
+                       a[s], b[s], c[s]),
+                      (p[a] + parallel(p[b], p[c]), 5, a, b, c),
+                      (parallel(p[a], p[b] + p[c]), 6, a, b, c)]
+
+        # Keep the networks in the decade
+        decade = [(r >= 1) & (r < 10) for r, *_ in found]
+        r, kind, a, b, c = (
+            np.concatenate(x) for x in
+            zip(*((r[d], np.full(np.count_nonzero(d), k), a[d], b[d], c[d])
+                  for (r, k, a, b, c), d in zip(found, decade))))
+
+        # Sort by resistance, then by number of parts, and keep the
+        # first network of each resistance
+        log_r = np.round(np.log10(r), 9)
+        order = np.lexsort((kind, network_parts[kind], log_r))
+        keep = order[np.concatenate([[True], np.diff(log_r[order]) > 0])]
+        self.r = r[keep]
+        self.kind = kind[keep].astype(np.uint8)
+        self.a, self.b, self.c = (x[keep].astype(np.int16)
+                                  for x in (a, b, c))
+
+    def describe(self, k, exponent):
+
+        '''
+        Describes network k, scaled by 10**exponent, such as
+        '4.7k + (33k || 1M)'
+        '''
+        values = {name: format_ohms(self.values[i] * 10.0**exponent)
+                  for name, i in (('a', self.a[k]), ('b', self.b[k]),
+                                  ('c', self.c[k])) if i >= 0}
+        return network_forms[self.kind[k]].format(**values)
+
+    def leg(self, max_parts, lo, hi, span=(0, 7)):
+
+        '''
+        Finds the networks of up to max_parts parts whose resistances
+        lie between lo and hi, and whose parts all lie in the span (a
+        pair of exponents, as for RatioIndex).
+
+        Returns a triple (k, e, r) of arrays in increasing order of r,
+        giving the networks' indices in the table, the exponents of the
+        powers of ten that scale them, and their resistances.
+        '''
+        lo = max(lo, 10.0**span[0])
+        hi = min(hi, 10.0**span[1] * (1 - 1e-9))
+        if lo > hi:
+            return np.zeros(0, int), np.zeros(0, int), np.zeros(0)
+        k = np.nonzero(self.parts <= max_parts)[0]
+        # The values are in increasing order, and unused parts are -1
+        used = np.stack([self.a[k], self.b[k], self.c[k]])
+        smallest = self.values[np.where(used >= 0, used,
+                                        len(self.values) - 1).min(axis=0)]
+        largest = self.values[used.max(axis=0)]
+        ks, es = [], []
+        for e in range(int(np.floor(np.log10(lo))),
+                       int(np.floor(np.log10(hi))) + 1):
+            r = self.r[k] * 10.0**e
+            inside = ((r >= lo * (1 - 1e-9)) & (r <= hi * (1 + 1e-9))
+                      & (smallest * 10.0**e >= 10.0**span[0] * (1 - 1e-9))
+                      & (largest * 10.0**e < 10.0**span[1]))
+            ks.append(k[inside])
+            es.append(np.full(np.count_nonzero(inside), e))
+        k, e = np.concatenate(ks), np.concatenate(es)
+        return k, e, self.r[k] * 10.0**e
+
+    def find_divider(self, v2_over_v1, min_v1, max_v1, max_parts=6,
+                     tolerance=0.001, span=(0, 7)):
+
+        '''
+        Finds a pair of networks whose resistances v1 and v2 are in a
+        ratio v2/v1 close to v2_over_v1, with v1 between min_v1 and
+        max_v1.
+
+        max_parts - Largest number of parts in the two networks together
+        tolerance - Largest relative error in the ratio that is good
+                    enough
+        span - Pair (lo, hi): both networks, and every part in them, lie
+               between 10**lo and 10**hi ohms
+
+        The search meets in the middle. Every network of up to p1 parts
+        in the range of v1 is a candidate for one leg, and a binary
+        search of the networks of up to p2 parts in the range of v2
+        finds the two whose resistances lie either side of
+        v1*v2_over_v1. The totals p1 + p2 are tried in increasing order,
+        and the search stops at the first total that gives a pair within
+        the tolerance; so no divider has more parts than it needs.
+        Within a total, the pair with the smallest error is chosen.
+
+        Returns a tuple (v1, net1, v2, net2, err), where net1 and net2
+        describe the networks and err is the relative error of the
+        ratio, or None if no networks lie in the ranges.
+        '''
+        best = None
+        for total in range(2, max_parts + 1):
+            for p1 in range(max(1, total - 3), min(3, total - 1) + 1):
+                k1, e1, v1 = self.leg(p1, min_v1, max_v1, span)
+                k2, e2, leg_r = self.leg(total - p1, min_v1 * v2_over_v1,
+                                         max_v1 * v2_over_v1, span)
+                if len(v1) == 0 or len(leg_r) == 0:
+                    continue
+
+                # The networks either side of each exact v2; where there
+                # is only one, it is taken twice
+                v2_nominal = v1 * v2_over_v1
+                i = np.searchsorted(leg_r, v2_nominal)
+                i = np.clip(np.stack([i - 1, i], axis=-1), 0, len(leg_r) - 1)
+                v2 = leg_r[i]
+                err = v2 / v2_nominal[:, np.newaxis] - 1
+
+                j, side = np.unravel_index(np.argmin(np.abs(err)), err.shape)
+                if best is None or abs(err[j, side]) < abs(best[-1]):
+                    best = (round(v1[j], 9), self.describe(k1[j], e1[j]),
+                            round(v2[j, side], 9),
+                            self.describe(k2[i[j, side]], e2[i[j, side]]),
+                            float(err[j, side]))
+            if best is not None and abs(best[-1]) <= tolerance:
+                break
+        return best
+
+########################################################################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser\
+        (description='Choose resistor values for the triangle-wave'
+         ' oscillator.')
+    parser.add_argument('--series', choices=list(series), default='E24',
+                        help='Series of standard values to choose from')
+    parser.add_argument('--decades', type=int, nargs=2, metavar=('LO', 'HI'),
+                        default=[0, 7],
+                        help='Choose values from 10**LO up to 10**HI ohms')
+    parser.add_argument('--parts', type=int, default=2, choices=range(2, 7),
+                        help='Largest number of parts in a divider; more than'
+                        ' 2 allows series and parallel networks in each leg,'
+                        ' of up to 3 parts (2 for series finer than E24)')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='Ratio error (percent) that is good enough, when'
+                        ' choosing networks')
+    cmd_args = parser.parse_args()
+
+    # Digits after the point needed to print a value of the series
+    digits = 1 if len(series[cmd_args.series]) <= 24 else 2
+
+    # Parameters for the Buchla-like oscillator
+
+    # 12 volt collector voltage
+    Vcc = 12
+
+    # triangle wave 5vpp, 2.5Vpeak
+    Vtri = 2.5
+
+    # Find the logic high voltage
+    Vout = 2*Vcc*Vtri/(Vcc + Vtri)
+    print(f'Logic high voltage: {Vout} V')
+
+    # Resistor ratio for the divider on the integrator output
+    r1_over_r2 = Vtri / Vcc
+    R2min = 12000
 
-# 12 volt collector voltage
-Vcc = 12
+    # Find resistor ratio for the divider on the comparator output
+    r4_over_r3 = Vout / (Vcc - Vout)
+    R3min = 12000
 
-# triangle wave 5vpp, 2.5Vpeak
-Vtri = 2.5
+    # Find resistor ratio for divider on switch
+    half_Vout = 0.5 * Vout
+    r6_over_r5 = half_Vout / (Vcc - half_Vout)
+    R5min = 47000
 
-# Find the logic high voltage
-Vout = 2*Vcc*Vtri/(Vcc + Vtri)
-print(f'Logic high voltage: {Vout} V')
+    ratios = [r1_over_r2, r4_over_r3, r6_over_r5]
+    mins = np.array([R2min, R3min, R5min])
 
-# Find resistor values for the divider on the integrator output
+    if cmd_args.parts == 2:
 
-R2min = 12000
-R2, R1 = find_e24_value_pair(Vtri / Vcc, R2min)
-print(f'Divider on integrator output: series {R1:.1e} ohm; shunt {R2:.1e} ohm')
+        # Find good values for all three ratios at once, with the smaller
+        # resistor of each divider between the standard value at or below
+        # its minimum and ten times that minimum
 
-# Find resistor ratio for the divider on the comparator output
-r4_over_r3 = Vout / (Vcc - Vout)
+        index = RatioIndex(series[cmd_args.series], cmd_args.decades)
+        lower, upper, errs = index.lookup(ratios, mins, 10 * mins)
+        (R2, R3, R5), (R1, R4, R6) = \
+            ([f'{v:.{digits}e} ohm' for v in vs] for vs in (lower, upper))
+        e1, e4, e6 = 100 * errs
 
-# Find good values for that ratio
-R3min = 12000
-R3, R4 = find_e24_value_pair(r4_over_r3, R3min)
-print(f'Divider on comparator output: pull-up {R3:.1e} ohm; pull-down {R4:.1e} ohm')
+    else:
 
-# Find resistor ratio for divider on switch
-half_Vout = 0.5 * Vout
-r6_over_r5 = half_Vout / (Vcc - half_Vout)
+        # Find networks of parts for each divider, with the same range
+        # for the smaller leg, and both legs in the span of values
 
-# Find good values for that resistor pair
-R5min = 47000
-R5, R6 = find_e24_value_pair(r6_over_r5, R5min)
-print(f'Divider on switch: pull-up {R5:.1e} ohm; pull-down {R6:.1e} ohm')
+        leg_parts = 3 if len(series[cmd_args.series]) <= 24 else 2
+        table = NetworkTable(series[cmd_args.series],
+                             min(leg_parts, cmd_args.parts - 1))
+        (_, R2, _, R1, e1), (_, R3, _, R4, e4), (_, R5, _, R6, e6) = \
+            (table.find_divider(r, m, 10 * m, cmd_args.parts,
+                                cmd_args.tolerance / 100, cmd_args.decades)
+             or (np.nan, 'none', np.nan, 'none', np.nan)
+             for r, m in zip(ratios, mins))
+        e1, e4, e6 = 100 * e1, 100 * e4, 100 * e6
 
+    print(f'Divider on integrator output: series {R1};'
+          f' shunt {R2} (ratio error {e1:+.2f}%)')
+    print(f'Divider on comparator output: pull-up {R3};'
+          f' pull-down {R4} (ratio error {e4:+.2f}%)')
+    print(f'Divider on switch: pull-up {R5};'
+          f' pull-down {R6} (ratio error {e6:+.2f}%)')
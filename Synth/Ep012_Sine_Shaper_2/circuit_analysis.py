@@ -1,9 +1,16 @@
+import argparse
 import inspect
 from matplotlib import pyplot as plt
 from matplotlib.offsetbox import AnchoredText
 import numpy as np
+import os
 import scipy
-import sympy
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'CircuitTools'))
+from equations import load_equations
+from figures import render_all_headless, render_figure
 
 #-----------------------------------------------------------------------------
 #
@@ -20,68 +27,13 @@ Vin_max = Vout_max * np.pi/2
 # Number of diodes in each side of the ladder
 ndiodes = 6
 
-def f(x, A):
-    '''
-    The function being approximated: A*sin(x/A)
-    '''
-    return A*sympy.sin(x/A)
-
-# Make Python code to evaluate the function numerically.
-#-The above definitions are symbolic.
-x = sympy.symbols('x')
-A = sympy.symbols('A', positive=True)
-feval = sympy.lambdify([x, A], f(x, A), modules=['scipy', 'numpy'])
-print('FYI: Python code for function:')
-print(inspect.getsource(feval))
+# The function being approximated, A*sin(x/A), and the integral of the
+# squared error of the piecewise linear approximation over one interval,
+# as NumPy code
 
-print('----------------------------------------------------------------------')
-
-def pwl(y0, m, h):
-    '''
-    Computes a value in one segment of the piecewise linear approximation.
-    The abscissa is x0+h, the slope is m, and the ordinate of the left-hand
-    end of the segmant is y0.
-    '''
-    return y0 + m*h
-
-def pwlerror(x0, y0, m, h, A):
-    '''
-    Computes the error at the abscissa x0+h in the piece of the approximation
-    that starts at (x0, y0) and has a slope of m
-    '''
-    return f(x0+h, A) - pwl(y0, m, h)
-
-def pwlerror2(x0, y0, m, h, A):
-    '''
-    Computes the squared error at the abscissa x0+h in the piece of the
-    approximation that starts at (x0, y0) and has a slope of m
-    '''
-    return pwlerror(x0, y0, m, h, A)**2
-
-def intpwlerror2(x0, w, y0, m, A):
-    '''
-    Computes the integral of the squared error across the interval that
-    starts at (x0, y0), has a slope of m and a width of w.
-    '''
-    h = sympy.symbols('h')
-    return sympy.integrate(pwlerror2(x0, y0, m, h, A), (h, 0, w))
-
-# Function to evaluate the error over one interval numerically
-x0, w, y0, m = sympy.symbols('x0 w y0 m')
-A = sympy.symbols('A', positive=True)
-pwl_error_on_interval = sympy.lambdify(
-    [x0, w, y0, m, A],
-    sympy.expand_trig(intpwlerror2(x0, w, y0, m, A)),
-    modules=['scipy', 'numpy'],
-    cse=True,
-)
-
-print('FYI: Formula for the integrated squared error in one interval:')
-print(intpwlerror2(x0, w, y0, m, A).simplify())
-print('FYI: Integral reduced to Python code:')
-print(inspect.getsource(pwl_error_on_interval))
-print('')
-print('----------------------------------------------------------------------')
+eqns = load_equations(__file__, 'shaper_equations', 'shaper_derive.py')
+feval = eqns.feval
+pwl_error_on_interval = eqns.pwl_error_on_interval
 
 A = Vout_max
 
@@ -392,186 +344,252 @@ class Ladder:
             print(f'    {var} = {val}')
 
 
-# Test of circuit analysis:
-
-Vins = [0]
-Vouts = [0]
-l = Ladder(Vmax=3, Vref=2.4, Vdiode = 0.55, Rdiode=33, Rin=200, Rtail=331)
-for Ra, Rb in [
-        (100, 2000),
-        (33, 1000),
-        (82, 470),
-        (47, 330),
-        (30, 120),
-        (39, 0),
-        ]:
-    l.analysis_add_stage(Ra, Rb)
-    Vins.append(l.Vin_last)
-    Vouts.append(l.Vout_last)
-
-Vins.append(l.Vmax_in)
-Vout = l.Vout_last + l.m * (l.Vmax_in - l.Vin_last)
-Vouts.append(Vout)
-
-
-# Plot the transfer function
-fig=plt.figure(figsize=(8, 4.5), dpi=240)
-plt.title('Predicted transfer function of textbook shaper')
-plt.plot(Vins, Vouts, 'b+-', ms=10, label='Predicted response')
-plt.xlabel('Input Voltage (V)')
-plt.ylabel('Output Voltage (V)')
-xs = np.linspace(0, l.Vmax_in, 100)
-plt.plot(xs, 1.01*l.Vmax_out*np.sin(xs/l.Vmax_out), 'r-', label="Ideal sine curve")
-#plt.plot(xs, l.Vmax_out*np.sin(xs/l.Vmax_out), 'r-', label="Ideal sine curve")
-plt.legend()
+
 
 #-----------------------------------------------------------------------------
 #
-# Run the optimizer
+# Plotting. Each figure is drawn by a function whose arguments are plain
+# lists and numbers, so that figures can be drawn in worker processes, and
+# so that the arguments can be hashed to tell whether a figure has changed.
 #
 #-----------------------------------------------------------------------------
 
-initguess = initial_guess(Vin_max, Vout_max, ndiodes)
-print('Initial guess:')
-print(initguess)
-bounds = param_bounds(Vin_max, ndiodes)
-print('Bounds')
-print(bounds)
-constraints = param_constraints(ndiodes)
-print('Constraints:')
-print(constraints)
-
-result = scipy.optimize.minimize(objective,
-                                 initguess,
-                                 args=[Vin_max, Vout_max],
-                                 method='SLSQP',
-                                 bounds=bounds,
-                                 constraints=constraints,
-                                 tol=1e-9,
-                                 options={'disp': True})
-
-# Report out on the optimization results
-print(result)
-
-# What THD did we achieve?
-# Sum of squares of harmonics
-SSH = result.fun
-# Mean square of harmonics
-MSH = SSH/l.Vmax_in
-# Root mean square harmonics
-RMSH = np.sqrt(MSH)
-# Root mean square fundamental
-RMSF = l.Vmax_out * np.sqrt(2)/2
-# Total harmonic distortion
-THD = RMSH/RMSF
-THD_dB = 20*np.log10(THD)
-print(f'Total harmonic distortion (theoretical): {100*THD:.3f}% = {THD_dB:.1f} dB)')
-
-# Unpack optimized parameters
-ws = result['x'][0:ndiodes]
-ms = result['x'][ndiodes:]
-if len(ms) < len(ws):
-    ms = np.concatenate([ms, [0]])
-
-# Reconstruct breakpoints, including endpoints
-lastw = Vin_max - sum(ws)
-ws = np.concatenate([ws, [lastw]])
-ms = np.concatenate([[1], ms])
-break_xs = np.concatenate([[0], np.cumsum(ws)])
-break_ys = np.concatenate([[0], np.cumsum(ms*ws)])
-print('    Vin     Vout     Slope')
-for x, y, m in zip(break_xs, break_ys, ms):
-    print(f'{x:8.3f} {y:8.3f} {m:8.3f}')
-
-# Plot the fitted function
-V = sympy.symbols('V')
-plt.figure(figsize=(8, 4.5), dpi=240)
-title = f'Approximate {f(V, Vout_max)} with a ladder of {ndiodes} diodes'
-plt.title(title)
-plt.xlabel('Input voltage')
-plt.ylabel('Output voltage')
-xs = np.linspace(0, Vin_max, 1000)
-plt.plot(xs, feval(xs, Vout_max), '-r', label=f'Ideal sine curve')
-plt.plot(break_xs, break_ys, '-+b', ms=10, label=f'Best {ndiodes} breakpoints')
-plt.legend()
-annotation = f'THD = {100*THD:.3f}% ({THD_dB:.1f} dB)'
-text_box = AnchoredText(annotation, loc=4, pad=0.5)
-plt.setp(text_box.patch, facecolor='white', alpha=0.5)
-plt.gca().add_artist(text_box)
-
-# Symthesise a ladder
-
-l = Ladder(Vmax=3, Vref=2.4, Vdiode = 0.55, Rdiode=33,
-           Imax=0.005, Iref=0.006)
-
-Rs = []
-tail = 0
-print(f'Input resistor = {l.Rin}')
-for Vin, m in zip(break_xs[1:], ms[1:]):
-    Ra, Rb = l.synthesis_find_pair(Vin, m)
-    tail += Ra
-    Rs.append((Ra, Rb))
-print(f'Divider stack sum = {tail}')
-print(np.array(Rs))
-
-# Test of circuit synthesis (round resistors to E96):
-
-Rs = [(28.0, 4230.),
-      (130., 1870.),
-      (93.1, 931.),
-      (66.5, 432.),
-      (47.5, 154.),
-      (34.0, 18.2),
-]
-Rtail = sum(p[0] for p in Rs)
-print('E96 values:')
-print('Input resistor: 340')
-print(np.array(Rs))
-print(f'Sum of lower resistors = {Rtail}')
-Vins = [0]
-Vouts = [0]
-l = Ladder(Vmax=3, Vref=2.4, Vdiode = 0.55, Rdiode=33, Rin=340, Rtail=Rtail)
-for Ra, Rb in Rs:
-    l.analysis_add_stage(Ra, Rb)
-    Vins.append(l.Vin_last)
-    Vouts.append(l.Vout_last)
-Vins.append(l.Vmax_in)
-Vout = l.Vout_last + l.m * (l.Vmax_in - l.Vin_last)
-Vouts.append(Vout)
-
-Vins = np.array(Vins)
-Vouts = np.array(Vouts)
-x0s = Vins[:-1]
-ws = Vins[1:] - x0s
-y0s = Vouts[:-1]
-ms = (Vouts[1:]-y0s)/ws
-# Sum of squares of harmonics
-SSH = sum(pwl_error_on_interval(x0s, ws, y0s, ms, l.Vmax_out))
-# Mean square of harmonics
-MSH = SSH/l.Vmax_in
-# Root mean square harmonics
-RMSH = np.sqrt(MSH)
-# Root mean square fundamental
-RMSF = l.Vmax_out * np.sqrt(2)/2
-# Total harmonic distortion
-THD = RMSH/RMSF
-THD_db = 20*np.log10(THD)
-
-
-fig=plt.figure(figsize=(8, 4.5), dpi=240)
-plt.title('Predicted transfer function of synthesized shaper')
-plt.xlabel('Input Voltage (V)')
-plt.ylabel('Output Voltage (V)')
-xs = np.linspace(0, l.Vmax_in, 100)
-plt.plot(xs, l.Vmax_out*np.sin(xs/l.Vmax_out), 'r-', label="Ideal sine curve")
-plt.plot(Vins, Vouts, 'b+-', ms=10, label='Predicted response')
-annotation = f'THD = {100*THD:.3f}% ({THD_db:.1f} dB)'
-text_box = AnchoredText(annotation, loc=4, pad=0.5)
-plt.setp(text_box.patch, facecolor='white', alpha=0.5)
-plt.gca().add_artist(text_box)
-plt.legend()
-
-
-
-# Show the plotted data
-plt.show()
+def add_thd_annotation(THD, THD_dB):
+    '''
+    Adds a box giving the THD to the lower right corner of the current plot
+    '''
+    annotation = f'THD = {100*THD:.3f}% ({THD_dB:.1f} dB)'
+    text_box = AnchoredText(annotation, loc=4, pad=0.5)
+    plt.setp(text_box.patch, facecolor='white', alpha=0.5)
+    plt.gca().add_artist(text_box)
+
+def draw_textbook(Vins, Vouts, Vmax_in, Vmax_out):
+    '''
+    Plots the predicted transfer function of the textbook shaper
+    '''
+    plt.title('Predicted transfer function of textbook shaper')
+    plt.plot(Vins, Vouts, 'b+-', ms=10, label='Predicted response')
+    plt.xlabel('Input Voltage (V)')
+    plt.ylabel('Output Voltage (V)')
+    xs = np.linspace(0, Vmax_in, 100)
+    plt.plot(xs, 1.01*Vmax_out*np.sin(xs/Vmax_out), 'r-', label="Ideal sine curve")
+    #plt.plot(xs, Vmax_out*np.sin(xs/Vmax_out), 'r-', label="Ideal sine curve")
+    plt.legend()
+
+def draw_fit(title, break_xs, break_ys, THD, THD_dB):
+    '''
+    Plots the best piecewise linear approximation to the sine curve
+    '''
+    plt.title(title)
+    plt.xlabel('Input voltage')
+    plt.ylabel('Output voltage')
+    xs = np.linspace(0, Vin_max, 1000)
+    plt.plot(xs, feval(xs, Vout_max), '-r', label=f'Ideal sine curve')
+    plt.plot(break_xs, break_ys, '-+b', ms=10, label=f'Best {ndiodes} breakpoints')
+    plt.legend()
+    add_thd_annotation(THD, THD_dB)
+
+def draw_synthesized(Vins, Vouts, Vmax_in, Vmax_out, THD, THD_dB):
+    '''
+    Plots the predicted transfer function of the synthesized shaper
+    '''
+    plt.title('Predicted transfer function of synthesized shaper')
+    plt.xlabel('Input Voltage (V)')
+    plt.ylabel('Output Voltage (V)')
+    xs = np.linspace(0, Vmax_in, 100)
+    plt.plot(xs, Vmax_out*np.sin(xs/Vmax_out), 'r-', label="Ideal sine curve")
+    plt.plot(Vins, Vouts, 'b+-', ms=10, label='Predicted response')
+    add_thd_annotation(THD, THD_dB)
+    plt.legend()
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser\
+        (description='Analyze and synthesize the diode ladder sine shaper.')
+    parser.add_argument('--headless', dest='headless', action='store_true',
+                        help='Render the figures in parallel without'
+                        ' displaying them, skipping any that are unchanged')
+    parser.add_argument('--jobs', dest='jobs', type=int, default=None,
+                        help='Number of processes to use with --headless')
+    cmd_args = parser.parse_args()
+
+    print('FYI: Python code for function:')
+    print(inspect.getsource(feval))
+
+    print('----------------------------------------------------------------------')
+
+    print('FYI: Formula for the integrated squared error in one interval:')
+    print(eqns.error_formula_text)
+    print('FYI: Integral reduced to Python code:')
+    print(inspect.getsource(pwl_error_on_interval))
+    print('')
+    print('----------------------------------------------------------------------')
+
+    specs = []
+
+    # Test of circuit analysis:
+
+    Vins = [0]
+    Vouts = [0]
+    l = Ladder(Vmax=3, Vref=2.4, Vdiode = 0.55, Rdiode=33, Rin=200, Rtail=331)
+    for Ra, Rb in [
+            (100, 2000),
+            (33, 1000),
+            (82, 470),
+            (47, 330),
+            (30, 120),
+            (39, 0),
+            ]:
+        l.analysis_add_stage(Ra, Rb)
+        Vins.append(l.Vin_last)
+        Vouts.append(l.Vout_last)
+
+    Vins.append(l.Vmax_in)
+    Vout = l.Vout_last + l.m * (l.Vmax_in - l.Vin_last)
+    Vouts.append(Vout)
+
+    # Plot the transfer function
+    specs.append(('Images/textbook-shaper.png', draw_textbook,
+                  {'Vins': np.array(Vins).tolist(),
+                   'Vouts': np.array(Vouts).tolist(),
+                   'Vmax_in': l.Vmax_in, 'Vmax_out': l.Vmax_out}))
+
+    #-------------------------------------------------------------------------
+    #
+    # Run the optimizer
+    #
+    #-------------------------------------------------------------------------
+
+    initguess = initial_guess(Vin_max, Vout_max, ndiodes)
+    print('Initial guess:')
+    print(initguess)
+    bounds = param_bounds(Vin_max, ndiodes)
+    print('Bounds')
+    print(bounds)
+    constraints = param_constraints(ndiodes)
+    print('Constraints:')
+    print(constraints)
+
+    result = scipy.optimize.minimize(objective,
+                                     initguess,
+                                     args=[Vin_max, Vout_max],
+                                     method='SLSQP',
+                                     bounds=bounds,
+                                     constraints=constraints,
+                                     tol=1e-9,
+                                     options={'disp': True})
+
+    # Report out on the optimization results
+    print(result)
+
+    # What THD did we achieve?
+    # Sum of squares of harmonics
+    SSH = result.fun
+    # Mean square of harmonics
+    MSH = SSH/l.Vmax_in
+    # Root mean square harmonics
+    RMSH = np.sqrt(MSH)
+    # Root mean square fundamental
+    RMSF = l.Vmax_out * np.sqrt(2)/2
+    # Total harmonic distortion
+    THD = RMSH/RMSF
+    THD_dB = 20*np.log10(THD)
+    print(f'Total harmonic distortion (theoretical): {100*THD:.3f}% = {THD_dB:.1f} dB)')
+
+    # Unpack optimized parameters
+    ws = result['x'][0:ndiodes]
+    ms = result['x'][ndiodes:]
+    if len(ms) < len(ws):
+        ms = np.concatenate([ms, [0]])
+
+    # Reconstruct breakpoints, including endpoints
+    lastw = Vin_max - sum(ws)
+    ws = np.concatenate([ws, [lastw]])
+    ms = np.concatenate([[1], ms])
+    break_xs = np.concatenate([[0], np.cumsum(ws)])
+    break_ys = np.concatenate([[0], np.cumsum(ms*ws)])
+    print('    Vin     Vout     Slope')
+    for x, y, m in zip(break_xs, break_ys, ms):
+        print(f'{x:8.3f} {y:8.3f} {m:8.3f}')
+
+    # Plot the fitted function
+    title = (f'Approximate {eqns.f_title.format(A=Vout_max)}'
+             f' with a ladder of {ndiodes} diodes')
+    specs.append(('Images/ladder-fit.png', draw_fit,
+                  {'title': title, 'break_xs': break_xs.tolist(),
+                   'break_ys': break_ys.tolist(),
+                   'THD': float(THD), 'THD_dB': float(THD_dB)}))
+
+    # Symthesise a ladder
+
+    l = Ladder(Vmax=3, Vref=2.4, Vdiode = 0.55, Rdiode=33,
+               Imax=0.005, Iref=0.006)
+
+    Rs = []
+    tail = 0
+    print(f'Input resistor = {l.Rin}')
+    for Vin, m in zip(break_xs[1:], ms[1:]):
+        Ra, Rb = l.synthesis_find_pair(Vin, m)
+        tail += Ra
+        Rs.append((Ra, Rb))
+    print(f'Divider stack sum = {tail}')
+    print(np.array(Rs))
+
+    # Test of circuit synthesis (round resistors to E96):
+
+    Rs = [(28.0, 4230.),
+          (130., 1870.),
+          (93.1, 931.),
+          (66.5, 432.),
+          (47.5, 154.),
+          (34.0, 18.2),
+    ]
+    Rtail = sum(p[0] for p in Rs)
+    print('E96 values:')
+    print('Input resistor: 340')
+    print(np.array(Rs))
+    print(f'Sum of lower resistors = {Rtail}')
+    Vins = [0]
+    Vouts = [0]
+    l = Ladder(Vmax=3, Vref=2.4, Vdiode = 0.55, Rdiode=33, Rin=340, Rtail=Rtail)
+    for Ra, Rb in Rs:
+        l.analysis_add_stage(Ra, Rb)
+        Vins.append(l.Vin_last)
+        Vouts.append(l.Vout_last)
+    Vins.append(l.Vmax_in)
+    Vout = l.Vout_last + l.m * (l.Vmax_in - l.Vin_last)
+    Vouts.append(Vout)
+
+    Vins = np.array(Vins)
+    Vouts = np.array(Vouts)
+    x0s = Vins[:-1]
+    ws = Vins[1:] - x0s
+    y0s = Vouts[:-1]
+    ms = (Vouts[1:]-y0s)/ws
+    # Sum of squares of harmonics
+    SSH = sum(pwl_error_on_interval(x0s, ws, y0s, ms, l.Vmax_out))
+    # Mean square of harmonics
+    MSH = SSH/l.Vmax_in
+    # Root mean square harmonics
+    RMSH = np.sqrt(MSH)
+    # Root mean square fundamental
+    RMSF = l.Vmax_out * np.sqrt(2)/2
+    # Total harmonic distortion
+    THD = RMSH/RMSF
+    THD_db = 20*np.log10(THD)
+
+    specs.append(('Images/synthesized-shaper.png', draw_synthesized,
+                  {'Vins': Vins.tolist(), 'Vouts': Vouts.tolist(),
+                   'Vmax_in': l.Vmax_in, 'Vmax_out': l.Vmax_out,
+                   'THD': float(THD), 'THD_dB': float(THD_db)}))
+
+    # Draw the figures
+    os.makedirs('Images', exist_ok=True)
+    if cmd_args.headless:
+        render_all_headless(specs, cmd_args.jobs, dpi=240, axes=False)
+    else:
+        for spec in specs:
+            render_figure(*spec, dpi=240, axes=False)
+
+        # Show the plotted data
+        plt.show()
@@ -0,0 +1,74 @@
+# Derives the equations for the diode-ladder sine shaper, and writes
+# them to 'shaper_equations.py' as plain NumPy code for
+# 'circuit_analysis.py' to use. Run this again whenever the equations
+# change; it needs sympy, but 'circuit_analysis.py' does not.
+
+import os
+import sys
+import sympy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'CircuitTools'))
+from codegen import write_module
+
+def f(x, A):
+    '''
+    The function being approximated: A*sin(x/A)
+    '''
+    return A*sympy.sin(x/A)
+
+x = sympy.symbols('x')
+A = sympy.symbols('A', positive=True)
+
+def pwl(y0, m, h):
+    '''
+    Computes a value in one segment of the piecewise linear approximation.
+    The abscissa is x0+h, the slope is m, and the ordinate of the left-hand
+    end of the segmant is y0.
+    '''
+    return y0 + m*h
+
+def pwlerror(x0, y0, m, h, A):
+    '''
+    Computes the error at the abscissa x0+h in the piece of the approximation
+    that starts at (x0, y0) and has a slope of m
+    '''
+    return f(x0+h, A) - pwl(y0, m, h)
+
+def pwlerror2(x0, y0, m, h, A):
+    '''
+    Computes the squared error at the abscissa x0+h in the piece of the
+    approximation that starts at (x0, y0) and has a slope of m
+    '''
+    return pwlerror(x0, y0, m, h, A)**2
+
+def intpwlerror2(x0, w, y0, m, A):
+    '''
+    Computes the integral of the squared error across the interval that
+    starts at (x0, y0), has a slope of m and a width of w.
+    '''
+    h = sympy.symbols('h')
+    return sympy.integrate(pwlerror2(x0, y0, m, h, A), (h, 0, w))
+
+x0, w, y0, m = sympy.symbols('x0 w y0 m')
+error_on_interval = intpwlerror2(x0, w, y0, m, A)
+
+# Write them out as code. The title of the plot of the fit has the
+# amplitude filled in at run time, so it is written with a placeholder
+# '{A}' in place of A.
+
+here = os.path.dirname(os.path.abspath(__file__))
+write_module(os.path.join(here, 'shaper_equations.py'), __file__,
+             'Equations for the diode-ladder sine shaper',
+             functions=[('feval', [x, A], f(x, A),
+                         'The function being approximated: A*sin(x/A)'),
+                        ('pwl_error_on_interval', [x0, w, y0, m, A],
+                         sympy.expand_trig(error_on_interval),
+                         'Integral of the squared error of the piecewise'
+                         ' linear approximation\nacross the interval that'
+                         ' starts at (x0, y0), has a slope of m\nand a'
+                         ' width of w')],
+             constants={
+                 'error_formula_text': str(error_on_interval.simplify()),
+                 'f_title': str(f(sympy.symbols('V'), sympy.Symbol('{A}'))),
+             })
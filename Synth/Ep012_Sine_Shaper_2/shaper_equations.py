@@ -0,0 +1,50 @@
+'''
+Equations for the diode-ladder sine shaper
+
+Generated by 'shaper_derive.py'. Do not edit; run that script again
+when the equations change.
+'''
+
+import numpy
+
+source_hash = 'fadd27531213f0398274978e2434db39766558fba61177e6adc696d55a399884'
+
+error_formula_text = ('2*A**3*m*sin(x0/A) - 2*A**3*m*sin((w + x0)/A) + A**3*sin(2*x0/A)/4 - '
+ 'A**3*sin(2*(w + x0)/A)/4 + 2*A**2*m*w*cos((w + x0)/A) + A**2*w/2 - '
+ '2*A**2*y0*cos(x0/A) + 2*A**2*y0*cos((w + x0)/A) + m**2*w**3/3 + '
+ 'm*w**2*y0 + w*y0**2')
+
+f_title = '{A}*sin(V/{A})'
+
+
+def feval(x, A):
+    '''
+    The function being approximated: A*sin(x/A)
+    '''
+    return A*numpy.sin(x/A)
+
+
+def pwl_error_on_interval(x0, w, y0, m, A):
+    '''
+    Integral of the squared error of the piecewise linear approximation
+    across the interval that starts at (x0, y0), has a slope of m
+    and a width of w
+    '''
+    x1 = A**(-1.0)
+    x2 = x0*x1
+    x3 = numpy.cos(x2)
+    x4 = A**2
+    x5 = 2*x4*y0
+    x6 = numpy.sin(x2)
+    x7 = A**3
+    x8 = x6*x7
+    x9 = 2*m
+    x10 = w*x1
+    x11 = numpy.sin(x10)
+    x12 = numpy.cos(x10)
+    x13 = x11*x3 + x12*x6
+    x14 = x13*x7
+    x15 = -x11*x6 + x12*x3
+    x16 = w*x4
+    x17 = (1/2)*x16
+    return (1/3)*m**2*w**3 + m*w**2*y0 + w*y0**2 + x13**2*x17 - 1/2*x14*x15 - x14*x9 + x15**2*x17 + x15*x16*x9 + x15*x5 - x3*x5 + (1/2)*x3*x8 + x8*x9
@@ -8,12 +8,19 @@ Cppyright (c) 2024 by Kevin B. Kenny.
 Please refer to the 'LICENSE.txt' file in the software distribution for
 the terms and conditions of reuse, and a DISCLAIMER OF ALL WARRANTIES.
 
-Usage:  run_tracer.py <deviceName>
+Usage:  run_tracer.py [--live] [--no-show] [--scope address] <deviceName>
 
 Arguments:
     deviceName - Name of a device, to be substituted into the name of
                  data files produced by the run.
 
+Options:
+    --live - Plot the samples as each sweep is collected, rather than
+             waiting until the end of the run.
+    --no-show - Save the plot as 'deviceName-ivcurve.png' instead of
+                displaying it.
+    --scope - IP address of the oscilloscope
+
 Results:
     Produces a file, 'deviceName.csv' containing voltage and current samples.
 
@@ -41,6 +48,7 @@ analysis is required.
 #    All required modules are present on PyPI at the time of writing of this
 #    program.
 
+import argparse
 import csv
 from ds1054z import DS1054Z
 import matplotlib as mpl
@@ -279,7 +287,86 @@ def collect_1sweep(scope, vscale, iscale):
                 is_return.append(i*iscale)
     return vs_return, is_return
 
-def run1scale(scope, vscale, iscale, replicates):
+class LivePlot:
+    """
+    Plot of the raw samples that grows as each sweep is collected.
+
+    The axes are drawn only once. The samples from each new sweep are
+    drawn onto a saved copy of the canvas and blitted to the screen,
+    so the cost of adding a sweep does not depend on how many samples
+    have been collected before it. The whole plot is redrawn only when
+    a sample falls outside the axes, or when the window is resized.
+    """
+
+    def __init__(self, title):
+        """
+        Opens the window for the live plot
+
+        Arguments:
+            title - Title of the run, usually the device name
+        """
+        plt.ion()
+        self.fig, self.ax = plt.subplots(figsize=(8, 4.5))
+        self.ax.set_title(title)
+        self.ax.set_yscale('log')
+        self.ax.set_xlim(0, 10 / v_readout_gain)
+        self.ax.set_ylim(1e-6, 100)
+        self.ax.set_xlabel('Drive voltage (V)')
+        self.ax.set_ylabel('Output current (mA)')
+
+        self.vs = []
+        self.iis = []
+
+        # Samples from the whole run, drawn only on a full redraw
+        self.all_points, = self.ax.plot([], [], ',k', animated=True)
+
+        # Samples from the latest sweep, drawn as the sweep arrives
+        self.new_points, = self.ax.plot([], [], ',k', animated=True)
+
+        self.background = None
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+        plt.show(block=False)
+        plt.pause(0.1)
+
+    def on_draw(self, event):
+        """
+        Draws the samples so far after a full redraw of the figure,
+        and saves the canvas for blitting.
+        """
+        self.ax.draw_artist(self.all_points)
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+
+    def append(self, vs, iis):
+        """
+        Adds the samples from one sweep to the plot
+
+        Arguments:
+            vs - Voltage samples
+            iis - Current samples
+        """
+        if len(vs) == 0:
+            return
+        self.vs.extend(vs)
+        self.iis.extend(iis)
+        self.all_points.set_data(self.vs, self.iis)
+
+        vmin, vmax = self.ax.get_xlim()
+        imin, imax = self.ax.get_ylim()
+        if (min(vs) < vmin or max(vs) > vmax
+            or min(iis) < imin or max(iis) > imax
+            or self.background is None):
+            self.ax.set_xlim(min(vmin, min(vs)), max(vmax, max(vs)))
+            self.ax.set_ylim(min(imin, 0.1*min(iis)), max(imax, 10*max(iis)))
+            self.fig.canvas.draw()
+        else:
+            self.new_points.set_data(vs, iis)
+            self.fig.canvas.restore_region(self.background)
+            self.ax.draw_artist(self.new_points)
+            self.fig.canvas.blit(self.fig.bbox)
+            self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.fig.canvas.flush_events()
+
+def run1scale(scope, vscale, iscale, replicates, live=None):
     '''
     Collects data for one scale of readout (1 V = {iscale} mA)
 
@@ -288,6 +375,8 @@ def run1scale(scope, vscale, iscale, replicates):
         vscale - Voltage scale (unitless)
         iscale - Current scale (1 V = {iscale} mA)
         replicates - Number of replicates to collect
+        live - LivePlot that receives the samples as they are collected,
+               or None if there is no live plot
 
     Results:
         Returns a pair of lists: one of raw voltage measurements,
@@ -311,11 +400,14 @@ def run1scale(scope, vscale, iscale, replicates):
     for n in range(0, replicates):
         print(f'collecting sweep #{n} of {replicates}')
         vs, iis = collect_1sweep(scope, vscale, iscale)
+        first = len(rawv)
         for (v, i) in zip(vs, iis):
             if i < 0.8 * iscale or i <= 0:
                 continue
             rawv.append(v)
             rawi.append(i)
+        if live is not None:
+            live.append(rawv[first:], rawi[first:])
     return rawv, rawi
 
 def analyze_results(rawvs, rawis):
@@ -417,23 +509,41 @@ def save_results(title, rawvs, rawis):
 
 # MAIN PROGRAM
 
+parser = argparse.ArgumentParser\
+    (description='Collect the current-vs-voltage curve of a device.')
+parser.add_argument('title', metavar='deviceName',
+                    help='Name of the device, used to name the data files')
+parser.add_argument('--live', dest='live', action='store_true',
+                    help='Plot the samples as each sweep is collected')
+parser.add_argument('--no-show', dest='show', action='store_false',
+                    help='Save the plot to a PNG file instead of showing it')
+parser.add_argument('--scope', dest='scope_ip', default=scope_ip,
+                    help='IP address of the oscilloscope')
+cmd_args = parser.parse_args()
+
 # Title of the run, usually the device name
-title = sys.argv[1]
+title = cmd_args.title
 
 # Initialization: Open the scope, and set the current readout scale
 # to span (0..10) V.
 
-scope = DS1054Z(scope_ip)
+scope = DS1054Z(cmd_args.scope_ip)
 
 # Collect all the raw data
 
+live = LivePlot(title) if cmd_args.live else None
+
 rawvs = []
 rawis = []
 for scale in [0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0]:
-    rawv, rawi = run1scale(scope, v_readout_gain, scale, replicates)
+    rawv, rawi = run1scale(scope, v_readout_gain, scale, replicates, live)
     rawvs.extend(rawv)
     rawis.extend(rawi)
 
+if live is not None:
+    plt.close(live.fig)
+    plt.ioff()
+
 # Analzye the data and print a one-line summary
 Is, eta_Vt = analyze_results(rawvs, rawis)
 print(f'{title}: I = {Is} * exp(V / {eta_Vt:e})')
@@ -442,5 +552,8 @@ print(f'{title}: I = {Is} * exp(V / {eta_Vt:e})')
 
 save_results(title, rawis, rawvs)
 
-plt.show();
+if cmd_args.show:
+    plt.show();
+else:
+    plt.savefig(f'{title}-ivcurve.png')
 
@@ -1,87 +1,194 @@
 # Compute the vlaues of resistors needed for the Schmitt trigger
 # in the I-V curve tracer.  It's running off a _negative_ power supply!
 
-from sympy import symbols, solve
+import argparse
+import numpy as np
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'CircuitTools'))
+from equations import load_equations
+
+# Standard resistor values in one decade
+
+e24 = np.array([1.0, 1.1, 1.2, 1.3, 1.5, 1.6, 1.8, 2.0, 2.2, 2.4, 2.7, 3.0,
+                3.3, 3.6, 3.9, 4.3, 4.7, 5.1, 5.6, 6.2, 6.8, 7.5, 8.2, 9.1])
+e96 = np.array([1.00, 1.02, 1.05, 1.07, 1.10, 1.13, 1.15, 1.18, 1.21, 1.24,
+                1.27, 1.30, 1.33, 1.37, 1.40, 1.43, 1.47, 1.50, 1.54, 1.58,
+                1.62, 1.65, 1.69, 1.74, 1.78, 1.82, 1.87, 1.91, 1.96, 2.00,
+                2.05, 2.10, 2.15, 2.21, 2.26, 2.32, 2.37, 2.43, 2.49, 2.55,
+                2.61, 2.67, 2.74, 2.80, 2.87, 2.94, 3.01, 3.09, 3.16, 3.24,
+                3.32, 3.40, 3.48, 3.57, 3.65, 3.74, 3.83, 3.92, 4.02, 4.12,
+                4.22, 4.32, 4.42, 4.53, 4.64, 4.75, 4.87, 4.99, 5.11, 5.23,
+                5.36, 5.49, 5.62, 5.76, 5.90, 6.04, 6.19, 6.34, 6.49, 6.65,
+                6.81, 6.98, 7.15, 7.32, 7.50, 7.68, 7.87, 8.06, 8.25, 8.45,
+                8.66, 8.87, 9.09, 9.31, 9.53, 9.76])
+series = {'E24': e24, 'E96': e96}
+
+def series_values(base, lo, hi):
+    '''
+    Returns the values of a resistor series between lo and hi, inclusive
+    '''
+    decades = np.arange(np.floor(np.log10(lo)), np.ceil(np.log10(hi)) + 1)
+    vals = np.round((base[np.newaxis, :] * 10**decades[:, np.newaxis])
+                    .ravel(), 6)
+    return vals[(vals >= lo) & (vals <= hi)]
+
+def search_resistors(design, trips, vals, R3s, R4s, Vh, Vl, supplies, tol):
+    '''
+    Searches a resistor series for Schmitt trigger designs.
+
+    design - Compiled function giving the exact R1 and R2 for given
+             R3, R4, trip points and supplies
+    trips - Compiled function giving the trip points of given resistors
+            and supplies
+    vals - Sorted array of the values that R1 and R2 may take
+    R3s, R4s - Arrays of the values that R3 and R4 may take
+    Vh, Vl - Wanted high and low trip points
+    supplies - Tuple (V_R1, V_R2, V_R3, Vee) of supply voltages
+    tol - Largest acceptable error in either trip point
+
+    Every pair (R3, R4) is tried. For each, R1 and R2 are computed
+    exactly, and the values of the series on either side of each are
+    tried, four combinations in all, so the search covers every useful
+    combination at the cost of evaluating 'design' and 'trips' once each
+    over the whole grid.
+
+    Returns an array with a row (R1, R2, R3, R4, Vh, Vl, err) for each
+    acceptable design, in order of increasing 'err', the larger of the
+    errors in the two trip points.
+    '''
+    R3g, R4g = np.meshgrid(R3s, R4s, indexing='ij')
+    R1x, R2x = design(R3g, R4g, Vh, Vl, *supplies)
+    ok = np.isfinite(R1x) & np.isfinite(R2x) & (R1x > 0) & (R2x > 0)
+    R1x, R2x, R3g, R4g = R1x[ok], R2x[ok], R3g[ok], R4g[ok]
+
+    # Neighbouring series values: shape (designs, 2)
+    def neighbours(x):
+        i = np.clip(np.searchsorted(vals, x), 1, len(vals) - 1)
+        return np.stack([vals[i-1], vals[i]], axis=-1)
+    R1c = neighbours(R1x)[:, :, np.newaxis]
+    R2c = neighbours(R2x)[:, np.newaxis, :]
+    R1c, R2c = np.broadcast_arrays(R1c, R2c)
+    R3c = np.broadcast_to(R3g[:, np.newaxis, np.newaxis], R1c.shape)
+    R4c = np.broadcast_to(R4g[:, np.newaxis, np.newaxis], R1c.shape)
+
+    Vha, Vla = trips(R1c, R2c, R3c, R4c, *supplies)
+    err = np.maximum(np.abs(Vha - Vh), np.abs(Vla - Vl))
+    good = err <= tol
+    found = np.stack([a[good] for a in (R1c, R2c, R3c, R4c, Vha, Vla, err)],
+                     axis=-1)
+    return found[np.argsort(found[:, -1], kind='stable')]
+
+parser = argparse.ArgumentParser\
+    (description='Compute the resistor values for the curve tracer\'s'
+     ' Schmitt trigger.')
+parser.add_argument('--vh', type=float, default=-0.05,
+                    help='High trip point')
+parser.add_argument('--vl', type=float, default=-1.0,
+                    help='Low trip point')
+parser.add_argument('--tol', type=float, default=0.01,
+                    help='Largest acceptable error in a trip point, volts')
+parser.add_argument('--series', choices=sorted(series), default='E96',
+                    help='Series of resistor values to search')
+parser.add_argument('--r3', type=float, nargs=2, default=[10e3, 100e3],
+                    metavar=('MIN', 'MAX'), help='Range of R3 to search')
+parser.add_argument('--r4', type=float, nargs=2, default=[5.6e3, 6.8e3],
+                    metavar=('MIN', 'MAX'), help='Range of R4 to search')
+parser.add_argument('--top', type=int, default=10,
+                    help='Number of resistor sets to list')
+cmd_args = parser.parse_args()
+
+def polynomial(terms):
+    '''
+    Formats a polynomial given as a list of (monomial, coefficient) pairs
+    '''
+    text = ''
+    for monomial, c in terms:
+        coeff = f'{abs(c):.15g}'
+        if '.' not in coeff and 'e' not in coeff:
+            coeff += '.0'
+        term = coeff if monomial == '1' else f'{coeff}*{monomial}'
+        if not text:
+            text = term if c >= 0 else '-' + term
+        else:
+            text += f' + {term}' if c >= 0 else f' - {term}'
+    return text
+
+def show(terms, coefficients, title):
+    '''
+    Prints the general solution with some of its values plugged in
+
+    terms - For R1 and R2, the name and the monomials of the numerator
+            and the denominator of its value, from schmitt_equations
+    coefficients - Coefficients of all the monomials, in order
+    '''
+    print(title)
+    coefficients = iter(coefficients)
+    for name, num, den in terms:
+        num = [(m, float(next(coefficients))) for m in num]
+        den = [(m, float(next(coefficients))) for m in den]
+        if den[0][1] < 0:
+            num = [(m, -c) for m, c in num]
+            den = [(m, -c) for m, c in den]
+        print(f'{name} = ({polynomial(num)})/({polynomial(den)})')
 
 # The four resistors in the trigger
 # R1 - pull-up on the input - to ground
 # R2 - pull-down on the input - to -Vee
 # R3 - feedback resistor
 # R4 - pull-up on the open collector output - to ground
-R1, R2, R3, R4 = symbols('R1 R2 R3 R4')
+#
+# The equations say that the currents in the three resistors sum to zero
+# at both the upper and lower trip points, Vh and Vl. They are solved in
+# 'schmitt_derive.py', first assuming R4 << R3, and then accounting for
+# the current in R4 when the output is HIGH.
 
-# Voltages:
-#    Vh - high trip point
-#    Vl - low trip point
-#    Vee - negative power supply
-#    V_R1  Voltage at top end of R1 - ground
-#    V_R2  Voltage at bottom end of R2  - -Vee
-#    V_R3  Voltage at top end of R3, assumed to be the same as top of R4
-#      (assuming R4 << R3)
-Vh, Vl, Vee, V_R1, V_R2, V_R3 = symbols('Vh Vl Vee V_R1 V_R2 V_R3')
+eqns = load_equations(__file__, 'schmitt_equations', 'schmitt_derive.py')
 
-#  Symbolic solution
-
-# Equations:  Current in the three resistors sums to zero at
-#             both upper and lower trip points
+print(''' Solution with R4 << R3:''')
+for line in eqns.simple_text:
+    print(line)
+print('')
 
-eqns = [(V_R1 - Vh) / R1 + (V_R3 - Vh) / R3 - (Vh - V_R2) / R2,
-        (V_R1 - Vl) / R1 + (Vee - Vl) / R3 - (Vl - V_R2) / R2]
+# Plug in the actual power supplies
 
-solns = solve(eqns, R1, R2, dict=True)
+supplies = (0,      # V_R1: connect the divider between ground
+            -12,    # V_R2: and -12V
+            0,      # V_R3: pull the R4/R3 combination up to ground
+            -12)    # Vee: and down to -12V
 
-print(''' Solution with R4 << R3:''')
-for s in solns:
-    for k, v in s.items():
-        print(f'{k} = {v.expand().simplify()}')
-print('')
-      
-# Plug in the actual values
-    
-Vh = -0.05   # trip at -0.05 volts
-Vl = -1.0     # trip at -1 volts
-V_R1 = 0    # connect the divider between ground
-V_R2 = -12  # and -12V
-V_R3 = 0    # pull the R4/R3 combination up to ground
-Vee = -12   # and down to -12V
-
-# Equations: Currents again sum to zero.  This time, when the output is HIGH,
-#            account for the current in R4
-
-eqns = [(V_R1 - Vh) / R1 + (V_R3 - Vh) / (R3 + R4) - (Vh - V_R2) / R2,
-        (V_R1 - Vl) / R1 + (Vee - Vl) / R3 - (Vl - V_R2) / R2]
-
-solns = solve(eqns, R1, R2, dict=True)
-
-print('Solution accounting for R4, actual power supplies:')
-for s in solns:
-    for k, v in s.items():
-        print(f'{k} = {v.expand().simplify()}')
+show(eqns.supplies_terms, eqns.supplies_coefficients(cmd_args.vh, cmd_args.vl),
+     'Solution accounting for R4, actual power supplies:')
 print('')
 
 # Size R4 for 2 mA idle current and restate equations with it filled in
 
-R4 = 6200
-eqns = [(V_R1 - Vh) / R1 + (V_R3 - Vh) / (R3 + R4) - (Vh - V_R2) / R2,
-        (V_R1 - Vl) / R1 + (Vee - Vl) / R3 - (Vl - V_R2) / R2]
-
-solns = solve(eqns, R1, R2, dict=True)
-
-print('Solution with R4 = 6k2:')
-for s in solns:
-    for k, v in s.items():
-        print(f'{k} = {v.expand().simplify()}')
+show(eqns.r4_terms, eqns.r4_coefficients(cmd_args.vh, cmd_args.vl),
+     'Solution with R4 = 6k2:')
 print()
 
-# Choose 33k pretty arbitrarily for R3 and restate equations with it filled in
-
-R3 = 33000
-eqns = [(V_R1 - Vh) / R1 + (V_R3 - Vh) / (R3 + R4) - (Vh - V_R2) / R2,
-        (V_R1 - Vl) / R1 + (Vee - Vl) / R3 - (Vl - V_R2) / R2]
-
-solns = solve(eqns, R1, R2, dict=True)
+# Choose 33k pretty arbitrarily for R3, and evaluate the solution
 
+R1v, R2v = eqns.design(33000, 6200, cmd_args.vh, cmd_args.vl, *supplies)
 print('Solution with R4=6k2, R3=33k')
-for s in solns:
-    for k, v in s.items():
-        print(f'{k} = {v.expand().simplify()}')
+print(f'R1 = {R1v}')
+print(f'R2 = {R2v}')
+print()
+
+# Search the resistor series for sets that hit the trip points
+
+vals = series_values(series[cmd_args.series], 10, 10e6)
+R3s = series_values(series[cmd_args.series], *cmd_args.r3)
+R4s = series_values(series[cmd_args.series], *cmd_args.r4)
+found = search_resistors(eqns.design, eqns.trips, vals, R3s, R4s,
+                         cmd_args.vh, cmd_args.vl, supplies, cmd_args.tol)
+print(f'{found.shape[0]} {cmd_args.series} resistor sets have both trip points'
+      f' within {cmd_args.tol} V of {cmd_args.vh} V and {cmd_args.vl} V')
+if found.shape[0] > 0:
+    print(f'{"R1":>10} {"R2":>10} {"R3":>10} {"R4":>10}'
+          f' {"Vh":>8} {"Vl":>8} {"Error":>8}')
+    for R1v, R2v, R3v, R4v, Vhv, Vlv, errv in found[:cmd_args.top]:
+        print(f'{R1v:>10.6g} {R2v:>10.6g} {R3v:>10.6g} {R4v:>10.6g}'
+              f' {Vhv:>8.4f} {Vlv:>8.4f} {errv:>8.4f}')
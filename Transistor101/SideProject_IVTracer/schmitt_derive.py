@@ -0,0 +1,123 @@
+# Derives the equations for the resistors of the Schmitt trigger in the
+# I-V curve tracer, and writes them to 'schmitt_equations.py' as plain
+# NumPy code for 'schmitt-values.py' to use. Run this again whenever the
+# equations change; it needs sympy, but 'schmitt-values.py' does not.
+
+import os
+import sys
+import sympy
+from sympy import symbols
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'CircuitTools'))
+from codegen import write_module
+from solvecache import cached_solve
+
+# The four resistors in the trigger
+# R1 - pull-up on the input - to ground
+# R2 - pull-down on the input - to -Vee
+# R3 - feedback resistor
+# R4 - pull-up on the open collector output - to ground
+R1, R2, R3, R4 = symbols('R1 R2 R3 R4')
+
+# Voltages:
+#    Vh - high trip point
+#    Vl - low trip point
+#    Vee - negative power supply
+#    V_R1  Voltage at top end of R1 - ground
+#    V_R2  Voltage at bottom end of R2  - -Vee
+#    V_R3  Voltage at top end of R3, assumed to be the same as top of R4
+#      (assuming R4 << R3)
+Vh, Vl, Vee, V_R1, V_R2, V_R3 = symbols('Vh Vl Vee V_R1 V_R2 V_R3')
+
+#  Symbolic solution
+
+# Equations:  Current in the three resistors sums to zero at
+#             both upper and lower trip points
+
+eqns = [(V_R1 - Vh) / R1 + (V_R3 - Vh) / R3 - (Vh - V_R2) / R2,
+        (V_R1 - Vl) / R1 + (Vee - Vl) / R3 - (Vl - V_R2) / R2]
+
+solns = cached_solve(eqns, [R1, R2], 'expand', 'simplify')
+
+simple_text = [f'{k} = {v}' for s in solns for k, v in s.items()]
+
+# Equations: Currents again sum to zero.  This time, when the output is HIGH,
+#            account for the current in R4. Solve them once, with every
+#            value left symbolic, both for R1 and R2 and for the trip points,
+#            so that they can be evaluated over whole arrays of values.
+
+eqns = [(V_R1 - Vh) / R1 + (V_R3 - Vh) / (R3 + R4) - (Vh - V_R2) / R2,
+        (V_R1 - Vl) / R1 + (Vee - Vl) / R3 - (Vl - V_R2) / R2]
+
+general = cached_solve(eqns, [R1, R2], 'simplify')[0]
+tripsol = cached_solve(eqns, [Vh, Vl], 'simplify')[0]
+
+def substituted_terms(values, after=None):
+    '''
+    Plugs some of the values into the general solution, leaving Vh
+    and Vl for later, and breaks each resulting value into a ratio
+    of polynomials in the resistors that remain.
+
+    values - Values to plug in before the ratio is reduced
+    after - Values to plug in after it is reduced, so that the
+            coefficients keep the scale that 'values' alone gives them
+
+    Returns a pair (terms, coefficients). 'terms' gives, for R1 and
+    R2, the name and the monomials of the numerator and denominator.
+    'coefficients' is the list of the coefficients of all the
+    monomials, in the same order, as expressions in Vh and Vl.
+    '''
+    after = after or {}
+    terms = []
+    coefficients = []
+    for k, v in general.items():
+        num, den = sympy.fraction(sympy.cancel(v.subs(values)))
+        num, den = sympy.expand(num.subs(after)), sympy.expand(den.subs(after))
+        gens = sorted((num.free_symbols | den.free_symbols)
+                      & {R1, R2, R3, R4}, key=str)
+        parts = [str(k)]
+        for poly in (sympy.Poly(num, *gens), sympy.Poly(den, *gens)):
+            parts.append([str(sympy.Mul(*[g**e for g, e in zip(gens, m)]))
+                          for m in poly.monoms()])
+            coefficients.extend(poly.coeffs())
+        terms.append(parts)
+    return terms, coefficients
+
+# The actual power supplies, as in 'schmitt-values.py'
+
+supplies = {V_R1: 0,            # connect the divider between ground
+            V_R2: -12,          # and -12V
+            V_R3: 0,            # pull the R4/R3 combination up to ground
+            Vee: -12}           # and down to -12V
+
+# Write the solutions out as code
+
+supplies_terms, supplies_coeffs = substituted_terms(supplies)
+r4_terms, r4_coeffs = substituted_terms(supplies, {R4: 6200})
+
+here = os.path.dirname(os.path.abspath(__file__))
+write_module(os.path.join(here, 'schmitt_equations.py'), __file__,
+             'Equations for the resistors of the Schmitt trigger in the'
+             ' I-V curve tracer',
+             functions=[('design', [R3, R4, Vh, Vl, V_R1, V_R2, V_R3, Vee],
+                         [general[R1], general[R2]],
+                         'Returns the exact (R1, R2) for given R3, R4,'
+                         ' trip points\nand supplies'),
+                        ('trips', [R1, R2, R3, R4, V_R1, V_R2, V_R3, Vee],
+                         [tripsol[Vh], tripsol[Vl]],
+                         'Returns the trip points (Vh, Vl) of given'
+                         ' resistors and supplies'),
+                        ('supplies_coefficients', [Vh, Vl], supplies_coeffs,
+                         'Returns the coefficients of supplies_terms, the'
+                         ' general solution\nwith the actual supplies'
+                         ' plugged in'),
+                        ('r4_coefficients', [Vh, Vl], r4_coeffs,
+                         'Returns the coefficients of r4_terms, the general'
+                         ' solution\nwith the actual supplies and'
+                         ' R4 = 6k2 plugged in')],
+             constants={
+                 'simple_text': simple_text,
+                 'supplies_terms': supplies_terms,
+                 'r4_terms': r4_terms,
+             })
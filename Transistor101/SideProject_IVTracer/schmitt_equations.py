@@ -0,0 +1,103 @@
+'''
+Equations for the resistors of the Schmitt trigger in the I-V curve tracer
+
+Generated by 'schmitt_derive.py'. Do not edit; run that script again
+when the equations change.
+'''
+
+import numpy
+
+source_hash = '9e75cfd1a97673eccc28a102bc9886ae7b19bc5f33606c8ed0372999b9741ce2'
+
+simple_text = ['R1 = R3*(-V_R1*Vh + V_R1*Vl + V_R2*Vh - V_R2*Vl)/(V_R2*V_R3 - V_R2*Vee - '
+ 'V_R2*Vh + V_R2*Vl - V_R3*Vl + Vee*Vh)',
+ 'R2 = R3*(V_R1*Vh - V_R1*Vl - V_R2*Vh + V_R2*Vl)/(V_R1*V_R3 - V_R1*Vee - '
+ 'V_R1*Vh + V_R1*Vl - V_R3*Vl + Vee*Vh)']
+
+supplies_terms = [['R1', ['R3**2', 'R3*R4'], ['R3', 'R4']],
+ ['R2', ['R3**2', 'R3*R4'], ['R3', 'R4']]]
+
+r4_terms = [['R1', ['R3**2', 'R3'], ['R3', '1']], ['R2', ['R3**2', 'R3'], ['R3', '1']]]
+
+
+def design(R3, R4, Vh, Vl, V_R1, V_R2, V_R3, Vee):
+    '''
+    Returns the exact (R1, R2) for given R3, R4, trip points
+    and supplies
+    '''
+    x0 = R3*V_R2
+    x1 = R4*V_R2
+    x2 = Vee*Vh
+    x3 = R3*V_R3
+    x4 = R4*Vl
+    x5 = R3*x2 + R4*x2 - Vh*x4 - Vl*x3
+    x6 = R3*(R3 + R4)*(V_R1 - V_R2)*(Vh - Vl)
+    x7 = R3*V_R1
+    return (
+        -x6/(V_R3*x0 - Vee*x0 - Vee*x1 - Vh*x0 + Vl*x0 + Vl*x1 + x5),
+        x6/(-R4*V_R1*Vee + V_R1*x3 + V_R1*x4 - Vee*x7 - Vh*x7 + Vl*x7 + x5),
+    )
+
+
+def trips(R1, R2, R3, R4, V_R1, V_R2, V_R3, Vee):
+    '''
+    Returns the trip points (Vh, Vl) of given resistors and supplies
+    '''
+    x0 = R1*R4
+    x1 = R2*R4
+    x2 = R1*R2
+    x3 = R1*R3
+    x4 = R2*R3
+    x5 = x2 + x3 + x4
+    x6 = V_R1*x4 + V_R2*x3
+    return (
+        (V_R1*x1 + V_R2*x0 + V_R3*x2 + x6)/(x0 + x1 + x5),
+        (Vee*x2 + x6)/x5,
+    )
+
+
+def supplies_coefficients(Vh, Vl):
+    '''
+    Returns the coefficients of supplies_terms, the general solution
+    with the actual supplies plugged in
+    '''
+    x0 = 12*Vh
+    x1 = 12*Vl
+    x2 = x0 - x1
+    x3 = x1 + 144
+    x4 = Vh*Vl + x0
+    x5 = -x2
+    return (
+        x2,
+        x2,
+        x3,
+        x3 + x4,
+        x5,
+        x5,
+        x0,
+        x4,
+    )
+
+
+def r4_coefficients(Vh, Vl):
+    '''
+    Returns the coefficients of r4_terms, the general solution
+    with the actual supplies and R4 = 6k2 plugged in
+    '''
+    x0 = 12*Vh
+    x1 = 12*Vl
+    x2 = x0 - x1
+    x3 = 74400*Vh
+    x4 = 74400*Vl
+    x5 = x3 - x4
+    x6 = 6200*Vh*Vl + x3
+    return (
+        x2,
+        x5,
+        x1 + 144,
+        x4 + x6 + 892800,
+        -x2,
+        -x5,
+        x0,
+        x6,
+    )